@@ -1,9 +1,41 @@
+import sys
+
+if __name__ == "__main__" and sys.argv[1:] not in ([], ["--new-window"]):
+    # Command-line use (popout-notepad list/cat/add/...) never loads Tk.
+    from notepad_cli import main
+    sys.exit(main(sys.argv[1:]))
+if __name__ == "__main__" and not sys.argv[1:]:
+    # A panel already running on these notes just slides out instead.
+    from notepad_ipc import CommandError, send_commands
+    try:
+        if send_commands([{"cmd": "show"}]):
+            sys.exit(0)
+    except CommandError:
+        pass
+
 import tkinter as tk
-from tkinter import scrolledtext
-import pyautogui
-import winreg
+import tkinter.font
+from tkinter import filedialog, scrolledtext
 import json
 import os
+import re
+import glob
+import itertools
+import contextlib
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from notepad_highlight import LEXERS, TAGS, LineStates
+from notepad_index import CompletionIndex, SearchIndex, completion_prefix, fuzzy_filter, tokenize
+from notepad_ipc import CommandServer
+from notepad_spell import SpellChecker, SpellLines, spell_check_available
+from notepad_store import (EditJournal, PageReadError, PageStore, Snapshot, SnapshotWriter, diff_edit,
+                           entry_versions)
+from notepad_sync import FileWatcher, read_changed_pages
+from notepad_trace import Tracer
 
 def is_light_theme():
     """
@@ -12,6 +44,7 @@ def is_light_theme():
     (Used only if no configuration is set yet.)
     """
     try:
+        import winreg
         key = winreg.OpenKey(
             winreg.HKEY_CURRENT_USER,
             r"Software\Microsoft\Windows\CurrentVersion\Themes\Personalize"
@@ -21,8 +54,399 @@ def is_light_theme():
         return bool(value)
     except Exception:
         return True
+
+def pointer_position():
+    """
+    Returns the pointer's screen position. pyautogui is slow to import, so
+    it is loaded by the first hover poll rather than at startup.
+    """
+    import pyautogui
+    return pyautogui.position()
         
+class SlideAnimator:
+    """
+    Animates the panel offset over a fixed wall-clock duration with easing.
+
+    Owns at most one pending after() id, so starting a new slide cancels the
+    previous one. A slide that only covers part of the distance (e.g. a
+    reversal mid-flight) gets a proportional share of the duration.
+    """
+
+    def __init__(self, root, duration_ms=150, frame_ms=15):
+        self.root = root
+        self.duration_ms = duration_ms
+        self.frame_ms = frame_ms
+        self._after_id = None
+
+    def animate(self, start, target, full_distance, on_frame, on_done):
+        self.cancel()
+        if start == target:
+            on_done()
+            return
+        self._start = start
+        self._target = target
+        self._on_frame = on_frame
+        self._on_done = on_done
+        share = abs(target - start) / full_distance if full_distance else 1
+        self._duration = max(self.duration_ms * min(share, 1), self.frame_ms) / 1000
+        self._t0 = time.perf_counter()
+        self._after_id = self.root.after(self.frame_ms, self._step)
+
+    def cancel(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def is_running(self):
+        return self._after_id is not None
+
+    def _step(self):
+        t = (time.perf_counter() - self._t0) / self._duration
+        if t >= 1:
+            self._after_id = None
+            self._on_frame(self._target)
+            self._on_done()
+            return
+        eased = 1 - (1 - t) ** 3  # ease-out cubic
+        self._on_frame(round(self._start + (self._target - self._start) * eased))
+        self._after_id = self.root.after(self.frame_ms, self._step)
+
+class IdlePageWalker:
+    """
+    Visits every page once in idle time, first page first, for up to
+    slice_ms at a time before yielding to the event loop; used to build
+    the search and completion indexes without blocking typing.
+
+    visit(page_id, text) is called per page still in the notebook (pages
+    that cannot be read are skipped), on_step(remaining) after each slice
+    and on_done() at the end. Pages are read with peek(), so they do not
+    go through the page cache. Owns at most one pending after() id.
+    """
+
+    def __init__(self, root, get_pages, visit, on_step=None, on_done=None, slice_ms=15):
+        self.root = root
+        self.get_pages = get_pages
+        self.visit = visit
+        self.on_step = on_step
+        self.on_done = on_done
+        self.slice_ms = slice_ms
+        self._queue = []
+        self._pending = set()
+        self._after_id = None
+
+    def start(self):
+        self.cancel()
+        self._queue = self.get_pages().page_ids()
+        self._queue.reverse()  # popped from the end, first page first
+        self._pending = set(self._queue)
+        self._after_id = self.root.after_idle(self._step)
+
+    def cancel(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._queue = []
+        self._pending = set()
+
+    def is_running(self):
+        return self._after_id is not None
+
+    def is_pending(self, page_id):
+        return page_id in self._pending
+
+    def discard(self, page_id):
+        # The page no longer needs visiting (e.g. it was deleted).
+        self._pending.discard(page_id)
+
+    def _step(self):
+        self._after_id = None
+        pages = self.get_pages()
+        positions = pages.positions()
+        deadline = time.perf_counter() + self.slice_ms / 1000
+        while self._queue and time.perf_counter() < deadline:
+            page_id = self._queue.pop()
+            if page_id in self._pending and page_id in positions:
+                self._pending.discard(page_id)
+                try:
+                    text = pages.peek(positions[page_id])
+                except PageReadError:
+                    continue
+                self.visit(page_id, text)
+        if self._queue:
+            if self.on_step is not None:
+                self.on_step(len(self._queue))
+            self._after_id = self.root.after(1, self._step)
+            return
+        self._pending = set()
+        if self.on_done is not None:
+            self.on_done()
+
+class UndoHistory:
+    """
+    Undo and redo stacks of edit deltas for every page, keyed by page id so
+    they outlive the page's text widget.
+
+    A delta is ("i", index, text) for an insertion or ("d", index, text) for
+    a deletion, with index as a Tk "line.col" string. A step is a list of
+    deltas undone together. Memory is capped per page and in total; the
+    oldest steps are dropped first.
+    """
+
+    DELTA_OVERHEAD = 64  # rough per-delta bookkeeping, in bytes
+
+    def __init__(self, page_budget=512 * 1024, total_budget=8 * 1024 * 1024):
+        self.page_budget = page_budget
+        self.total_budget = total_budget
+        # page id -> stack of [serial, step, size]; serials order steps in time.
+        self._undo = {}
+        self._redo = {}
+        self._sizes = {}
+        self._total = 0
+        self._serial = itertools.count()
+
+    def record(self, page_id, delta, merge=False):
+        """
+        Adds a delta as a new step, or to the last step when merge is set.
+        Any redo history of the page is discarded.
+        """
+        for entry in self._redo.pop(page_id, []):
+            self._add(page_id, -entry[2])
+        size = len(delta[2]) + self.DELTA_OVERHEAD
+        undo = self._undo.setdefault(page_id, deque())
+        if merge and undo:
+            undo[-1][1].append(delta)
+            undo[-1][2] += size
+        else:
+            undo.append([next(self._serial), [delta], size])
+        self._add(page_id, size)
+        self._enforce_budgets(page_id)
+
+    def undo(self, page_id):
+        """
+        Returns the most recent step of the page (to be reverted in reverse
+        order) and moves it to the redo stack, or None.
+        """
+        undo = self._undo.get(page_id)
+        if not undo:
+            return None
+        entry = undo.pop()
+        self._redo.setdefault(page_id, []).append(entry)
+        return entry[1]
+
+    def redo(self, page_id):
+        redo = self._redo.get(page_id)
+        if not redo:
+            return None
+        entry = redo.pop()
+        self._undo.setdefault(page_id, deque()).append(entry)
+        return entry[1]
+
+    def drop_page(self, page_id):
+        self._undo.pop(page_id, None)
+        self._redo.pop(page_id, None)
+        self._total -= self._sizes.pop(page_id, 0)
+
+    def usage(self, page_id=None):
+        """
+        Approximate bytes held for one page, or for all pages.
+        """
+        if page_id is None:
+            return self._total
+        return self._sizes.get(page_id, 0)
+
+    def to_json(self):
+        pages = {}
+        for page_id in self._sizes:
+            pages[page_id] = {
+                # Copied: the writer thread serializes these while typing
+                # goes on extending the last step.
+                "undo": [list(entry[1]) for entry in self._undo.get(page_id, ())],
+                "redo": [list(entry[1]) for entry in self._redo.get(page_id, ())],
+            }
+        return pages
+
+    def load_json(self, pages):
+        for page_id, stacks in pages.items():
+            for name, target in (("undo", self._undo), ("redo", self._redo)):
+                stack = target.setdefault(page_id, deque() if name == "undo" else [])
+                for step in stacks.get(name, []):
+                    step = [tuple(delta) for delta in step]
+                    size = sum(len(delta[2]) + self.DELTA_OVERHEAD for delta in step)
+                    stack.append([next(self._serial), step, size])
+                    self._add(page_id, size)
+            self._enforce_budgets(page_id)
+
+    def _add(self, page_id, size):
+        self._sizes[page_id] = self._sizes.get(page_id, 0) + size
+        self._total += size
+
+    def _enforce_budgets(self, page_id):
+        while self._sizes.get(page_id, 0) > self.page_budget:
+            self._drop_oldest(page_id)
+        while self._total > self.total_budget:
+            oldest = min(
+                (stack[0][0], pid) for pid, stack in self._undo.items() if stack
+            ) if any(self._undo.values()) else None
+            self._drop_oldest(oldest[1] if oldest else next(iter(self._sizes)))
+
+    def _drop_oldest(self, page_id):
+        undo = self._undo.get(page_id)
+        if undo:
+            entry = undo.popleft()
+        else:
+            # Only redo steps left: drop the one furthest from being redone.
+            entry = self._redo[page_id].pop(0)
+        self._add(page_id, -entry[2])
+        if not self._undo.get(page_id) and not self._redo.get(page_id):
+            self.drop_page(page_id)
+
+class PageNavigator(tk.Frame):
+    """
+    Jump-to-page list shown over the text area: a filter entry above a
+    canvas that only draws the rows in view, so opening and scrolling cost
+    the same for ten pages or ten thousand.
+
+    Titles come from title_of(position), called for visible rows only until
+    a filter needs all of them. on_choose(position) is called with the
+    picked page; on_close when the list is dismissed either way.
+    """
+
+    def __init__(self, master, on_choose, on_close):
+        super().__init__(master)
+        self.on_choose = on_choose
+        self.on_close = on_close
+        self.query_var = tk.StringVar()
+        self.entry = tk.Entry(self, textvariable=self.query_var, bd=0, relief="flat")
+        self.entry.pack(side="top", fill="x")
+        self.scrollbar = tk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas = tk.Canvas(self, highlightthickness=0, bd=0)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.row_height = 20
+        self.count = 0
+        self.title_of = None
+        self._titles = None
+        self.rows = []
+        self.selected = 0
+        self.top = 0
+        self.colors = ("#ffffff", "#000000", "#cce0ff")
+        self.font = None
+        self.query_var.trace_add("write", lambda *args: self.refilter())
+        for widget in (self.entry, self.canvas):
+            widget.bind("<Down>", lambda event: self.move(1))
+            widget.bind("<Up>", lambda event: self.move(-1))
+            widget.bind("<Next>", lambda event: self.move(self.visible_rows()))
+            widget.bind("<Prior>", lambda event: self.move(-self.visible_rows()))
+            widget.bind("<Return>", lambda event: self.choose())
+            widget.bind("<Escape>", lambda event: self.on_close())
+            widget.bind("<MouseWheel>", lambda event: self.scroll(-event.delta // 120 * 3))
+            widget.bind("<Button-4>", lambda event: self.scroll(-3))
+            widget.bind("<Button-5>", lambda event: self.scroll(3))
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<Double-Button-1>", lambda event: self.choose())
+        self.canvas.bind("<Configure>", lambda event: self.render())
+
+    def set_style(self, font, bg, fg, select_bg):
+        self.font = font
+        self.colors = (bg, fg, select_bg)
+        self.row_height = tk.font.Font(font=font).metrics("linespace") + 4
+        self.configure(bg=bg)
+        self.entry.configure(font=font, bg=bg, fg=fg, insertbackground=fg)
+        self.canvas.configure(bg=bg)
+        self.render()
+
+    def show(self, count, title_of, current):
+        self.count = count
+        self.title_of = title_of
+        self._titles = None
+        self.query_var.set("")  # refilters
+        self.select(current)
+        self.entry.focus_set()
+
+    def refilter(self):
+        query = self.query_var.get()
+        if query.strip():
+            if self._titles is None:
+                self._titles = [self.title_of(i) for i in range(self.count)]
+            self.rows = fuzzy_filter(query, self._titles)
+        else:
+            self.rows = range(self.count)
+        self.select(0)
+
+    def title(self, position):
+        if self._titles is not None:
+            return self._titles[position]
+        return self.title_of(position)
+
+    def visible_rows(self):
+        return max(self.canvas.winfo_height() // self.row_height, 1)
+
+    def select(self, row):
+        self.selected = min(max(row, 0), len(self.rows) - 1) if self.rows else 0
+        if self.selected < self.top:
+            self.top = self.selected
+        elif self.selected >= self.top + self.visible_rows():
+            self.top = self.selected - self.visible_rows() + 1
+        self.render()
+
+    def move(self, delta):
+        self.select(self.selected + delta)
+        return "break"
+
+    def scroll(self, rows):
+        limit = max(len(self.rows) - self.visible_rows(), 0)
+        self.top = min(max(self.top + rows, 0), limit)
+        self.render()
+        return "break"
+
+    def yview(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll(int(float(amount) * len(self.rows)) - self.top)
+        elif unit == "pages":
+            self.scroll(int(amount) * self.visible_rows())
+        else:
+            self.scroll(int(amount))
+
+    def on_click(self, event):
+        self.select(self.top + event.y // self.row_height)
+        self.entry.focus_set()
+
+    def choose(self):
+        if self.rows:
+            self.on_choose(self.rows[self.selected])
+        return "break"
+
+    def render(self):
+        """
+        Redraws the rows in view: a few dozen canvas items at most.
+        """
+        bg, fg, select_bg = self.colors
+        self.canvas.delete("all")
+        width = self.canvas.winfo_width()
+        visible = self.visible_rows() + 1
+        for row in range(self.top, min(self.top + visible, len(self.rows))):
+            y = (row - self.top) * self.row_height
+            position = self.rows[row]
+            if row == self.selected:
+                self.canvas.create_rectangle(0, y, width, y + self.row_height,
+                                             fill=select_bg, width=0)
+            self.canvas.create_text(4, y + self.row_height // 2, anchor="w", fill=fg, font=self.font,
+                                    text=f"{position + 1}  {self.title(position) or '(empty)'}")
+        if self.rows:
+            first = self.top / len(self.rows)
+            self.scrollbar.set(first, min(first + visible / len(self.rows), 1))
+        else:
+            self.scrollbar.set(0, 1)
+
+
 class NotepadApp:
+    # Methods timed while tracing is on (see start_tracing).
+    TRACED_METHODS = ("load_config", "save_config", "flush_journal", "update_text",
+                      "load_next_chunk", "restyle_ui", "check_hover", "slide_in",
+                      "slide_out", "set_offset", "highlight_step", "run_ipc_commands",
+                      "check_transfer", "spell_check_step", "check_spelling",
+                      "update_completion")
+    
     def __init__(self, root):
         self.root = root
         self.root.overrideredirect(True)
@@ -30,14 +454,51 @@ class NotepadApp:
         
         # Use a unique configuration filename.
         self.config_file = "popout_notepad_config.json"
-        self.load_config()  # Loads button_size, side, current_font, theme, x_pos, y_pos, pages, current_page, text_font_size
+        # One file per page; the config only keeps the page index.
+        self.pages_dir = "popout_notepad_pages"
+        # Keystroke-level edits land here between snapshots. Every running
+        # instance has its own journal; the snapshot records how far into
+        # each one it is (journal_seqs).
+        self.instance_id = uuid.uuid4().hex[:8]
+        self.journal = EditJournal(f"popout_notepad_journal-{self.instance_id}.log")
+        self.journal_delay_ms = 250
+        self.journal_compact_bytes = 1024 * 1024
+        self._journal_after_id = None
+        self._adopted_journals = []
+        self._replayed_edits = 0
+        self.undo_file = "popout_notepad_undo.json"
+        
+        # Other instances may share the same store; their saves are merged
+        # in page by page (see start_sync).
+        self.watcher = None
+        self.sync_poll_ms = 1000
+        self._sync_after_id = None
+        self._sync_results = queue.Queue()
+        self._sync_reading = False
+        self._sync_again = False
+        self._merge_count = 0
+        self._own_generations = deque(maxlen=32)
+        self._generation_merges = OrderedDict()
+        
+        # Opt-in instrumentation: set POPOUT_NOTEPAD_TRACE to a file name to
+        # trace from startup, or use "Trace Performance" in the menu.
+        self.trace_file = os.environ.get("POPOUT_NOTEPAD_TRACE") or "popout_notepad_trace.json"
+        self.tracer = None
+        self.trace_overlay = None
+        self.lag_interval_ms = 100
+        self._lag_after_id = None
+        self._overlay_after_id = None
+        if os.environ.get("POPOUT_NOTEPAD_TRACE"):
+            self.start_tracing()
+        
+        self.load_config()  # Loads button_size, side, current_font, theme, x_pos, y_pos, pages, current_page, text_font_size, save_delay_ms, persist_undo, history_max_bytes, highlight_syntax, spell_check, complete_words
         
         # For backwards compatibility: if pages aren’t defined but "content" exists, use that.
         if not hasattr(self, "pages") or self.pages is None:
             if hasattr(self, "content") and self.content != "":
-                self.pages = [self.content]
+                self.pages = PageStore.from_texts(self.pages_dir, [self.content])
             else:
-                self.pages = [""]
+                self.pages = PageStore.from_texts(self.pages_dir, [""])
         if not hasattr(self, "current_page"):
             self.current_page = 0
         
@@ -52,6 +513,34 @@ class NotepadApp:
             self.theme = "light" if is_light_theme() else "dark"
         if not hasattr(self, "text_font_size"):
             self.text_font_size = 12  # Default text editor font size
+        if not hasattr(self, "save_delay_ms"):
+            self.save_delay_ms = 1000
+        if not hasattr(self, "persist_undo"):
+            self.persist_undo = False
+        if not hasattr(self, "history_max_bytes"):
+            self.history_max_bytes = 64 * 1024 * 1024
+        if not hasattr(self, "highlight_syntax"):
+            self.highlight_syntax = False
+        if not hasattr(self, "spell_check"):
+            self.spell_check = False
+        if not hasattr(self, "complete_words"):
+            self.complete_words = False
+        
+        # Undo/redo is kept per page, independent of the text widgets.
+        self.undo = UndoHistory()
+        if self.persist_undo:
+            self.load_undo_history()
+        
+        # Write-behind state: bursts of changes are merged into one save,
+        # which is written to disk on the writer thread.
+        self._config_dirty = False
+        self._save_after_id = None
+        self.writer = SnapshotWriter()
+        self.writer_poll_ms = 50
+        self._writer_after_id = None
+        self._save_error = False
+        self.gc_every_saves = 100
+        self._saves_until_gc = 0
         
         # Tkinter variables for the right-click menu.
         self.size_var = tk.IntVar(value=self.button_size)
@@ -59,6 +548,11 @@ class NotepadApp:
         self.side_var = tk.StringVar(value=self.side)
         self.theme_var = tk.StringVar(value=self.theme)
         self.text_font_size_var = tk.IntVar(value=self.text_font_size)
+        self.persist_undo_var = tk.BooleanVar(value=self.persist_undo)
+        self.highlight_var = tk.BooleanVar(value=self.highlight_syntax)
+        self.spell_var = tk.BooleanVar(value=self.spell_check)
+        self.complete_var = tk.BooleanVar(value=self.complete_words)
+        self.trace_var = tk.BooleanVar(value=self.tracer is not None)
         
         self.update_colors()
         
@@ -68,27 +562,166 @@ class NotepadApp:
         self.screen_width = self.root.winfo_screenwidth()
         self.screen_height = self.root.winfo_screenheight()
         self.is_expanded = False
+        self.animator = SlideAnimator(self.root)
+        
+        # Hover detection is event driven; check_hover is only a fallback
+        # poll that slows down while the pointer is far from the bar.
+        self.hover_poll_min_ms = 100
+        self.hover_poll_max_ms = 2000
+        self.hover_near_px = 150
+        self.hover_wakeups = 0
+        self._hover_interval = self.hover_poll_min_ms
+        self._hover_after_id = None
+        # A panel shown by a command stays out this long, or until the
+        # pointer has been on it.
+        self.show_hold_s = 5.0
+        self._hold_open_until = 0
+        
+        # The search index is built in idle time the first time search is
+        # used, then kept up to date page by page.
+        self.search_index = None
+        self._index_stale = set()
+        self.index_walker = IdlePageWalker(self.root, lambda: self.pages, self.index_page,
+                                           self.show_index_progress, self.finish_search_index)
+        self.hidden_widgets = {"search_entry", "search_status", "progress_label", "navigator"}
+        
+        # Word completion draws on an index of the words on every page,
+        # built in idle time like the search index and then kept current
+        # from each journaled edit. The best completion is shown in grey
+        # after the cursor; Tab takes it.
+        self.completions = None
+        self.completion_walker = IdlePageWalker(
+            self.root, lambda: self.pages, lambda page_id, text: self.completions.add_text(text))
+        self._completion_after_id = None
+        self._suggestion = None
+        
+        # Large pages are streamed into the text widget in chunks.
+        self.load_first_chars = 32 * 1024
+        self.load_chunk_chars = 64 * 1024
+        self._load_after_id = None
+        self._load_callbacks = []
+        
+        # Copy and paste above this size are streamed the same way.
+        self.stream_threshold_chars = 256 * 1024
+        self.stream_chunk_chars = 64 * 1024
+        self._stream_after_id = None
+        
+        # Recently shown pages keep their own (hidden) text widget so going
+        # back to them is just a swap.
+        self.page_widgets = OrderedDict()
+        self.widget_cache_pages = 8
+        self.widget_cache_chars = 4 * 1024 * 1024
+        self.text_widget = None
+        self._dirty_pages = set()
+        
+        # Markdown highlighting re-lexes edited lines right away (before the
+        # next redraw) and everything else in idle slices, visible lines
+        # first.
+        self.highlight_slice_s = 0.008
+        self.highlight_batch_lines = 200
+        self._highlight_after_id = None
+        
+        # Spell checking runs on a worker thread (see notepad_spell), a
+        # batch of lines at a time: edited and visible lines first, the
+        # rest of the page after. Typing only queues lines; checking starts
+        # once it pauses for spell_delay_ms.
+        self.spell_checker = SpellChecker()
+        self.spell_delay_ms = 300
+        self.spell_batch_lines = 200
+        self.spell_poll_ms = 20
+        self._spell_after_id = None
+        self._spell_pending = False
+        self._spell_typed_at = 0
         
         # Set up geometry and build the UI.
         self.set_geometry_parameters()
         self.build_ui()
         self.root.bind("<Button-3>", self.show_settings_menu)
-        self.check_hover()
+        self.root.bind("<Leave>", self.on_pointer_crossing)
+        self.root.bind("<Control-f>", self.open_search)
+        self.root.bind("<Control-g>", self.open_navigator)
+        self.root.bind("<Escape>", self.cancel_stream)
+        self.root.bind("<Escape>", self.cancel_transfer, add="+")
+        
+        # Only the collapsed bar is set up so far; the first page is loaded
+        # and hover polling started once the window is on screen.
+        self.startup_probe = os.environ.get("POPOUT_NOTEPAD_STARTUP_PROBE")
+        self._first_map_id = self.root.bind("<Map>", self.on_first_map)
+        
+        # Relaunches and the command line hand their requests to this panel
+        # (see notepad_ipc). Commands arriving within ipc_batch_ms of each
+        # other are applied together and saved once.
+        self.ipc = None
+        self.ipc_poll_ms = 250
+        self.ipc_batch_ms = 20
+        self._ipc_poll_id = None
+        self._ipc_after_id = None
+        self.start_ipc()
+        
+        # Bulk import and export (see notepad_transfer) run on a worker
+        # thread. Imported pages come over a short queue a batch at a time,
+        # so the worker never reads far ahead of what has been added.
+        self.transfer_queue_batches = 2
+        self._transfer = None
+        
+        # Write migrated or replayed pages out so they can leave memory.
+        # What the config on disk holds, so a slide with nothing changed
+        # does not rewrite it (see has_unsaved_changes).
+        self._saved_settings = self.settings_config()
+        self._saved_journal_seq = self.journal.seq
+        if self.pages.has_unsaved():
+            self.schedule_save()
         
         # Save text on exit.
         self.root.protocol("WM_DELETE_WINDOW", self.on_exit)
     
+    def on_first_map(self, event):
+        """
+        Runs once the window is mapped and finishes startup in the next idle
+        slot, after the bar has been drawn.
+        """
+        self.root.unbind("<Map>", self._first_map_id)
+        self.report_startup("mapped")
+        self.root.after_idle(self.finish_startup)
+    
+    def finish_startup(self):
+        self.update_text()
+        self.check_hover()
+        self.start_sync()
+        if self.complete_words:
+            self.ensure_completion_index()
+        self.when_page_loaded(lambda: self.report_startup("ready"))
+    
+    def report_startup(self, stage):
+        """
+        With POPOUT_NOTEPAD_STARTUP_PROBE set to a file name, appends the time
+        each startup stage is reached to that file and quits once the first
+        page is loaded. Used by the cold_start benchmark.
+        """
+        if not self.startup_probe:
+            return
+        with open(self.startup_probe, "a") as f:
+            f.write(f"{stage} {time.time():.6f}\n")
+        if stage == "ready":
+            self.root.after_idle(self.root.destroy)
+    
     def update_colors(self):
         if self.theme == "light":
             self.bg_color = "#ffffff"
             self.btn_color = "#f0f0f0"
             self.fg_color = "#000000"
             self.handle_color = "#d0d0d0"
+            self.match_color = "#ffe27a"
+            self.syntax_colors = {"accent": "#1f5fbf", "dim": "#6a737d", "code": "#8a3b00",
+                                  "keyword": "#a626a4", "string": "#2e7d32", "number": "#b35900"}
         else:
             self.bg_color = "#333333"
             self.btn_color = "#555555"
             self.fg_color = "#ffffff"
             self.handle_color = "#444444"
+            self.match_color = "#7a6300"
+            self.syntax_colors = {"accent": "#7fb4ff", "dim": "#9aa0a6", "code": "#f0b27a",
+                                  "keyword": "#d79bff", "string": "#98d982", "number": "#f5c07a"}
         self.root.configure(bg=self.bg_color)
     
     def load_config(self):
@@ -102,13 +735,34 @@ class NotepadApp:
                 self.theme = config.get("theme", "light")
                 self.x_pos = config.get("x_pos", None)
                 self.y_pos = config.get("y_pos", None)
-                # If multi-page configuration exists, load that; otherwise load content.
-                self.pages = config.get("pages", None)
-                if self.pages is None:
-                    self.content = config.get("content", "")
-                    self.pages = [self.content]
+                # Page bodies are loaded on demand from the page store. Older
+                # configs keep them inline under "pages" (or a single
+                # "content"); those are migrated on the next save.
+                page_index = config.get("page_index", None)
+                if page_index is not None:
+                    self.pages = PageStore(self.pages_dir, page_index)
+                else:
+                    texts = config.get("pages", None)
+                    if texts is None:
+                        self.content = config.get("content", "")
+                        texts = [self.content]
+                    self.pages = PageStore.from_texts(self.pages_dir, texts)
                 self.current_page = config.get("current_page", 0)
                 self.text_font_size = config.get("text_font_size", 12)
+                self.save_delay_ms = config.get("save_delay_ms", 1000)
+                self.persist_undo = config.get("persist_undo", False)
+                self.history_max_bytes = config.get("history_max_bytes", 64 * 1024 * 1024)
+                self.highlight_syntax = config.get("highlight_syntax", False)
+                self.spell_check = config.get("spell_check", False)
+                self.complete_words = config.get("complete_words", False)
+                self.generation = config.get("generation")
+                self.journal_seqs = dict(config.get("journal_seqs", {}))
+                if "journal_seq" in config:
+                    # Snapshot from before per-instance journals.
+                    self.journal_seqs.setdefault("", config["journal_seq"])
+                self._sync_base = self.pages.saved_versions()
+                # Apply edits made after this snapshot was written.
+                self.replay_journals()
             except Exception:
                 self.button_size = 48
                 self.side = "right"
@@ -116,9 +770,20 @@ class NotepadApp:
                 self.theme = "light"
                 self.x_pos = None
                 self.y_pos = None
-                self.pages = [""]
+                self.pages = PageStore.from_texts(self.pages_dir, [""])
                 self.current_page = 0
                 self.text_font_size = 12
+                self.save_delay_ms = 1000
+                self.persist_undo = False
+                self.history_max_bytes = 64 * 1024 * 1024
+                self.highlight_syntax = False
+                self.spell_check = False
+                self.complete_words = False
+                # Journaled edits refer to the unreadable snapshot, so they
+                # are not replayed.
+                self.generation = None
+                self.journal_seqs = {}
+                self._sync_base = {}
         else:
             self.button_size = 48
             self.side = "right"
@@ -126,28 +791,196 @@ class NotepadApp:
             self.theme = "light"
             self.x_pos = None
             self.y_pos = None
-            self.pages = [""]
+            self.pages = PageStore.from_texts(self.pages_dir, [""])
             self.current_page = 0
             self.text_font_size = 12
+            self.save_delay_ms = 1000
+            self.persist_undo = False
+            self.history_max_bytes = 64 * 1024 * 1024
+            self.highlight_syntax = False
+            self.spell_check = False
+            self.complete_words = False
+            self.generation = None
+            self.journal_seqs = {}
+            self._sync_base = {}
+            # No snapshot yet: the journals hold everything typed so far.
+            self.replay_journals()
+        # A replayed delete (or a hand-edited config) can leave the saved
+        # page past the end.
+        self.current_page = min(max(self.current_page, 0), len(self.pages) - 1)
+    
+    def replay_journals(self):
+        """
+        Applies edits journaled after the loaded snapshot by instances that
+        are no longer running, including a crashed earlier run of this one.
+        Running instances hold a lock on their journal and are skipped;
+        their edits arrive through their own saves.
+        """
+        for journal in self._adopted_journals:
+            journal.close()
+        self._adopted_journals = []
+        self._replayed_edits = 0
+        for path in sorted(glob.glob("popout_notepad_journal*.log")):
+            if path == self.journal.path:
+                continue
+            journal = EditJournal(path)
+            if not journal.adopt():
+                continue
+            # "popout_notepad_journal-<instance>.log"; the old single journal
+            # maps to instance "".
+            instance = path[len("popout_notepad_journal"):-len(".log")].lstrip("-")
+            after_seq = self.journal_seqs.get(instance, 0)
+            self._replayed_edits += journal.replay(self.pages, after_seq)
+            self.journal_seqs[instance] = journal.seq
+            # Deleted once a snapshot containing its edits is on disk.
+            self._adopted_journals.append(journal)
     
     def save_config(self):
-        # Save current page content without trailing newline.
-        if hasattr(self, "text_widget"):
-            content = self.text_widget.get("1.0", tk.END).rstrip("\n")
-            self.pages[self.current_page] = content
-        config = {
+        """
+        Captures settings and unsaved pages and queues them for the writer
+        thread; the Tk thread never waits for the disk here. finish_save
+        handles the outcome.
+        """
+        # Save current page content without trailing newline. Pending edits
+        # are journaled first so journal_seqs matches the snapshot exactly.
+        self.save_current_page()
+        page_index, page_writes, obsolete, changes = self.pages.begin_write()
+        settings = self.settings_config()
+        self._saved_settings = settings
+        self._saved_journal_seq = self.journal.seq
+        config = dict(
+            settings,
+            page_index=page_index,
+            journal_seqs=dict(self.journal_seqs, **{self.instance_id: self.journal.seq}),
+            # Tells this save apart from other instances' saves.
+            generation=uuid.uuid4().hex
+        )
+        self._own_generations.append(config["generation"])
+        self._generation_merges[config["generation"]] = self._merge_count
+        undo = self.undo.to_json() if self.persist_undo else None
+        # Old versions are trimmed on the first save and every gc_every_saves after.
+        gc_max_bytes = None
+        if self._saves_until_gc <= 0:
+            gc_max_bytes = self.history_max_bytes
+            self._saves_until_gc = self.gc_every_saves
+        self._saves_until_gc -= 1
+        self.writer.submit(Snapshot(self.config_file, config, self.pages_dir, page_writes,
+                                    obsolete, changes, self.undo_file, undo, gc_max_bytes))
+        if self._writer_after_id is None:
+            self._writer_after_id = self.root.after(self.writer_poll_ms, self.check_writer)
+    
+    def settings_config(self):
+        """
+        The settings part of the config, for save_config.
+        """
+        return {
             "button_size": self.button_size,
             "side": self.side,
             "current_font": self.current_font,
             "theme": self.theme,
             "x_pos": self.x_pos,
             "y_pos": self.y_pos,
-            "pages": self.pages,
             "current_page": self.current_page,
-            "text_font_size": self.text_font_size
+            "text_font_size": self.text_font_size,
+            "save_delay_ms": self.save_delay_ms,
+            "persist_undo": self.persist_undo,
+            "history_max_bytes": self.history_max_bytes,
+            "highlight_syntax": self.highlight_syntax,
+            "spell_check": self.spell_check,
+            "complete_words": self.complete_words,
         }
-        with open(self.config_file, "w") as f:
-            json.dump(config, f)
+    
+    def has_unsaved_changes(self):
+        """
+        Whether anything saved in the config changed since the last save:
+        journaled edits, pages not written yet, or a setting.
+        """
+        return (self.journal.seq != self._saved_journal_seq or self.pages.has_unsaved()
+                or bool(self._adopted_journals) or self.settings_config() != self._saved_settings)
+    
+    def check_writer(self):
+        # Polled only while a write is in flight.
+        self._writer_after_id = None
+        for snapshot, error in self.writer.results():
+            self.finish_save(snapshot, error)
+        if self.writer.busy():
+            self._writer_after_id = self.root.after(self.writer_poll_ms, self.check_writer)
+    
+    def finish_save(self, snapshot, error):
+        # Snapshots merged in the writer report only the newest generation.
+        generation = snapshot.config["generation"]
+        merges = None
+        while self._generation_merges:
+            pending, count = self._generation_merges.popitem(last=False)
+            if pending == generation:
+                merges = count
+                break
+        self.pages.end_write(snapshot, error is None)
+        if error is not None:
+            # Nothing is lost: the journal still has every edit. Try again.
+            self._save_error = True
+            self.show_progress(f"Save failed: {error}")
+            self.schedule_save()
+            return
+        if self._save_error:
+            self._save_error = False
+            self.hide_progress()
+        # Only truncate the journal if nothing was journaled after the
+        # snapshot was taken; newer records are replayed on top of it.
+        if self.journal.seq == snapshot.config["journal_seqs"][self.instance_id]:
+            self.journal.reset()
+        for journal in self._adopted_journals:
+            journal.reset()
+        self._adopted_journals = []
+        self.generation = generation
+        # This header is what other instances will merge against, unless a
+        # merge of theirs happened after it was captured.
+        if merges == self._merge_count:
+            self._sync_base = entry_versions(snapshot.config["page_index"])
+    
+    def wait_for_writes(self):
+        """
+        Blocks until every queued snapshot is on disk.
+        """
+        self.writer.wait()
+        self.check_writer()
+    
+    def load_undo_history(self):
+        """
+        Restores undo history saved with the last snapshot. It is only valid
+        for exactly that page content, so it is ignored if it belongs to
+        another save or journals replayed newer edits on top.
+        """
+        try:
+            with open(self.undo_file, "r") as f:
+                saved = json.load(f)
+            if (saved.get("generation") is not None and saved["generation"] == self.generation
+                    and not self._replayed_edits):
+                self.undo.load_json(saved.get("pages", {}))
+        except Exception:
+            pass
+    
+    def schedule_save(self):
+        """
+        Marks the configuration dirty and (re)arms the write-behind timer, so
+        a burst of changes results in a single save once things go idle.
+        """
+        self._config_dirty = True
+        if self._save_after_id is not None:
+            self.root.after_cancel(self._save_after_id)
+        self._save_after_id = self.root.after(self.save_delay_ms, self.flush_config)
+    
+    def flush_config(self):
+        """
+        Writes the configuration now if anything is pending.
+        """
+        if self._save_after_id is not None:
+            self.root.after_cancel(self._save_after_id)
+            self._save_after_id = None
+        if self._config_dirty:
+            self._config_dirty = False
+            self.save_config()
+    
     def set_geometry_parameters(self):
         bs = self.button_size
         self.handle_height = bs // 4
@@ -186,195 +1019,354 @@ class NotepadApp:
     def update_geometry(self):
         if self.side in ["right", "left"]:
             self.root.geometry(f"{self.total_width}x{self.full_height}+{self.current_offset}+{self.y_pos}")
-            if self.side == "right":
-                if self.current_offset == self.x_hidden:
-                    self.sideLabel.place(x=self.sliding_width, y=0, width=self.hidden_size, height=self.full_height)
-                else:
-                    self.sideLabel.place_forget()
-            else:
-                if self.current_offset == self.x_hidden:
-                    self.sideLabel.place(x=0, y=0, width=self.hidden_size, height=self.full_height)
-                else:
-                    self.sideLabel.place_forget()
+            bar_visible = self.current_offset == self.x_hidden
         elif self.side in ["top", "bottom"]:
             self.root.geometry(f"{self.full_width}x{self.total_height}+{self.x_pos}+{self.current_offset}")
-            if self.side == "top":
-                if self.current_offset == self.y_hidden:
-                    self.sideLabel.place(x=0, y=self.sliding_height, width=self.full_width, height=self.hidden_size)
-                else:
-                    self.sideLabel.place_forget()
-            else:
-                if self.current_offset == self.y_hidden:
-                    self.sideLabel.place(x=0, y=0, width=self.full_width, height=self.hidden_size)
-                else:
-                    self.sideLabel.place_forget()
+            bar_visible = self.current_offset == self.y_hidden
+        # Only touch the side label when its visibility flips, not on every
+        # animation frame.
+        if bar_visible == self.side_label_visible:
+            return
+        self.side_label_visible = bar_visible
+        if not bar_visible:
+            self.sideLabel.place_forget()
+        elif self.side == "right":
+            self.sideLabel.place(x=self.sliding_width, y=0, width=self.hidden_size, height=self.full_height)
+        elif self.side == "left":
+            self.sideLabel.place(x=0, y=0, width=self.hidden_size, height=self.full_height)
+        elif self.side == "top":
+            self.sideLabel.place(x=0, y=self.sliding_height, width=self.full_width, height=self.hidden_size)
+        else:
+            self.sideLabel.place(x=0, y=0, width=self.full_width, height=self.hidden_size)
 
     def build_ui(self):
-        bs = self.button_size
+        """
+        Creates the panel widgets once. Later setting changes restyle and
+        re-place these same widgets through restyle_ui.
+        """
         # Create the side label (e.g., "C\nA\nL\nC")
-        self.sideLabel = tk.Label(
-            self.root,
-            text="C\nA\nL\nC",
-            font=(self.current_font, 10),
-            bg=self.bg_color,
-            fg=self.fg_color
+        self.sideLabel = tk.Label(self.root, text="C\nA\nL\nC")
+        self.sideLabel.bind("<Enter>", self.on_pointer_crossing)
+        self.side_label_visible = False
+        
+        # Draggable handle
+        self.drag_handle = tk.Frame(self.root, cursor="fleur")
+        self.drag_handle.bind("<ButtonPress-1>", self.start_move)
+        self.drag_handle.bind("<B1-Motion>", self.do_move)
+        
+        # Copy and Paste buttons
+        self.copy_button = tk.Button(self.root, text="Copy", bd=0, relief="flat", command=self.copy_text)
+        self.paste_button = tk.Button(self.root, text="Paste", bd=0, relief="flat", command=self.paste_text)
+        
+        # Search bar, shown in place of Copy/Paste while searching.
+        self.search_var = tk.StringVar()
+        self.search_entry = tk.Entry(self.root, textvariable=self.search_var, bd=0, relief="flat")
+        self.search_entry.bind("<Return>", self.find_next)
+        self.search_entry.bind("<Escape>", self.close_search)
+        self.search_status = tk.Label(self.root, anchor="center")
+        
+        # Shown over the bottom of the text area during long operations.
+        self.progress_label = tk.Label(self.root, anchor="w")
+        self.progress_label.bind("<Button-1>", self.cancel_stream)
+        self.progress_label.bind("<Button-1>", self.cancel_transfer, add="+")
+        
+        # Navigation buttons: Prev, Delete, New, Next
+        self.prev_button = tk.Button(
+            self.root, text="<<", bd=0, relief="flat",
+            command=lambda: [self.save_current_page(), self.prev_page()]
+        )
+        self.delete_button = tk.Button(
+            self.root, text="del", bd=0, relief="flat",
+            command=lambda: [self.save_current_page(), self.delete_page()]
+        )
+        self.new_page_button = tk.Button(
+            self.root, text="+", bd=0, relief="flat",
+            command=lambda: [self.save_current_page(), self.add_page()]
+        )
+        self.next_button = tk.Button(
+            self.root, text=">>", bd=0, relief="flat",
+            command=lambda: [self.save_current_page(), self.next_page()]
         )
-        copy_font_size = max(bs // 3 - 2, 8)
         
-        if self.side in ["right", "left"]:
-            sliding_x = 0 if self.side == "right" else self.hidden_size
-            # Draggable handle
-            self.drag_handle = tk.Frame(self.root, bg=self.handle_color, height=self.handle_height, cursor="fleur")
-            self.drag_handle.place(x=0, y=0, width=self.total_width, height=self.handle_height)
-            self.drag_handle.bind("<ButtonPress-1>", self.start_move)
-            self.drag_handle.bind("<B1-Motion>", self.do_move)
-            
-            # Copy and Paste buttons
-            self.copy_button = tk.Button(
-                self.root, text="Copy", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color, command=self.copy_text
-            )
-            self.copy_button.place(x=sliding_x, y=self.handle_height,
-                                   width=self.sliding_width // 2, height=self.copy_height)
-            self.paste_button = tk.Button(
-                self.root, text="Paste", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color, command=self.paste_text
-            )
-            self.paste_button.place(x=sliding_x + self.sliding_width // 2, y=self.handle_height,
-                                    width=self.sliding_width // 2, height=self.copy_height)
-            
-            text_y = self.handle_height + self.copy_height
-            # Multi-page text widget
-            self.text_widget = scrolledtext.ScrolledText(
-                self.root, font=(self.current_font, self.text_font_size),
-                bg=self.bg_color, fg=self.fg_color, wrap="word"
-            )
-            self.text_widget.place(x=sliding_x, y=text_y,
-                                   width=self.sliding_width, height=self.text_height)
-            self.text_widget.delete("1.0", tk.END)
-            self.text_widget.insert(tk.END, self.pages[self.current_page])
-            
-            # Navigation buttons: Prev, Delete, New, Next
-            nav_y = text_y + self.text_height + 5
-            nav_x = sliding_x
-            button_width = int(self.sliding_width / 4)
-            self.prev_button = tk.Button(
-                self.root, text="<<", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color,
-                command=lambda: [self.save_current_page(), self.prev_page()]
-            )
-            self.prev_button.place(x=nav_x, y=nav_y, width=button_width, height=30)
-            self.delete_button = tk.Button(
-                self.root, text="del", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color,
-                command=lambda: [self.save_current_page(), self.delete_page()]
-            )
-            self.delete_button.place(x=nav_x + button_width, y=nav_y, width=button_width, height=30)
-            self.new_page_button = tk.Button(
-                self.root, text="+", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color,
-                command=lambda: [self.save_current_page(), self.add_page()]
-            )
-            self.new_page_button.place(x=nav_x + 2 * button_width, y=nav_y, width=button_width, height=30)
-            self.next_button = tk.Button(
-                self.root, text=">>", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color,
-                command=lambda: [self.save_current_page(), self.next_page()]
-            )
-            self.next_button.place(x=nav_x + 3 * button_width, y=nav_y, width=button_width, height=30)
-            
-        elif self.side in ["top", "bottom"]:
-            sliding_y = 0 if self.side == "top" else self.hidden_size
-            self.drag_handle = tk.Frame(self.root, bg=self.handle_color, height=self.handle_height, cursor="fleur")
-            self.drag_handle.place(x=0, y=sliding_y, width=self.full_width, height=self.handle_height)
-            self.drag_handle.bind("<ButtonPress-1>", self.start_move)
-            self.drag_handle.bind("<B1-Motion>", self.do_move)
-            
-            self.copy_button = tk.Button(
-                self.root, text="Copy", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color, command=self.copy_text
-            )
-            self.copy_button.place(x=0, y=sliding_y + self.handle_height,
-                                   width=self.full_width // 2, height=self.copy_height)
-            self.paste_button = tk.Button(
-                self.root, text="Paste", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color, command=self.paste_text
-            )
-            self.paste_button.place(x=self.full_width // 2, y=sliding_y + self.handle_height,
-                                    width=self.full_width // 2, height=self.copy_height)
-            
-            text_y = sliding_y + self.handle_height + self.copy_height
-            self.text_widget = scrolledtext.ScrolledText(
-                self.root, font=(self.current_font, self.text_font_size),
-                bg=self.bg_color, fg=self.fg_color, wrap="word"
-            )
-            self.text_widget.place(x=0, y=text_y,
-                                   width=self.full_width, height=self.text_height)
-            self.text_widget.delete("1.0", tk.END)
-            self.text_widget.insert(tk.END, self.pages[self.current_page])
-            
-            nav_y = text_y + self.text_height + 5
-            nav_x = 0
-            button_width = int(self.full_width / 4)
-            self.prev_button = tk.Button(
-                self.root, text="<<", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color,
-                command=lambda: [self.save_current_page(), self.prev_page()]
-            )
-            self.prev_button.place(x=nav_x, y=nav_y, width=button_width, height=30)
-            self.delete_button = tk.Button(
-                self.root, text="del", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color,
-                command=lambda: [self.save_current_page(), self.delete_page()]
-            )
-            self.delete_button.place(x=nav_x + button_width, y=nav_y, width=button_width, height=30)
-            self.new_page_button = tk.Button(
-                self.root, text="+", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color,
-                command=lambda: [self.save_current_page(), self.add_page()]
-            )
-            self.new_page_button.place(x=nav_x + 2 * button_width, y=nav_y, width=button_width, height=30)
-            self.next_button = tk.Button(
-                self.root, text=">>", bg=self.btn_color, fg=self.fg_color,
-                font=(self.current_font, copy_font_size), bd=0, relief="flat",
-                activebackground=self.bg_color,
-                command=lambda: [self.save_current_page(), self.next_page()]
-            )
-            self.next_button.place(x=nav_x + 3 * button_width, y=nav_y, width=button_width, height=30)
+        # Suggested rest of the word being typed, placed after the cursor.
+        self.completion_label = tk.Label(self.root, anchor="w", bd=0, padx=0, pady=0)
+        
+        # Jump-to-page list, shown over the text area (Ctrl+G).
+        self.navigator = PageNavigator(self.root, self.jump_to_page, self.close_navigator)
         
+        self.build_settings_menu()
+        
+        # The page text widgets are created by update_text, after startup.
+        self.apply_style()
+        self.apply_layout()
+    
+    def make_text_widget(self, page_id):
+        widget = scrolledtext.ScrolledText(self.root, wrap="word")
+        widget.page_id = page_id
+        widget.char_count = 0
+        # Undo state: whether edits are recorded, where the last recorded
+        # edit ended (to group keystrokes), and whether to merge everything
+        # into the current step (used by streamed pastes).
+        widget.recording = False
+        widget.undo_anchor = None
+        widget.undo_merge_all = False
+        # Lexer states per line, for incremental highlighting.
+        widget.line_states = LineStates(LEXERS["markdown"])
+        widget.provisional_view = None
+        # Lines still to spell check.
+        widget.spell_lines = SpellLines()
+        # Set if the page's text could not be read; the widget is then
+        # read-only so the empty page is never saved over the note.
+        widget.unreadable = False
+        # Wrap the widget's Tcl command in a proc that hands inserts and
+        # deletes to on_text_edit before Tk applies them. The proc stays
+        # in Tcl so errors from the real command remain plain Tcl errors.
+        original = widget._w + "_orig"
+        recorder = widget.register(lambda *args: self.on_text_edit(widget, *args))
+        self.root.tk.call("rename", widget._w, original)
+        self.root.tk.eval(
+            f"proc {widget._w} args {{\n"
+            f"    if {{[lindex $args 0] in {{insert delete replace}}}} {{{recorder} {{*}}$args}}\n"
+            f"    tailcall {original} {{*}}$args\n"
+            "}"
+        )
+        widget.bind("<<Modified>>", self.on_text_modified)
+        widget.bind("<<Undo>>", self.undo_edit)
+        widget.bind("<<Redo>>", self.redo_edit)
+        # Bound on the widget too so it wins over Text's own Control-f.
+        widget.bind("<Control-f>", self.open_search)
+        widget.bind("<Tab>", self.accept_completion)
+        widget.bind("<Escape>", self.dismiss_completion)
+        widget.bind("<KeyRelease>", self.check_completion_position)
+        widget.bind("<Button-1>", lambda event: self.hide_completion())
+        widget.configure(yscrollcommand=lambda first, last: self.on_text_scroll(widget, first, last))
+        self.style_text_widget(widget)
+        return widget
+    
+    def destroy_text_widget(self, widget):
+        # Put the real widget command back before Tk destroys it, and take
+        # the ScrolledText's frame and scrollbar along.
+        self.root.tk.call("rename", widget._w, "")
+        self.root.tk.call("rename", widget._w + "_orig", widget._w)
+        widget.frame.destroy()
+    
+    def style_text_widget(self, widget):
+        widget.configure(font=(self.current_font, self.text_font_size),
+                         bg=self.bg_color, fg=self.fg_color)
+        widget.tag_configure("search_match", background=self.match_color)
+        self.style_highlight_tags(widget)
+    
+    def style_highlight_tags(self, widget):
+        # Foreground and font only, so selection and search backgrounds
+        # still show through. Tags are created in TAGS order, which makes
+        # token tags win over the "code" tag of a fenced block.
+        colors = self.syntax_colors
+        size = self.text_font_size
+        styles = {
+            "heading": {"foreground": colors["accent"], "font": (self.current_font, size + 2, "bold")},
+            "list": {"foreground": colors["accent"]},
+            "checkbox": {"foreground": colors["accent"]},
+            "quote": {"foreground": colors["dim"]},
+            "fence": {"foreground": colors["dim"], "font": ("Courier", size)},
+            "code": {"foreground": colors["code"], "font": ("Courier", size)},
+            "inline_code": {"foreground": colors["code"], "font": ("Courier", size)},
+            "strong": {"font": (self.current_font, size, "bold")},
+            "emph": {"font": (self.current_font, size, "italic")},
+            "link": {"foreground": colors["accent"], "underline": True},
+            "keyword": {"foreground": colors["keyword"]},
+            "string": {"foreground": colors["string"]},
+            "comment": {"foreground": colors["dim"]},
+            "number": {"foreground": colors["number"]},
+            "variable": {"foreground": colors["number"]},
+        }
+        for tag in TAGS:
+            widget.tag_configure("hl_" + tag, **styles[tag])
+        widget.tag_configure("misspelled", underline=True)
+        try:
+            widget.tag_configure("misspelled", underlinefg="red")
+        except tk.TclError:
+            pass  # Tk before 8.6.6 underlines in the text colour
+    
+    def widget_layout(self):
+        """
+        Returns name -> (x, y, width, height) for every placed widget. All
+        four docking sides share this description; they only differ in
+        where the sliding area starts and how wide it is.
+        """
+        if self.side in ["right", "left"]:
+            origin_x = 0 if self.side == "right" else self.hidden_size
+            origin_y = 0
+            width = self.sliding_width
+            window_width = self.total_width
+        else:
+            origin_x = 0
+            origin_y = 0 if self.side == "top" else self.hidden_size
+            width = self.full_width
+            window_width = self.full_width
+        copy_y = origin_y + self.handle_height
+        text_y = copy_y + self.copy_height
+        # Extra space below the text area holds the navigation buttons.
+        nav_y = text_y + self.text_height + 5
+        button_width = int(width / 4)
+        return {
+            "drag_handle": (0, origin_y, window_width, self.handle_height),
+            "copy_button": (origin_x, copy_y, width // 2, self.copy_height),
+            "paste_button": (origin_x + width // 2, copy_y, width // 2, self.copy_height),
+            "search_entry": (origin_x, copy_y, width * 3 // 4, self.copy_height),
+            "search_status": (origin_x + width * 3 // 4, copy_y, width - width * 3 // 4, self.copy_height),
+            "text_widget": (origin_x, text_y, width, self.text_height),
+            "navigator": (origin_x, text_y, width, self.text_height),
+            "progress_label": (origin_x, text_y + self.text_height - 18, width, 18),
+            "prev_button": (origin_x, nav_y, button_width, 30),
+            "delete_button": (origin_x + button_width, nav_y, button_width, 30),
+            "new_page_button": (origin_x + 2 * button_width, nav_y, button_width, 30),
+            "next_button": (origin_x + 3 * button_width, nav_y, button_width, 30),
+        }
+    
+    def apply_layout(self):
+        for name, (x, y, width, height) in self.widget_layout().items():
+            widget = getattr(self, name)
+            if widget is None:
+                continue  # no text widget before the first page is loaded
+            if name in self.hidden_widgets:
+                widget.place_forget()
+            else:
+                widget.place(x=x, y=y, width=width, height=height)
+        # The bar may have moved even if its visibility did not change.
+        self.side_label_visible = None
         self.update_geometry()
-    def rebuild_ui(self):
+    
+    def apply_style(self):
+        copy_font_size = max(self.button_size // 3 - 2, 8)
+        self.sideLabel.configure(font=(self.current_font, 10), bg=self.bg_color, fg=self.fg_color)
+        self.drag_handle.configure(bg=self.handle_color)
+        for button in (self.copy_button, self.paste_button, self.prev_button,
+                       self.delete_button, self.new_page_button, self.next_button):
+            button.configure(bg=self.btn_color, fg=self.fg_color,
+                             font=(self.current_font, copy_font_size),
+                             activebackground=self.bg_color)
+        for widget in self.page_widgets.values():
+            self.style_text_widget(widget)
+        self.search_entry.configure(font=(self.current_font, copy_font_size),
+                                    bg=self.bg_color, fg=self.fg_color,
+                                    insertbackground=self.fg_color)
+        self.search_status.configure(font=(self.current_font, max(copy_font_size - 2, 8)),
+                                     bg=self.btn_color, fg=self.fg_color)
+        self.progress_label.configure(font=(self.current_font, 8), bg=self.btn_color, fg=self.fg_color)
+        self.style_navigator()
+    
+    def style_navigator(self):
+        self.navigator.set_style((self.current_font, self.text_font_size), self.bg_color,
+                                 self.fg_color, self.handle_color)
+        self.completion_label.configure(font=(self.current_font, self.text_font_size),
+                                        bg=self.bg_color, fg=self.syntax_colors["dim"])
+    
+    def restyle_ui(self):
+        """
+        Applies changed settings to the existing widgets in place, keeping
+        the text, cursor, scroll position and undo state.
+        """
+        # The new layout starts at the resting offset for is_expanded.
+        self.animator.cancel()
         self.set_geometry_parameters()
         self.update_colors()
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        self.build_ui()
+        self.apply_style()
+        self.apply_layout()
     
     def copy_text(self):
         try:
-            selection = self.text_widget.get(tk.SEL_FIRST, tk.SEL_LAST)
+            start = self.text_widget.index(tk.SEL_FIRST)
+            end = self.text_widget.index(tk.SEL_LAST)
         except tk.TclError:
-            selection = self.text_widget.get("1.0", tk.END)
+            start, end = "1.0", tk.END
         self.root.clipboard_clear()
-        self.root.clipboard_append(selection)
+        size = self.text_widget.count(start, end, "chars")
+        size = size[0] if size else 0
+        if size <= self.stream_threshold_chars:
+            self.root.clipboard_append(self.text_widget.get(start, end))
+            return
+        # Large copies are appended to the clipboard a slice at a time
+        # instead of building one huge string first.
+        self.cancel_stream()
+        self.text_widget.mark_set("copy_pos", start)
+        self.text_widget.mark_set("copy_end", end)
+        self._stream_after_id = self.root.after_idle(self.copy_next_chunk, 0, size)
+    
+    def copy_next_chunk(self, copied, size):
+        deadline = time.perf_counter() + 0.010
+        while time.perf_counter() < deadline:
+            chunk_end = self.text_widget.index(f"copy_pos+{self.stream_chunk_chars}c")
+            if self.text_widget.compare(chunk_end, ">", "copy_end"):
+                chunk_end = self.text_widget.index("copy_end")
+            self.root.clipboard_append(self.text_widget.get("copy_pos", chunk_end))
+            self.text_widget.mark_set("copy_pos", chunk_end)
+            copied += self.stream_chunk_chars
+            if self.text_widget.compare("copy_pos", ">=", "copy_end"):
+                self.finish_stream()
+                return
+        self.show_progress(f"Copying {min(100 * copied // size, 99)}% - Esc to cancel")
+        self._stream_after_id = self.root.after_idle(self.copy_next_chunk, copied, size)
     
     def paste_text(self):
+        if self._load_after_id is not None or self.text_widget.unreadable:
+            return  # No edits until the page has finished loading.
         try:
             clip = self.root.clipboard_get()
-            self.text_widget.insert(tk.INSERT, clip)
         except tk.TclError:
-            pass
+            return
+        if len(clip) <= self.stream_threshold_chars:
+            self.text_widget.insert(tk.INSERT, clip)
+            return
+        # Large pastes go in a slice at a time at a mark that moves along
+        # with the inserted text; typing is blocked until they finish.
+        self.cancel_stream()
+        self.text_widget.mark_set("paste_pos", tk.INSERT)
+        self.text_widget.configure(state="disabled")
+        self.text_widget.undo_anchor = None
+        self._stream_after_id = self.root.after_idle(self.paste_next_chunk, clip, 0)
+    
+    def paste_next_chunk(self, clip, offset):
+        deadline = time.perf_counter() + 0.010
+        self.text_widget.configure(state="normal")
+        while offset < len(clip) and time.perf_counter() < deadline:
+            self.text_widget.insert("paste_pos", clip[offset:offset + self.stream_chunk_chars])
+            offset += self.stream_chunk_chars
+            # The whole paste is one undo step.
+            self.text_widget.undo_merge_all = True
+        if offset < len(clip):
+            self.text_widget.configure(state="disabled")
+            self.show_progress(f"Pasting {100 * offset // len(clip)}% - Esc to cancel")
+            self._stream_after_id = self.root.after_idle(self.paste_next_chunk, clip, offset)
+            return
+        self.text_widget.mark_set(tk.INSERT, "paste_pos")
+        self.text_widget.see(tk.INSERT)
+        self.finish_stream()
+    
+    def cancel_stream(self, event=None):
+        """
+        Stops a copy or paste in progress. Whatever was already pasted or
+        copied stays.
+        """
+        if self._stream_after_id is not None:
+            self.root.after_cancel(self._stream_after_id)
+            self.finish_stream()
+    
+    def cancel_transfer(self, event=None):
+        """
+        Stops a bulk import or export (Esc or a click on the progress
+        label). Pages already imported stay; a partial zip is removed.
+        """
+        if self._transfer is not None:
+            self._transfer[1].set()
+    
+    def finish_stream(self):
+        self._stream_after_id = None
+        self.text_widget.configure(state="normal")
+        self.text_widget.undo_merge_all = False
+        self.text_widget.undo_anchor = None
+        for mark in ("copy_pos", "copy_end", "paste_pos"):
+            self.text_widget.mark_unset(mark)
+        self.hide_progress()
     
     def start_move(self, event):
         if self.side in ["right", "left"]:
@@ -396,150 +1388,184 @@ class NotepadApp:
             new_x = max(0, min(new_x, self.screen_width - self.full_width))
             self.x_pos = new_x
         self.update_geometry()
-        self.save_config()
+        self.schedule_save()
     
     def on_exit(self):
-        self.save_config()
+        # Always write on exit: text edits are not tracked as dirty.
+        self._config_dirty = True
+        self.flush_config()
+        # The final snapshot has to be on disk before the process ends.
+        self.writer.close()
+        self.check_writer()
+        self.stop_sync()
+        self.stop_ipc()
+        self.spell_checker.close()
+        if self._transfer is not None:
+            self._transfer[1].set()
+        self.journal.close()
+        if self.tracer is not None:
+            self.stop_tracing()
         self.root.destroy()
     
-    def check_hover(self):
-        mouse_x, mouse_y = pyautogui.position()
+    def hover_rect(self):
+        """
+        Returns (left, top, right, bottom) of the area the pointer has to be
+        in: the whole panel while expanded, the bar while collapsed.
+        """
         if self.side in ["right", "left"]:
             if self.is_expanded:
-                full_left = self.x_visible if self.side == "right" else 0
-                full_right = self.screen_width if self.side == "right" else self.total_width
-                full_top = self.y_pos
-                full_bottom = self.y_pos + self.full_height
-                if not (full_left <= mouse_x <= full_right and full_top <= mouse_y <= full_bottom):
-                    self.slide_out()
-                    self.is_expanded = False
-            else:
-                if self.side == "right":
-                    bar_left = self.screen_width - self.hidden_size
-                    bar_right = self.screen_width
-                else:
-                    bar_left = 0
-                    bar_right = self.hidden_size
-                bar_top = self.y_pos
-                bar_bottom = self.y_pos + self.full_height
-                if (bar_left <= mouse_x <= bar_right and bar_top <= mouse_y <= bar_bottom):
-                    self.slide_in()
-                    self.is_expanded = True
-        elif self.side in ["top", "bottom"]:
-            if self.is_expanded:
-                full_left = self.x_pos
-                full_right = self.x_pos + self.full_width
-                full_top = self.y_visible
-                full_bottom = self.y_visible + self.total_height
-                if not (full_left <= mouse_x <= full_right and full_top <= mouse_y <= full_bottom):
-                    self.slide_out()
-                    self.is_expanded = False
+                left = self.x_visible if self.side == "right" else 0
+                right = self.screen_width if self.side == "right" else self.total_width
+            elif self.side == "right":
+                left = self.screen_width - self.hidden_size
+                right = self.screen_width
             else:
-                if self.side == "top":
-                    bar_top = self.sliding_height
-                    bar_bottom = self.sliding_height + self.hidden_size
-                else:
-                    bar_top = self.screen_height - self.hidden_size
-                    bar_bottom = self.screen_height
-                bar_left = self.x_pos
-                bar_right = self.x_pos + self.full_width
-                if (bar_left <= mouse_x <= bar_right and bar_top <= mouse_y <= bar_bottom):
-                    self.slide_in()
-                    self.is_expanded = True
-        self.root.after(100, self.check_hover)
+                left = 0
+                right = self.hidden_size
+            return left, self.y_pos, right, self.y_pos + self.full_height
+        if self.is_expanded:
+            top = self.y_visible
+            bottom = self.y_visible + self.total_height
+        elif self.side == "top":
+            top = self.sliding_height
+            bottom = self.sliding_height + self.hidden_size
+        else:
+            top = self.screen_height - self.hidden_size
+            bottom = self.screen_height
+        return self.x_pos, top, self.x_pos + self.full_width, bottom
+    
+    def update_hover(self, mouse_x, mouse_y):
+        """
+        Slides the panel in or out depending on where the pointer is.
+        Returns the pointer's distance in pixels from the hover area.
+        """
+        left, top, right, bottom = self.hover_rect()
+        distance = max(left - mouse_x, mouse_x - right, top - mouse_y, mouse_y - bottom, 0)
+        if distance == 0:
+            self._hold_open_until = 0
+        if self.is_expanded and distance > 0 and time.monotonic() >= self._hold_open_until:
+            self.slide_out()
+            self.is_expanded = False
+        elif not self.is_expanded and distance == 0:
+            self.slide_in()
+            self.is_expanded = True
+        return distance
+    
+    def on_pointer_crossing(self, event):
+        # <Enter> on the bar / <Leave> on the panel; the event already
+        # carries the pointer's screen position.
+        self.update_hover(event.x_root, event.y_root)
+        # The pointer is close by, so let the fallback poll catch up quickly.
+        self.schedule_hover_check(self.hover_poll_min_ms)
+    
+    def check_hover(self):
+        """
+        Fallback poll for crossings Tk does not report (e.g. the pointer
+        already sitting on the edge when the panel collapses). It backs off
+        while the pointer is far from the hover area.
+        """
+        self._hover_after_id = None
+        self.hover_wakeups += 1
+        mouse_x, mouse_y = pointer_position()
+        distance = self.update_hover(mouse_x, mouse_y)
+        if self.is_expanded or distance <= self.hover_near_px:
+            interval = self.hover_poll_min_ms
+        else:
+            interval = min(self._hover_interval * 2, self.hover_poll_max_ms)
+        self.schedule_hover_check(interval)
+    
+    def schedule_hover_check(self, interval):
+        if self._hover_after_id is not None:
+            self.root.after_cancel(self._hover_after_id)
+        self._hover_interval = interval
+        self._hover_after_id = self.root.after(interval, self.check_hover)
     
     def slide_in(self):
         """
         Animate the panel out to its visible offset, then save.
         """
-        step = 10
-
-        if self.side in ("right", "left"):
-            target = self.x_visible
-            current = self.current_offset
-        else:
-            target = self.y_visible
-            current = self.current_offset
-
-        if current != target:
-            if target < current:
-                new_offset = max(current - step, target)
-            else:
-                new_offset = min(current + step, target)
-
-            self.current_offset = new_offset
-            self.update_geometry()
-            self.root.after(10, self.slide_in)
-        else:
-            self.save_current_page()
-            self.save_config()
+        target = self.x_visible if self.side in ("right", "left") else self.y_visible
+        self.slide_to(target)
     
     def slide_out(self):
         """
         Animate the panel back to its hidden offset, then save.
         """
-        step = 10
-
-        # Determine target and axis based on side
+        target = self.x_hidden if self.side in ("right", "left") else self.y_hidden
+        self.slide_to(target)
+    
+    def slide_to(self, target):
+        # Starting from wherever the panel is now lets a slide reverse
+        # mid-flight instead of fighting the one already running.
         if self.side in ("right", "left"):
-            target = self.x_hidden
-            current = self.current_offset
-        else:  # top or bottom
-            target = self.y_hidden
-            current = self.current_offset
-
-        # If we’re not yet at the target, move one step closer
-        if current != target:
-            # choose direction
-            if target < current:
-                new_offset = max(current - step, target)
-            else:
-                new_offset = min(current + step, target)
-
-            self.current_offset = new_offset
-            self.update_geometry()
-            # re-invoke until we reach target
-            self.root.after(10, self.slide_out)
+            full_distance = abs(self.x_visible - self.x_hidden)
         else:
-            # fully hidden: save and done
-            self.save_current_page()
-            self.save_config()
+            full_distance = abs(self.y_visible - self.y_hidden)
+        self.animator.animate(self.current_offset, target, full_distance,
+                              self.set_offset, self.on_slide_done)
+    
+    def set_offset(self, offset):
+        self.current_offset = offset
+        self.update_geometry()
+    
+    def on_slide_done(self):
+        # Hovering past the bar changes nothing worth a config rewrite.
+        self.save_current_page()
+        if self.has_unsaved_changes():
+            self.schedule_save()
     
     # ---------- Update Methods for Right-Click Menu ----------
     def update_theme(self, new_theme):
         self.theme = new_theme
         self.theme_var.set(new_theme)
         self.update_colors()
-        self.rebuild_ui()
-        self.save_config()
+        self.restyle_ui()
+        self.schedule_save()
     
     def update_size(self, new_size):
         self.button_size = new_size
         self.size_var.set(new_size)
-        self.rebuild_ui()
-        self.save_config()
+        self.restyle_ui()
+        self.schedule_save()
     
     def update_side(self, new_side):
         self.side = new_side
         self.side_var.set(new_side)
-        self.rebuild_ui()
-        self.save_config()
+        self.restyle_ui()
+        self.schedule_save()
     
     def update_font(self, new_font):
         self.current_font = new_font
         self.font_var.set(new_font)
-        self.rebuild_ui()
-        self.save_config()
+        self.restyle_ui()
+        self.schedule_save()
     
     def update_text_font_size(self, new_size):
         self.text_font_size = new_size
         self.text_font_size_var.set(new_size)
-        if hasattr(self, "text_widget"):
-            self.text_widget.config(font=(self.current_font, self.text_font_size))
-        self.save_config()
+        for widget in self.page_widgets.values():
+            widget.config(font=(self.current_font, self.text_font_size))
+            self.style_highlight_tags(widget)
+        self.style_navigator()
+        self.schedule_save()
     
-    def show_settings_menu(self, event):
-        menu = tk.Menu(self.root, tearoff=0)
+    def update_persist_undo(self):
+        self.persist_undo = self.persist_undo_var.get()
+        self.schedule_save()
+    
+    def update_tracing(self):
+        if self.trace_var.get():
+            self.start_tracing()
+        else:
+            self.stop_tracing()
+    
+    def build_settings_menu(self):
+        """
+        Creates the right-click menu once. The entries follow the settings
+        through their variables; the parts that depend on the current page
+        or state are filled in by postcommand just before they are shown.
+        """
+        self.settings_menu = menu = tk.Menu(self.root, tearoff=0)
         # Change Size submenu.
         size_menu = tk.Menu(menu, tearoff=0)
         for size in [48, 64, 128, 256]:
@@ -590,16 +1616,167 @@ class NotepadApp:
                 command=lambda t=th: self.update_theme(t)
             )
         menu.add_cascade(label="Change Theme", menu=theme_menu)
+        # Saved versions of the current page, newest first.
+        self.history_menu = tk.Menu(menu, tearoff=0, postcommand=self.fill_history_menu)
+        menu.add_cascade(label="Page History", menu=self.history_menu)
+        menu.add_command(label="Go to Page...", accelerator="Ctrl+G", command=self.open_navigator)
+        # Import / Export submenu, unavailable while one is running.
+        self.transfer_menu = transfer_menu = tk.Menu(menu, tearoff=0,
+                                                     postcommand=self.update_transfer_menu)
+        transfer_menu.add_command(label="Import Files...", command=self.choose_import_files)
+        transfer_menu.add_command(label="Import Folder...", command=self.choose_import_folder)
+        transfer_menu.add_command(label="Export to Folder...", command=self.choose_export_folder)
+        transfer_menu.add_command(label="Export to Zip...", command=self.choose_export_zip)
+        menu.add_cascade(label="Import / Export", menu=transfer_menu)
+        menu.add_checkbutton(
+            label="Keep Undo History",
+            variable=self.persist_undo_var,
+            command=self.update_persist_undo
+        )
+        menu.add_checkbutton(
+            label="Highlight Markdown",
+            variable=self.highlight_var,
+            command=self.update_highlighting
+        )
+        menu.add_checkbutton(
+            label="Check Spelling",
+            variable=self.spell_var,
+            command=self.update_spell_check
+        )
+        menu.add_checkbutton(
+            label="Complete Words",
+            variable=self.complete_var,
+            command=self.update_word_completion
+        )
+        menu.add_checkbutton(
+            label="Trace Performance",
+            variable=self.trace_var,
+            command=self.update_tracing
+        )
         menu.add_command(label="Exit", command=self.on_exit)
+
+    def show_settings_menu(self, event):
         try:
-            menu.tk_popup(event.x_root, event.y_root)
+            self.settings_menu.tk_popup(event.x_root, event.y_root)
         finally:
-            menu.grab_release()
+            self.settings_menu.grab_release()
+
+    def fill_history_menu(self):
+        # Menu.delete also frees the Tcl commands of the old entries.
+        menu = self.history_menu
+        menu.delete(0, tk.END)
+        page_id = self.pages.page_id(self.current_page)
+        for saved_at, key in self.pages.versions(page_id)[:20]:
+            menu.add_command(
+                label=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(saved_at)),
+                command=lambda k=key: self.restore_version(page_id, k)
+            )
+        if menu.index(tk.END) is None:
+            menu.add_command(label="No saved versions", state="disabled")
+
+    def update_transfer_menu(self):
+        state = "normal" if self._transfer is None else "disabled"
+        for entry in range(self.transfer_menu.index(tk.END) + 1):
+            self.transfer_menu.entryconfigure(entry, state=state)
 
     # ===== Multi-Page Functions =====
     def save_current_page(self):
-        content = self.text_widget.get("1.0", tk.END).rstrip("\n")
-        self.pages[self.current_page] = content
+        # Journals pending edits of every cached page, which also copies
+        # them into self.pages. Pages without edits cost nothing.
+        self.flush_journal()
+
+    def on_text_modified(self, event):
+        """
+        Marks the widget's page dirty and arms the journal timer on the first
+        edit after a flush. The timer is not re-armed by later keystrokes,
+        which bounds the journal latency.
+        """
+        widget = event.widget
+        if not widget.edit_modified():
+            return
+        # Clearing the flag fires <<Modified>> again; the check above skips it.
+        widget.edit_modified(False)
+        self._dirty_pages.add(widget.page_id)
+        if self._journal_after_id is None:
+            self._journal_after_id = self.root.after(self.journal_delay_ms, self.flush_journal)
+
+    def flush_journal(self):
+        if self._journal_after_id is not None:
+            self.root.after_cancel(self._journal_after_id)
+            self._journal_after_id = None
+        for page_id in self._dirty_pages:
+            self.flush_page(page_id)
+        self._dirty_pages.clear()
+
+    def flush_page(self, page_id):
+        """
+        Appends the difference between a cached page widget and the page's
+        last known content to the edit journal.
+        """
+        widget = self.page_widgets[page_id]
+        if widget is self.text_widget and self._load_after_id is not None:
+            # Half-loaded widget; self.pages still holds the whole page.
+            return
+        content = widget.get("1.0", tk.END).rstrip("\n")
+        widget.char_count = len(content)
+        self.journal_page_text(self.pages.index_of(page_id), content)
+
+    def journal_page_text(self, index, text):
+        """
+        Sets a page's text in self.pages and journals the change. Pages
+        shown in a widget only get here through flush_page.
+        """
+        old = self.pages[index]
+        edit = diff_edit(old, text)
+        if edit is None:
+            return
+        at, deleted, inserted = edit
+        page_id = self.pages.page_id(index)
+        if self.completions is not None and not self.completion_walker.is_pending(page_id):
+            self.completions.apply_edit(old, at, deleted, inserted)
+        self.journal.append({"op": "edit", "id": page_id, "page": index,
+                             "at": at, "del": deleted, "ins": inserted})
+        self.pages[index] = text
+        if self.search_index is not None:
+            self._index_stale.add(page_id)
+        self.check_journal_size()
+
+    def check_journal_size(self):
+        if self.journal.size() > self.journal_compact_bytes and not self.writer.busy():
+            self.root.after_idle(self.compact_journal)
+
+    def compact_journal(self):
+        # A fresh snapshot folds the journal in and truncates it.
+        self._config_dirty = True
+        self.flush_config()
+
+    def restore_version(self, page_id, key):
+        """
+        Replaces a page's text with a saved version if it is still the
+        current page. This is an ordinary edit: it is journaled, saved as a
+        new version and can be undone in one step.
+        """
+        text = self.pages.read_version(key)
+        if text is None:
+            return  # garbage collected since the menu was built
+        self.when_page_loaded(lambda: self.replace_page_text(page_id, text))
+
+    def replace_page_text(self, page_id, text):
+        widget = self.text_widget
+        if widget.page_id != page_id:
+            return
+        widget.undo_anchor = None
+        try:
+            had_text = widget.compare("end-1c", ">", "1.0")
+            widget.delete("1.0", "end-1c")
+            # The insert joins the delete's undo step, if there was one.
+            widget.undo_merge_all = had_text
+            widget.insert("1.0", text)
+        finally:
+            widget.undo_merge_all = False
+            widget.undo_anchor = None
+        widget.mark_set(tk.INSERT, "1.0")
+        widget.see(tk.INSERT)
 
     def next_page(self):
         if self.current_page < len(self.pages) - 1:
@@ -613,19 +1790,1231 @@ class NotepadApp:
 
     def add_page(self):
         self.pages.append("")
+        self.journal.append({"op": "add", "id": self.pages.page_id(-1)})
+        if self.search_index is not None:
+            self.search_index.update_page(self.pages.page_id(-1), "")
         self.current_page = len(self.pages) - 1
         self.update_text()
 
     def delete_page(self):
         if len(self.pages) > 1:
+            self.cancel_page_load()
+            page_id = self.pages.page_id(self.current_page)
+            self.journal.append({"op": "delete", "id": page_id, "page": self.current_page})
+            if self.search_index is not None:
+                self.search_index.remove_page(page_id)
+                self._index_stale.discard(page_id)
+            if self.completion_walker.is_pending(page_id):
+                self.completion_walker.discard(page_id)
+            elif self.completions is not None:
+                with contextlib.suppress(PageReadError):
+                    self.completions.remove_text(self.pages[self.current_page])
+            self._dirty_pages.discard(page_id)
+            widget = self.page_widgets.pop(page_id, None)
             del self.pages[self.current_page]
             if self.current_page >= len(self.pages):
                 self.current_page = len(self.pages) - 1
             self.update_text()
+            if widget is not None:
+                self.destroy_text_widget(widget)
+            self.undo.drop_page(page_id)
+
+    def open_navigator(self, event=None):
+        """
+        Shows the jump-to-page list. Titles come from the page index, so
+        this does not read any pages.
+        """
+        self.hidden_widgets.discard("navigator")
+        self.apply_layout()
+        self.navigator.lift()
+        self.navigator.show(len(self.pages), self.pages.title, self.current_page)
+        return "break"
+
+    def close_navigator(self):
+        self.hidden_widgets.add("navigator")
+        self.apply_layout()
+        if self.text_widget is not None:
+            self.text_widget.focus_set()
+
+    def jump_to_page(self, position):
+        self.close_navigator()
+        if position != self.current_page:
+            self.save_current_page()
+            self.current_page = position
+            self.update_text()
 
     def update_text(self):
-        self.text_widget.delete("1.0", tk.END)
-        self.text_widget.insert(tk.END, self.pages[self.current_page])
+        """
+        Shows the current page. A page shown recently still has its hidden
+        text widget, which is simply swapped in with its cursor, scroll
+        position and undo history. Otherwise a new widget is created and
+        filled.
+        """
+        self.cancel_stream()
+        self.cancel_page_load()
+        self.hide_completion()
+        page_id = self.pages.page_id(self.current_page)
+        widget = self.page_widgets.get(page_id)
+        if widget is not None:
+            self.page_widgets.move_to_end(page_id)
+            self.activate_text_widget(widget)
+            self.run_load_callbacks()
+        else:
+            widget = self.make_text_widget(page_id)
+            self.page_widgets[page_id] = widget
+            self.activate_text_widget(widget)
+            try:
+                text = self.pages[self.current_page]
+            except PageReadError as e:
+                widget.unreadable = True
+                self.load_page_text("")
+                widget.configure(state="disabled")
+                self.show_progress(f"Read-only: {e}")
+            else:
+                self.load_page_text(text)
+        self.evict_page_widgets()
+
+    def activate_text_widget(self, widget):
+        previous = self.text_widget
+        self.text_widget = widget
+        x, y, width, height = self.widget_layout()["text_widget"]
+        widget.place(x=x, y=y, width=width, height=height)
+        if previous is not None and previous is not widget:
+            had_focus = self.root.focus_get() is previous
+            previous.place_forget()
+            if had_focus:
+                widget.focus_set()
+        self.schedule_highlight()
+        self.schedule_spell_check()
+
+    def evict_page_widgets(self):
+        """
+        Destroys the least recently shown hidden widgets while the cache is
+        over widget_cache_pages or widget_cache_chars, writing their text
+        back to self.pages first.
+        """
+        while len(self.page_widgets) > 1 and (
+            len(self.page_widgets) > self.widget_cache_pages
+            or self.widget_cache_usage() > self.widget_cache_chars
+        ):
+            page_id, widget = next(iter(self.page_widgets.items()))
+            if page_id in self._dirty_pages:
+                self.flush_page(page_id)
+                self._dirty_pages.discard(page_id)
+            del self.page_widgets[page_id]
+            self.destroy_text_widget(widget)
+
+    def widget_cache_usage(self):
+        """
+        Characters held by cached page widgets, as of their last load or
+        flush.
+        """
+        return sum(widget.char_count for widget in self.page_widgets.values())
+
+    def load_page_text(self, text):
+        """
+        Fills the new current widget. Small pages are inserted in one go;
+        large ones get their first screenful inserted right away and the
+        rest streamed in from after_idle callbacks, with editing disabled
+        until the whole page is in.
+        """
+        self.text_widget.char_count = len(text)
+        if len(text) <= self.load_first_chars:
+            self.text_widget.insert(tk.END, text)
+            self.finish_page_load()
+            return
+        # Cut the first chunk at a line end so it covers whole lines.
+        first = text.rfind("\n", 0, self.load_first_chars) + 1 or self.load_first_chars
+        self.text_widget.insert(tk.END, text[:first])
+        self.text_widget.configure(state="disabled")
+        self.show_progress("Loading 0%")
+        self._load_after_id = self.root.after_idle(self.load_next_chunk, text, first)
+
+    def load_next_chunk(self, text, offset):
+        deadline = time.perf_counter() + 0.010
+        self.text_widget.configure(state="normal")
+        while offset < len(text) and time.perf_counter() < deadline:
+            self.text_widget.insert(tk.END, text[offset:offset + self.load_chunk_chars])
+            offset += self.load_chunk_chars
+        if offset < len(text):
+            self.text_widget.configure(state="disabled")
+            self.show_progress(f"Loading {100 * offset // len(text)}%")
+            self._load_after_id = self.root.after_idle(self.load_next_chunk, text, offset)
+            return
+        self._load_after_id = None
+        self.hide_progress()
+        self.finish_page_load()
+
+    def finish_page_load(self):
+        # Loading is not an edit: nothing to journal and nothing to undo.
+        self.text_widget.edit_modified(False)
+        self.text_widget.recording = True
+        self._dirty_pages.discard(self.text_widget.page_id)
+        self.schedule_highlight()
+        self.schedule_spell_check()
+        self.run_load_callbacks()
+
+    def cancel_page_load(self):
+        if self._load_after_id is not None:
+            self.root.after_cancel(self._load_after_id)
+            self._load_after_id = None
+            self.hide_progress()
+            # A half-filled widget is no use later; drop it from the cache.
+            widget = self.text_widget
+            self.text_widget = None
+            self.page_widgets.pop(widget.page_id, None)
+            self._dirty_pages.discard(widget.page_id)
+            self.destroy_text_widget(widget)
+        self._load_callbacks = []
+
+    def when_page_loaded(self, callback):
+        """
+        Runs callback once the current page is fully in the text widget.
+        """
+        self._load_callbacks.append(callback)
+        if self._load_after_id is None:
+            self.run_load_callbacks()
+
+    def run_load_callbacks(self):
+        callbacks, self._load_callbacks = self._load_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def show_progress(self, text):
+        self.progress_label.configure(text=text)
+        # Text widgets created later would otherwise stack above it.
+        self.progress_label.lift()
+        if "progress_label" in self.hidden_widgets:
+            self.hidden_widgets.discard("progress_label")
+            self.apply_layout()
+
+    def hide_progress(self):
+        if "progress_label" not in self.hidden_widgets:
+            self.hidden_widgets.add("progress_label")
+            self.progress_label.place_forget()
+
+    # ===== Sync between instances =====
+    def start_sync(self):
+        """
+        Watches the config file for saves by other instances sharing this
+        store. With inotify the event loop only wakes up when the file
+        changes; otherwise it is polled every sync_poll_ms.
+        """
+        self.watcher = FileWatcher(self.config_file)
+        if self.watcher.fileno() is not None:
+            self.root.tk.createfilehandler(self.watcher.fileno(), tk.READABLE,
+                                          lambda fd, mask: self.check_sync())
+        else:
+            self._sync_after_id = self.root.after(self.sync_poll_ms, self.poll_sync)
+    
+    def stop_sync(self):
+        if self._sync_after_id is not None:
+            self.root.after_cancel(self._sync_after_id)
+            self._sync_after_id = None
+        if self.watcher is not None:
+            if self.watcher.fileno() is not None:
+                self.root.tk.deletefilehandler(self.watcher.fileno())
+            self.watcher.close()
+            self.watcher = None
+    
+    def poll_sync(self):
+        self._sync_after_id = self.root.after(self.sync_poll_ms, self.poll_sync)
+        self.check_sync()
+    
+    def check_sync(self):
+        if self.watcher.changed():
+            self.start_sync_read()
+    
+    def start_sync_read(self):
+        """
+        Reads the changed config and the pages it changed on a worker
+        thread; check_sync_read picks up the result.
+        """
+        if self._sync_reading:
+            self._sync_again = True
+            return
+        self._sync_reading = True
+        base = dict(self._sync_base)
+        
+        def read():
+            try:
+                result = read_changed_pages(self.config_file, self.pages_dir, base)
+            except (OSError, ValueError):
+                result = None  # e.g. the file vanished; the next change retries
+            self._sync_results.put((base, result))
+        
+        threading.Thread(target=read, name="sync-reader", daemon=True).start()
+        self.root.after(self.writer_poll_ms, self.check_sync_read)
+    
+    def check_sync_read(self):
+        try:
+            base, result = self._sync_results.get_nowait()
+        except queue.Empty:
+            self.root.after(self.writer_poll_ms, self.check_sync_read)
+            return
+        self._sync_reading = False
+        if result is not None and base != self._sync_base:
+            # One of our own saves finished meanwhile; the pages read were
+            # picked against an old base.
+            self._sync_again = True
+        elif result is not None:
+            self.merge_external_config(*result)
+        if self._sync_again:
+            self._sync_again = False
+            self.start_sync_read()
+    
+    def merge_external_config(self, config, texts):
+        """
+        Folds another instance's save into this one (see PageStore.merge).
+        Widgets of pages changed there are replaced; pages edited on both
+        sides keep this side's text and are reported.
+        """
+        generation = config.get("generation")
+        if generation in self._own_generations or generation == self.generation:
+            return  # our own save, or one already merged
+        self.save_current_page()
+        current_id = self.pages.page_id(self.current_page)
+        entries = config.get("page_index", [])
+        updated, removed, conflicts = self.pages.merge(entries, self._sync_base, texts)
+        self._merge_count += 1
+        self._sync_base = entry_versions(entries)
+        self.generation = generation
+        for instance, seq in config.get("journal_seqs", {}).items():
+            if instance != self.instance_id:
+                self.journal_seqs[instance] = max(self.journal_seqs.get(instance, 0), seq)
+        for page_id in updated | removed:
+            # Undo deltas no longer match the text.
+            self.undo.drop_page(page_id)
+            if self.search_index is not None:
+                if page_id in removed:
+                    self.search_index.remove_page(page_id)
+                    self._index_stale.discard(page_id)
+                else:
+                    self._index_stale.add(page_id)
+            widget = self.page_widgets.get(page_id)
+            if widget is not None and widget is not self.text_widget:
+                del self.page_widgets[page_id]
+                self.destroy_text_widget(widget)
+        if self.completions is not None and (updated or removed):
+            # The old texts are gone; count everything again.
+            self.stop_completion_index()
+            self.ensure_completion_index()
+        if current_id in updated or current_id in removed:
+            positions = self.pages.positions()
+            self.current_page = positions.get(current_id, min(self.current_page, len(self.pages) - 1))
+            self.reload_current_page(keep_position=current_id in updated)
+        else:
+            self.current_page = self.pages.index_of(current_id)
+        if conflicts:
+            self.show_progress(f"{len(conflicts)} page(s) also changed in another window; "
+                               "kept this version (other one in Page History)")
+            self.root.after(8000, self.hide_progress)
+        # Our header may have been written (or be on its way) without what
+        # was just merged; write one that has both.
+        if conflicts or ((updated or removed) and (self.writer.busy() or self.pages.has_unsaved())):
+            self.schedule_save()
+    
+    def reload_current_page(self, keep_position):
+        old = self.text_widget
+        cursor = old.index(tk.INSERT)
+        top = old.yview()[0]
+        if self._load_after_id is not None:
+            self.cancel_page_load()  # destroys the half-loaded widget
+            old = None
+        else:
+            self.page_widgets.pop(old.page_id, None)
+        self.update_text()
+        if old is not None:
+            self.destroy_text_widget(old)
+        if keep_position:
+            def restore():
+                self.text_widget.mark_set(tk.INSERT, cursor)
+                self.text_widget.yview_moveto(top)
+            self.when_page_loaded(restore)
+    
+    # ===== Commands from other processes =====
+    def start_ipc(self):
+        """
+        Listens for commands (see notepad_ipc) unless another panel on these
+        notes already does, in which case this one runs without.
+        """
+        try:
+            # len() of the page list is safe to read from the server thread.
+            self.ipc = CommandServer(page_count=lambda: len(self.pages))
+        except OSError:
+            return
+        if self.ipc.fileno() is not None:
+            self.root.tk.createfilehandler(self.ipc.fileno(), tk.READABLE,
+                                          lambda fd, mask: self.on_ipc_commands())
+        else:
+            self._ipc_poll_id = self.root.after(self.ipc_poll_ms, self.poll_ipc)
+
+    def stop_ipc(self):
+        if self.ipc is None:
+            return
+        if self._ipc_poll_id is not None:
+            self.root.after_cancel(self._ipc_poll_id)
+            self._ipc_poll_id = None
+        if self.ipc.fileno() is not None:
+            self.root.tk.deletefilehandler(self.ipc.fileno())
+        self.ipc.close()
+        self.ipc = None
+
+    def poll_ipc(self):
+        self._ipc_poll_id = self.root.after(self.ipc_poll_ms, self.poll_ipc)
+        self.on_ipc_commands()
+
+    def on_ipc_commands(self):
+        # Give the rest of a burst a moment to arrive.
+        if self._ipc_after_id is None:
+            self._ipc_after_id = self.root.after(self.ipc_batch_ms, self.run_ipc_commands)
+
+    def run_ipc_commands(self):
+        """
+        Applies every queued command in one go: appends are grouped per
+        page, new pages are added together, and there is one save for all.
+        """
+        self._ipc_after_id = None
+        if self.text_widget is None:
+            # Still starting up; the commands stay queued.
+            self._ipc_after_id = self.root.after(self.ipc_poll_ms, self.run_ipc_commands)
+            return
+        commands = self.ipc.commands()
+        if not commands:
+            return
+        self.save_current_page()
+        current_id = self.pages.page_id(self.current_page)
+        appends = OrderedDict()
+        new_pages = []
+        show = False
+        open_page = None
+        for command in commands:
+            cmd = command["cmd"]
+            if cmd == "show":
+                show = True
+            elif cmd == "open":
+                if 1 <= command["page"] <= len(self.pages):
+                    open_page = command["page"] - 1
+                show = True
+            elif cmd == "import":
+                new_pages.extend(command["pages"])
+            elif command.get("new"):
+                new_pages.append(command["text"])
+            elif command.get("page") is None:
+                appends.setdefault(current_id, []).append(command["text"])
+            elif 1 <= command["page"] <= len(self.pages):
+                appends.setdefault(self.pages.page_id(command["page"] - 1), []).append(command["text"])
+        for page_id, texts in appends.items():
+            try:
+                self.append_page_text(page_id, "\n".join(texts))
+            except PageReadError as e:
+                self.show_progress(f"Not added: {e}")
+        self.add_pages(new_pages)
+        if open_page is not None and open_page != self.current_page:
+            self.current_page = open_page
+            self.update_text()
+        if show:
+            self.show_panel()
+        if appends or new_pages:
+            self.schedule_save()
+
+    def append_page_text(self, page_id, text):
+        """
+        Adds text as new lines at the end of a page. A page with a widget
+        gets it as an ordinary (undoable) edit; others are changed directly.
+        """
+        widget = self.page_widgets.get(page_id)
+        if widget is not None and widget.unreadable:
+            raise PageReadError(f"page {page_id} could not be read")
+        reload = widget is self.text_widget and self._load_after_id is not None
+        if reload:
+            # Drop the half-loaded widget and load the page again below.
+            self.cancel_page_load()
+        elif widget is not None:
+            # Streamed pastes disable the widget between chunks.
+            state = widget.cget("state")
+            widget.configure(state="normal")
+            widget.undo_anchor = None
+            separator = "\n" if widget.compare("end-1c", ">", "1.0") else ""
+            widget.insert("end-1c", separator + text)
+            widget.undo_anchor = None
+            widget.configure(state=state)
+            return
+        index = self.pages.index_of(page_id)
+        old = self.pages[index]
+        self.journal_page_text(index, old + "\n" + text if old else text)
+        if reload:
+            self.update_text()
+
+    def add_pages(self, texts):
+        """
+        Appends a page per text at the end, journaled as if typed in.
+        """
+        for text in texts:
+            self.pages.append(text)
+            page_id = self.pages.page_id(-1)
+            self.journal.append({"op": "add", "id": page_id})
+            if text:
+                self.journal.append({"op": "edit", "id": page_id, "page": len(self.pages) - 1,
+                                     "at": 0, "del": 0, "ins": text})
+            if self.search_index is not None:
+                self.search_index.update_page(page_id, text)
+            if self.completions is not None:
+                self.completions.add_text(text)
+        self.check_journal_size()
+
+    def show_panel(self):
+        """
+        Slides the panel out and keeps it there for show_hold_s even if the
+        pointer is elsewhere, and gives the page the keyboard focus.
+        """
+        self._hold_open_until = time.monotonic() + self.show_hold_s
+        if not self.is_expanded:
+            self.slide_in()
+            self.is_expanded = True
+        self.root.lift()
+        self.text_widget.focus_force()
+        self.schedule_hover_check(self.hover_poll_min_ms)
+
+    # ===== Bulk import / export =====
+    def choose_import_files(self):
+        paths = filedialog.askopenfilenames(
+            parent=self.root, title="Import Pages",
+            filetypes=[("Notes", "*.md *.markdown *.txt *.zip"), ("All files", "*")])
+        if paths:
+            self.start_import(list(paths))
+
+    def choose_import_folder(self):
+        path = filedialog.askdirectory(parent=self.root, title="Import Folder", mustexist=True)
+        if path:
+            self.start_import([path])
+
+    def choose_export_folder(self):
+        path = filedialog.askdirectory(parent=self.root, title="Export to Folder")
+        if path:
+            self.start_export(path)
+
+    def choose_export_zip(self):
+        path = filedialog.asksaveasfilename(
+            parent=self.root, title="Export to Zip", defaultextension=".zip",
+            initialfile="notes.zip", filetypes=[("Zip archives", "*.zip")])
+        if path:
+            self.start_export(path)
+
+    def start_import(self, paths):
+        """
+        Adds every page found at paths (files, folders or zip archives, see
+        notepad_transfer.PageSource) at the end of the notebook.
+        """
+        # Loaded on first use, like pyautogui: zipfile is not needed at startup.
+        from notepad_transfer import import_batches
+
+        def work(results, cancel):
+            done = 0
+            for done, total, texts in import_batches(paths):
+                # Blocks while the panel is still busy with earlier batches.
+                results.put(("progress", done, total, texts))
+                if cancel.is_set():
+                    break
+            return done
+
+        self.start_transfer("Import", work)
+
+    def start_export(self, destination):
+        """
+        Writes every page to destination, a folder or a zip archive. The
+        pages are read and written on the worker thread as they are now;
+        edits made meanwhile are not included.
+        """
+        from notepad_transfer import export_pages
+
+        self.save_current_page()
+        sources = self.pages.sources()
+        read = self.pages.read_source
+        step = max(len(sources) // 100, 1)
+
+        def work(results, cancel):
+            done = 0
+            texts = (read(source) for source in sources)
+            with contextlib.closing(export_pages(destination, texts, len(sources))) as written:
+                for done in written:
+                    if cancel.is_set():
+                        return 0  # the archive is removed; a folder keeps what is there
+                    if done % step == 0:
+                        results.put(("progress", done, len(sources), None))
+            return done
+
+        self.start_transfer("Export", work)
+
+    def start_transfer(self, verb, work):
+        """
+        Runs work(results, cancel) on a worker thread. It puts
+        ("progress", done, total, new pages or None) on results as it goes
+        and returns the number of pages handled; check_transfer takes it
+        from there. One import or export runs at a time.
+        """
+        if self._transfer is not None:
+            return
+        cancel = threading.Event()
+        results = queue.Queue(maxsize=self.transfer_queue_batches)
+
+        def run():
+            try:
+                outcome = ("done", work(results, cancel), None)
+            except Exception as e:
+                # Anything at all, or check_transfer would wait forever.
+                error = str(e) if isinstance(e, OSError) else f"{type(e).__name__}: {e}"
+                outcome = ("done", 0, error)
+            results.put(outcome)
+
+        self._transfer = (verb, cancel, results)
+        self.show_progress(f"{verb} starting - Esc to cancel")
+        threading.Thread(target=run, name="transfer", daemon=True).start()
+        self.root.after(self.writer_poll_ms, self.check_transfer)
+
+    def check_transfer(self):
+        """
+        Takes one message from the transfer worker: new pages are added a
+        batch per call so the panel keeps responding during a big import.
+        """
+        verb, cancel, results = self._transfer
+        try:
+            message = results.get_nowait()
+        except queue.Empty:
+            self.root.after(self.writer_poll_ms, self.check_transfer)
+            return
+        if message[0] == "done":
+            _, done, error = message
+            self._transfer = None
+            if error is not None:
+                self.show_progress(f"{verb} failed: {error}")
+            elif cancel.is_set():
+                self.show_progress(f"{verb} cancelled")
+            else:
+                self.show_progress(f"{verb} finished: {done} page(s)")
+            self.root.after(5000, self.hide_progress)
+            return
+        _, done, total, texts = message
+        if texts and not cancel.is_set():
+            self.add_pages(texts)
+            self.schedule_save()
+        self.show_progress(f"{verb} {done}/{total} pages - Esc to cancel")
+        # More may be waiting already.
+        self.root.after_idle(self.check_transfer)
+
+    # ===== Undo / Redo =====
+    def on_text_edit(self, widget, op, *args):
+        """
+        Called with every insert, delete and replace sent to a page widget,
+        before Tk applies it.
+        """
+        if widget.cget("state") == "disabled":
+            return  # Tk ignores edits to a disabled widget
+        if self.completions is not None and widget is self.text_widget:
+            self.schedule_completion()
+        if self.highlight_syntax or self.spell_check:
+            span = self.edit_line_span(widget, op, args)
+            if self.highlight_syntax:
+                self.mark_highlight_edit(widget.line_states, span)
+            if self.spell_check:
+                self.mark_spell_edit(widget, span)
+        self.record_text_edit(widget, op, *args)
+
+    def record_text_edit(self, widget, op, *args):
+        """
+        Records an edit about to be applied to widget as undo deltas.
+        """
+        if not widget.recording:
+            return
+        try:
+            deltas = self.text_edit_deltas(widget, op, args)
+        except tk.TclError:
+            deltas = None
+        if deltas is None:
+            # Not something we can describe (e.g. a multi-range delete, which
+            # the Text bindings never issue); forget this page's history
+            # rather than keep a wrong one.
+            self.undo.drop_page(widget.page_id)
+            widget.undo_anchor = None
+            return
+        now = time.monotonic()
+        for delta in deltas:
+            merge = widget.undo_merge_all or self.continues_typing(widget, delta, now)
+            self.undo.record(widget.page_id, delta, merge)
+            widget.undo_anchor = self.edit_anchor(delta, now)
+
+    @staticmethod
+    def text_edit_deltas(widget, op, args):
+        if op == "delete" and len(args) > 2:
+            return None
+        deltas = []
+        if op in ("delete", "replace"):
+            start = widget.index(args[0])
+            end = widget.index(args[1]) if len(args) > 1 else widget.index(f"{start}+1c")
+            # Tk never deletes the final newline.
+            if widget.compare(end, ">", "end-1c"):
+                end = widget.index("end-1c")
+            if widget.compare(start, "<", end):
+                deltas.append(("d", start, widget.get(start, end)))
+        if op in ("insert", "replace"):
+            index = widget.index(args[0])
+            if widget.compare(index, ">", "end-1c"):
+                index = widget.index("end-1c")
+            if op == "replace" and deltas:
+                index = deltas[0][1]
+            chunks = args[2::2] if op == "replace" else args[1::2]
+            text = "".join(chunks)
+            if text:
+                deltas.append(("i", index, text))
+        return deltas
+
+    @staticmethod
+    def edit_anchor(delta, now):
+        """
+        Where the cursor ends up after a delta, for grouping keystrokes.
+        """
+        kind, index, text = delta
+        if kind == "d":
+            return ("d", index, now)
+        if "\n" in text:
+            return None  # a new line always starts a new undo step
+        line, col = index.split(".")
+        return ("i", f"{line}.{int(col) + len(text)}", now)
+
+    @staticmethod
+    def continues_typing(widget, delta, now):
+        """
+        True if delta directly continues the previous edit within a second:
+        typing on, backspacing or forward-deleting at the same spot.
+        """
+        anchor = widget.undo_anchor
+        if anchor is None or now - anchor[2] > 1.0 or anchor[0] != delta[0]:
+            return False
+        kind, index, text = delta
+        if kind == "i":
+            return index == anchor[1] and "\n" not in text
+        end = widget.index(f"{index}+{len(text)}c")
+        return end == anchor[1] or index == anchor[1]
+
+    def undo_edit(self, event=None):
+        widget = self.text_widget
+        if widget.recording and self._stream_after_id is None:
+            step = self.undo.undo(widget.page_id)
+            if step:
+                self.apply_deltas(widget, reversed(step), inverse=True)
+        return "break"
+
+    def redo_edit(self, event=None):
+        widget = self.text_widget
+        if widget.recording and self._stream_after_id is None:
+            step = self.undo.redo(widget.page_id)
+            if step:
+                self.apply_deltas(widget, step, inverse=False)
+        return "break"
+
+    def apply_deltas(self, widget, deltas, inverse):
+        widget.recording = False
+        try:
+            for kind, index, text in deltas:
+                if (kind == "i") != inverse:
+                    widget.insert(index, text)
+                    cursor = f"{index}+{len(text)}c"
+                else:
+                    widget.delete(index, f"{index}+{len(text)}c")
+                    cursor = index
+        finally:
+            widget.recording = True
+        widget.undo_anchor = None
+        widget.mark_set(tk.INSERT, cursor)
+        widget.see(tk.INSERT)
+
+    # ===== Highlighting =====
+    def update_highlighting(self):
+        self.highlight_syntax = self.highlight_var.get()
+        for widget in self.page_widgets.values():
+            widget.line_states.reset()
+            widget.provisional_view = None
+            if not self.highlight_syntax:
+                for tag in TAGS:
+                    widget.tag_remove("hl_" + tag, "1.0", tk.END)
+        self.schedule_highlight()
+        self.schedule_save()
+
+    @staticmethod
+    def edit_line_span(widget, op, args):
+        """
+        Returns (line, removed, added) for an edit about to be applied:
+        starting at line, removed following lines get joined into it and
+        then added new lines split off it. None if that is unclear, e.g.
+        for a delete of several ranges.
+        """
+        try:
+            if op == "delete" and len(args) > 2:
+                return None
+            start = widget.index(args[0])
+            if op == "insert":
+                end = start
+                text = "".join(args[1::2])
+            else:
+                end = widget.index(args[1]) if len(args) > 1 else widget.index(f"{start}+1c")
+                text = "".join(args[2::2])
+            # Tk applies edits past the end at the final newline.
+            last_line = int(widget.index("end-1c").split(".")[0])
+        except tk.TclError:
+            return None
+        line = min(int(start.split(".")[0]), last_line)
+        removed = max(min(int(end.split(".")[0]), last_line) - line, 0)
+        return line, removed, text.count("\n")
+
+    def mark_highlight_edit(self, states, span):
+        """
+        Tells a widget's line states which lines an edit is about to
+        change. They are re-lexed in the next idle slot, which comes before
+        Tk redraws the edit.
+        """
+        if span is None:
+            states.reset()  # start over
+        else:
+            states.edit(*span)
+        self.schedule_highlight()
+
+    def on_text_scroll(self, widget, first, last):
+        widget.vbar.set(first, last)
+        if widget is self.text_widget and widget.line_states.next_line() is not None:
+            self.schedule_highlight()
+        if widget is self.text_widget:
+            self.schedule_spell_check()
+
+    def schedule_highlight(self):
+        if self.highlight_syntax and self._highlight_after_id is None:
+            self._highlight_after_id = self.root.after_idle(self.highlight_step)
+
+    def highlight_step(self):
+        """
+        One slice of highlighting work on the current page: the visible
+        lines if the sweep is still well above them, then lines in order
+        from the first one that needs it, until highlight_slice_s is used.
+        """
+        self._highlight_after_id = None
+        widget = self.text_widget
+        if widget is None or self._load_after_id is not None or not self.highlight_syntax:
+            return  # finish_page_load starts it again
+        deadline = time.perf_counter() + self.highlight_slice_s
+        self.highlight_viewport(widget)
+        if not self.highlight_lines(widget, deadline):
+            self._highlight_after_id = self.root.after_idle(self.highlight_step)
+
+    def highlight_lines(self, widget, deadline):
+        """
+        Re-lexes lines in order from the first one whose state is unknown
+        until the states line up with the old ones again, the page ends or
+        the deadline passes. Returns True when nothing is left to do.
+        """
+        states = widget.line_states
+        last_line = int(widget.index("end-1c").split(".")[0])
+        line = states.next_line()
+        while line is not None:
+            line = min(line, last_line)
+            end = min(line + self.highlight_batch_lines - 1, last_line)
+            state = states.state_before(line)
+            ranges = {}
+            for number, text in enumerate(widget.get(f"{line}.0", f"{end}.end").split("\n"), line):
+                tokens, state = states.lexer.lex_line(text, state)
+                self.add_token_ranges(ranges, number, tokens)
+                states.store(number, state, last_line)
+                if states.next_line() != number + 1:
+                    break
+            self.apply_highlight(widget, line, number, ranges)
+            line = states.next_line()
+            if time.perf_counter() > deadline:
+                break
+        return line is None
+
+    def highlight_viewport(self, widget):
+        """
+        Lexes the visible lines ahead of the sweep, from a fresh lexer
+        state. That guess is only wrong inside a fenced block, and the sweep
+        puts it right when it gets there.
+        """
+        line = widget.line_states.next_line()
+        if line is None or not widget.winfo_ismapped():
+            return
+        first = int(widget.index("@0,0").split(".")[0])
+        last = int(widget.index(f"@0,{widget.winfo_height()}").split(".")[0])
+        if line > first - self.highlight_batch_lines or widget.provisional_view == (first, last):
+            return  # already done, or the sweep gets there this slice
+        widget.provisional_view = (first, last)
+        lexer = widget.line_states.lexer
+        state = lexer.initial_state
+        ranges = {}
+        for number, text in enumerate(widget.get(f"{first}.0", f"{last}.end").split("\n"), first):
+            tokens, state = lexer.lex_line(text, state)
+            self.add_token_ranges(ranges, number, tokens)
+        self.apply_highlight(widget, first, last, ranges)
+
+    @staticmethod
+    def add_token_ranges(ranges, line, tokens):
+        for start, end, tag in tokens:
+            ranges.setdefault(tag, []).extend((f"{line}.{start}", f"{line}.{end}"))
+
+    @staticmethod
+    def apply_highlight(widget, first, last, ranges):
+        # One tag_remove and at most one tag_add per tag for the whole range.
+        for tag in TAGS:
+            widget.tag_remove("hl_" + tag, f"{first}.0", f"{last}.end")
+        for tag, indices in ranges.items():
+            widget.tag_add("hl_" + tag, *indices)
+
+    # ===== Spell checking =====
+    def update_spell_check(self):
+        if self.spell_var.get() and not spell_check_available():
+            self.spell_var.set(False)
+            self.show_progress("No word list found: put one word per line in popout_notepad_words.txt")
+            self.root.after(8000, self.hide_progress)
+            return
+        self.spell_check = self.spell_var.get()
+        for widget in self.page_widgets.values():
+            widget.spell_lines.reset()
+            if not self.spell_check:
+                widget.tag_remove("misspelled", "1.0", tk.END)
+        self.schedule_spell_check()
+        self.schedule_save()
+
+    def mark_spell_edit(self, widget, span):
+        """
+        Queues the lines an edit is about to change. Nothing is checked
+        until typing pauses for spell_delay_ms, so words are not flagged
+        while they are half typed.
+        """
+        if span is None:
+            widget.spell_lines.reset()
+        else:
+            widget.spell_lines.edit(*span)
+        self._spell_typed_at = time.monotonic()
+        self.schedule_spell_check()
+
+    def schedule_spell_check(self):
+        if self.spell_check and not self._spell_pending and self._spell_after_id is None:
+            self._spell_after_id = self.root.after_idle(self.spell_check_step)
+
+    def spell_check_step(self):
+        """
+        Hands the next batch of lines of the current page to the checker:
+        edited lines and those on screen first, then the rest in order.
+        """
+        self._spell_after_id = None
+        widget = self.text_widget
+        if widget is None or self._load_after_id is not None or not self.spell_check:
+            return  # finish_page_load starts it again
+        wait_s = self._spell_typed_at + self.spell_delay_ms / 1000 - time.monotonic()
+        if wait_s > 0:
+            self._spell_after_id = self.root.after(int(wait_s * 1000) + 1, self.spell_check_step)
+            return
+        first = int(widget.index("@0,0").split(".")[0])
+        last = int(widget.index(f"@0,{widget.winfo_height()}").split(".")[0])
+        last_line = int(widget.index("end-1c").split(".")[0])
+        states = widget.spell_lines
+        lines = states.take(first, last, last_line, self.spell_batch_lines)
+        if not lines:
+            return
+        self.spell_checker.submit(str(widget), states.version,
+                                  [(n, widget.get(f"{n}.0", f"{n}.end")) for n in lines])
+        self._spell_pending = True
+        self.root.after(self.spell_poll_ms, self.check_spelling)
+
+    def check_spelling(self):
+        results = self.spell_checker.results()
+        if not results:
+            self.root.after(self.spell_poll_ms, self.check_spelling)
+            return
+        self._spell_pending = False
+        if not self.spell_check:
+            return
+        widgets = {str(widget): widget for widget in self.page_widgets.values()}
+        for key, version, checked in results:
+            widget = widgets.get(key)
+            if checked is None:
+                self.spell_var.set(False)
+                self.update_spell_check()
+                self.show_progress("Spell checking is off: the word list could not be read")
+                self.root.after(8000, self.hide_progress)
+                return
+            if widget is not None:
+                self.apply_spelling(widget, version, checked)
+        self.schedule_spell_check()
+
+    @staticmethod
+    def apply_spelling(widget, version, checked):
+        """
+        Underlines the misspelled words found in a batch of lines. Lines
+        edited since the batch was taken are skipped; they are queued
+        again already.
+        """
+        states = widget.spell_lines
+        for number, ranges in checked:
+            line = states.current_line(number, version)
+            if line is None:
+                continue
+            widget.tag_remove("misspelled", f"{line}.0", f"{line}.end")
+            if ranges:
+                widget.tag_add("misspelled", *(f"{line}.{column}" for start, end in ranges
+                                               for column in (start, end)))
+
+    # ===== Word completion =====
+    def update_word_completion(self):
+        self.complete_words = self.complete_var.get()
+        if self.complete_words:
+            self.ensure_completion_index()
+        else:
+            self.hide_completion()
+            self.stop_completion_index()
+        self.schedule_save()
+
+    def ensure_completion_index(self):
+        """
+        Creates the completion index and counts every page into it in idle
+        time. Edits to pages not counted yet are left to that pass.
+        """
+        if self.completions is not None:
+            return
+        self.completions = CompletionIndex()
+        self.completion_walker.start()
+
+    def stop_completion_index(self):
+        self.completion_walker.cancel()
+        self.completions = None
+
+    def schedule_completion(self):
+        if self._completion_after_id is None:
+            self._completion_after_id = self.root.after_idle(self.update_completion)
+
+    def update_completion(self):
+        """
+        Shows the most used word starting with the one being typed, if any,
+        as grey text after the cursor.
+        """
+        self._completion_after_id = None
+        widget = self.text_widget
+        if self.completions is None or widget is None:
+            return
+        prefix = completion_prefix(widget.get("insert linestart", tk.INSERT))
+        if widget.get(tk.INSERT).isalnum():
+            prefix = ""  # in the middle of a word
+        words = self.completions.complete(prefix) if prefix else []
+        bbox = widget.bbox(tk.INSERT) if words else None
+        if bbox is None:
+            self.hide_completion()
+            return
+        word = words[0]
+        x, y, _, height = bbox
+        self.completion_label.configure(text=word[len(prefix):])
+        self.completion_label.place(in_=widget, x=x + 1, y=y, height=height)
+        self.completion_label.lift()
+        self._suggestion = (widget.index(tk.INSERT), prefix, word)
+
+    def hide_completion(self):
+        if self._suggestion is not None:
+            self._suggestion = None
+            self.completion_label.place_forget()
+
+    def check_completion_position(self, event):
+        # Arrow keys and the like move the cursor away from the suggestion.
+        if self._suggestion is not None and event.widget.index(tk.INSERT) != self._suggestion[0]:
+            self.hide_completion()
+
+    def dismiss_completion(self, event):
+        if self._suggestion is None:
+            return None
+        self.hide_completion()
+        return "break"
+
+    def accept_completion(self, event):
+        """
+        Tab: types the rest of the suggested word. The word replaces what
+        was typed if it is written differently (e.g. in capitals).
+        """
+        if self._suggestion is None or event.widget.index(tk.INSERT) != self._suggestion[0]:
+            return None  # an ordinary Tab
+        _, prefix, word = self._suggestion
+        self.hide_completion()
+        widget = event.widget
+        if word.startswith(prefix):
+            widget.insert(tk.INSERT, word[len(prefix):])
+        else:
+            widget.delete(f"insert-{len(prefix)}c", tk.INSERT)
+            widget.insert(tk.INSERT, word)
+        return "break"
+
+    # ===== Search =====
+    def open_search(self, event=None):
+        self.hidden_widgets = {"copy_button", "paste_button"} | (self.hidden_widgets & {"progress_label", "navigator"})
+        self.apply_layout()
+        self.search_entry.focus_set()
+        self.search_entry.select_range(0, tk.END)
+        self.ensure_search_index()
+        return "break"
+
+    def close_search(self, event=None):
+        self.hidden_widgets = {"search_entry", "search_status"} | (self.hidden_widgets & {"progress_label", "navigator"})
+        self.apply_layout()
+        for widget in self.page_widgets.values():
+            widget.tag_remove("search_match", "1.0", tk.END)
+        self.text_widget.focus_set()
+        return "break"
+
+    def ensure_search_index(self):
+        """
+        Creates the search index and queues every page for indexing in idle
+        time.
+        """
+        if self.search_index is not None:
+            return
+        self.search_index = SearchIndex()
+        self.index_walker.start()
+
+    def index_page(self, page_id, text):
+        if page_id not in self.search_index:
+            self.search_index.update_page(page_id, text)
+
+    def show_index_progress(self, remaining):
+        total = len(self.pages)
+        self.search_status.configure(text=f"{100 * (total - remaining) // total}%")
+
+    def finish_search_index(self):
+        if self.search_var.get():
+            self.search_status.configure(text="")
+            self.highlight_matches(tokenize(self.search_var.get()))
+
+    def refresh_stale_pages(self):
+        # Pages edited since they were indexed; normally just the current one.
+        positions = self.pages.positions()
+        for page_id in self._index_stale:
+            if page_id in positions:
+                self.search_index.update_page(page_id, self.pages[positions[page_id]])
+        self._index_stale.clear()
+
+    def highlight_matches(self, words):
+        """
+        Tags every whole-word occurrence of words on the current page.
+        """
+        self.text_widget.tag_remove("search_match", "1.0", tk.END)
+        count = tk.IntVar()
+        for word in set(words):
+            pattern = r"\m" + re.escape(word) + r"\M"
+            index = "1.0"
+            while True:
+                index = self.text_widget.search(pattern, index, stopindex=tk.END,
+                                                regexp=True, nocase=True, count=count)
+                if not index or not count.get():
+                    break
+                end = f"{index}+{count.get()}c"
+                self.text_widget.tag_add("search_match", index, end)
+                index = end
+
+    def find_next(self, event=None):
+        """
+        Moves to the next match after the cursor on the current page, or
+        else to the first match on the next page containing every word.
+        """
+        words = tokenize(self.search_var.get())
+        if not words:
+            return "break"
+        self.ensure_search_index()
+        self.save_current_page()
+        self.refresh_stale_pages()
+        self.highlight_matches(words)
+        match = self.text_widget.tag_nextrange("search_match", "insert+1c")
+        if match:
+            self.show_match(match[0])
+            return "break"
+        positions = self.pages.positions()
+        hits = sorted(positions[page_id] for page_id in self.search_index.search(self.search_var.get()))
+        if not hits:
+            self.search_status.configure(text="..." if self.index_walker.is_running() else "0")
+            return "break"
+        later = [i for i in hits if i > self.current_page]
+        self.current_page = later[0] if later else hits[0]
+        self.update_text()
+        self.when_page_loaded(lambda: self.show_first_match(words))
+        self.search_status.configure(text=f"{self.current_page + 1}/{len(self.pages)}")
+        return "break"
+
+    def show_first_match(self, words):
+        self.highlight_matches(words)
+        match = self.text_widget.tag_nextrange("search_match", "1.0")
+        if match:
+            self.show_match(match[0])
+
+    def show_match(self, index):
+        self.text_widget.mark_set(tk.INSERT, index)
+        self.text_widget.see(index)
+
+    # ===== Instrumentation =====
+    def start_tracing(self):
+        """
+        Wraps TRACED_METHODS on this instance so every call is timed, starts
+        sampling event-loop lag and shows the stats overlay. Callbacks that
+        were already handed to Tk keep calling the unwrapped method until
+        they are re-registered.
+        """
+        if self.tracer is not None:
+            return
+        self.tracer = Tracer()
+        for name in self.TRACED_METHODS:
+            setattr(self, name, self.tracer.wrap(name, getattr(self, name)))
+        self._lag_after_id = self.root.after(self.lag_interval_ms, self.measure_lag,
+                                             time.perf_counter() + self.lag_interval_ms / 1000)
+        self._overlay_after_id = self.root.after(1000, self.update_trace_overlay)
+    
+    def stop_tracing(self):
+        """
+        Writes the Chrome trace to trace_file and removes the instrumentation.
+        """
+        if self.tracer is None:
+            return
+        for name in self.TRACED_METHODS:
+            self.__dict__.pop(name, None)
+        for after_id in (self._lag_after_id, self._overlay_after_id):
+            if after_id is not None:
+                self.root.after_cancel(after_id)
+        self._lag_after_id = self._overlay_after_id = None
+        if self.trace_overlay is not None:
+            self.trace_overlay.destroy()
+            self.trace_overlay = None
+        tracer, self.tracer = self.tracer, None
+        try:
+            tracer.export(self.trace_file)
+        except OSError:
+            pass
+    
+    def measure_lag(self, expected):
+        # How late this timer fired is how long the event loop was busy.
+        now = time.perf_counter()
+        self.tracer.record_lag(expected, max(now - expected, 0))
+        self._lag_after_id = self.root.after(self.lag_interval_ms, self.measure_lag,
+                                             now + self.lag_interval_ms / 1000)
+    
+    def update_trace_overlay(self):
+        """
+        Shows p50/p99 per traced operation in a small window in the top
+        left corner of the screen, refreshed every second.
+        """
+        if self.trace_overlay is None:
+            self.trace_overlay = tk.Toplevel(self.root)
+            self.trace_overlay.overrideredirect(True)
+            self.trace_overlay.attributes("-topmost", True)
+            self.trace_overlay.geometry("+0+0")
+            self.trace_overlay_label = tk.Label(self.trace_overlay, font="TkFixedFont",
+                                                justify="left", anchor="w")
+            self.trace_overlay_label.pack()
+        lines = [f"{'':<16}{'n':>6}{'p50':>9}{'p99':>9}"]
+        for name, stat in sorted(self.tracer.stats().items()):
+            lines.append(f"{name[:16]:<16}{stat['count']:>6}{stat['p50_ms']:>9.2f}{stat['p99_ms']:>9.2f}")
+        if self.completions is not None:
+            usage = self.completions.usage()
+            lines.append(f"completions: {usage['words']} words, {usage['bytes'] // 1024} KB")
+        self.trace_overlay_label.configure(text="\n".join(lines), bg=self.btn_color, fg=self.fg_color)
+        self._overlay_after_id = self.root.after(1000, self.update_trace_overlay)
 
 # ================= Main Execution Block =================
 if __name__ == "__main__":
@@ -0,0 +1,1027 @@
+"""
+Benchmarks for Popout Notepad.
+
+Usage:
+    python bench_notepad.py [scenario ...] [--json results.json]
+
+Runs every scenario when none is named. Results are printed and, with
+--json, written out together with the current commit so runs from
+different commits can be compared.
+
+Scenarios that drive NotepadApp itself need a display; on Linux run them
+under Xvfb (e.g. xvfb-run python bench_notepad.py). pyautogui and winreg
+are replaced by stubs for those runs.
+"""
+import argparse
+import contextlib
+import gc
+import importlib.util
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+
+from notepad_highlight import LEXERS, LineStates
+from notepad_index import CompletionIndex, SearchIndex, fuzzy_filter
+from notepad_ipc import CommandServer, send_commands
+from notepad_spell import SpellChecker, SpellLines, WordList
+from notepad_store import EditJournal, PageStore, atomic_write_json
+from notepad_transfer import export_pages, import_batches
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_words(count, seed=0):
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(3, 10))) for _ in range(count)]
+
+
+def make_pages(page_count, page_chars, vocabulary=50000, seed=0):
+    """
+    Returns page_count pages of roughly page_chars characters of random
+    words, with a Zipf-like word distribution.
+    """
+    rng = random.Random(seed)
+    words = make_words(vocabulary, seed)
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    per_page = max(page_chars // 7, 1)
+    pages = []
+    for _ in range(page_count):
+        pages.append(" ".join(rng.choices(words, weights, k=per_page)))
+    return pages, words
+
+
+def make_markdown_page(page_chars, seed=0):
+    """
+    Returns about page_chars characters of Markdown notes: headings, lists,
+    paragraphs with inline markup and fenced Python and shell blocks.
+    """
+    rng = random.Random(seed)
+    words = make_words(2000, seed)
+    blocks = []
+    size = 0
+    while size < page_chars:
+        kind = rng.random()
+        if kind < 0.1:
+            block = "## " + " ".join(rng.choices(words, k=4))
+        elif kind < 0.35:
+            block = "\n".join(f"- [{rng.choice(' x')}] " + " ".join(rng.choices(words, k=6))
+                              for _ in range(rng.randint(2, 6)))
+        elif kind < 0.45:
+            block = "\n".join(["```python", "def f(x):", "    \"\"\"Doc", "    string.\"\"\"",
+                               "    return x + 1  # comment", "```"])
+        elif kind < 0.5:
+            block = "\n".join(["```sh", "export PATH=\"$HOME/bin:$PATH\"", "echo done", "```"])
+        else:
+            line = rng.choices(words, k=12)
+            line[3] = f"*{line[3]}*"
+            line[7] = f"`{line[7]}`"
+            block = " ".join(line)
+        blocks.append(block)
+        size += len(block) + 2
+    return "\n\n".join(blocks)
+
+
+def timings_ms(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 4),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1] * 1000, 4),
+        "max_ms": round(samples[-1] * 1000, 4),
+    }
+
+
+def bench_search(page_count=10000, page_chars=5000, queries=500):
+    """
+    Query latency of the inverted index on a ~50 MB notebook.
+    """
+    pages, words = make_pages(page_count, page_chars)
+    index = SearchIndex()
+    started = time.perf_counter()
+    for i, text in enumerate(pages):
+        index.update_page(str(i), text)
+    build_s = time.perf_counter() - started
+
+    rng = random.Random(1)
+    samples = []
+    for _ in range(queries):
+        query = " ".join(rng.choices(words, k=rng.randint(1, 3)))
+        started = time.perf_counter()
+        index.search(query)
+        samples.append(time.perf_counter() - started)
+
+    update_samples = []
+    for i in rng.sample(range(page_count), 100):
+        started = time.perf_counter()
+        index.update_page(str(i), pages[i] + " " + rng.choice(words))
+        update_samples.append(time.perf_counter() - started)
+
+    return {
+        "pages": page_count,
+        "chars": sum(map(len, pages)),
+        "build_s": round(build_s, 3),
+        "query": timings_ms(samples),
+        "page_update": timings_ms(update_samples),
+    }
+
+
+class StubPointer:
+    """
+    Stands in for pyautogui: position() returns wherever the benchmark put
+    the pointer.
+    """
+
+    def __init__(self, x=0, y=0):
+        self.x = x
+        self.y = y
+
+    def position(self):
+        return self.x, self.y
+
+
+def install_stubs(pointer):
+    pyautogui = types.ModuleType("pyautogui")
+    pyautogui.position = pointer.position
+    sys.modules["pyautogui"] = pyautogui
+    if sys.platform != "win32":
+        winreg = types.ModuleType("winreg")
+        winreg.HKEY_CURRENT_USER = None
+
+        def open_key(*args):
+            raise OSError("winreg stub")
+
+        winreg.OpenKey = open_key
+        sys.modules["winreg"] = winreg
+
+
+_app_module = None
+
+
+def app_module():
+    """
+    Imports Popout-Notepad.py, whose file name is not a valid module name.
+    """
+    global _app_module
+    if _app_module is None:
+        spec = importlib.util.spec_from_file_location(
+            "popout_notepad", os.path.join(HERE, "Popout-Notepad.py"))
+        _app_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_app_module)
+    return _app_module
+
+
+def have_display():
+    return sys.platform == "win32" or bool(os.environ.get("DISPLAY"))
+
+
+def run_until(root, condition, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("gave up waiting for the event loop")
+        root.update()
+
+
+def page_loaded(app):
+    return app.text_widget is not None and app._load_after_id is None
+
+
+@contextlib.contextmanager
+def headless_app(pages=None, current_page=0):
+    """
+    Runs a NotepadApp in a scratch directory, optionally seeded with pages,
+    and yields it once startup has finished. The pointer starts far from
+    the panel; move it through app.bench_pointer.
+    """
+    module = app_module()
+    pointer = StubPointer(-10000, -10000)
+    install_stubs(pointer)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        root = None
+        try:
+            if pages is not None:
+                store = PageStore.from_texts("popout_notepad_pages", pages)
+                atomic_write_json("popout_notepad_config.json",
+                                  {"page_index": store.write_dirty(),
+                                   "current_page": current_page})
+            root = module.tk.Tk()
+            app = module.NotepadApp(root)
+            app.bench_pointer = pointer
+            run_until(root, lambda: page_loaded(app))
+            yield app
+        finally:
+            if root is not None:
+                root.destroy()
+            os.chdir(cwd)
+
+
+def bench_save_config(sizes=((10, 1000), (1000, 1000), (1000, 20000), (10000, 5000)), saves=20):
+    """
+    save_config latency by page count and page size: the first save writes
+    every page, later ones after editing a single page. "capture" is the
+    time the Tk thread is blocked, "written" includes the writer thread.
+    """
+    if not have_display():
+        return {"skipped": "no display (run under Xvfb)"}
+    results = {}
+    for page_count, page_chars in sizes:
+        pages, words = make_pages(page_count, page_chars)
+        with headless_app() as app:
+            app.pages = PageStore.from_texts(app.pages_dir, pages)
+            started = time.perf_counter()
+            app.save_config()
+            app.wait_for_writes()
+            first_s = time.perf_counter() - started
+            rng = random.Random(2)
+            capture = []
+            written = []
+            for _ in range(saves):
+                i = rng.randrange(page_count)
+                app.pages[i] = app.pages[i] + " " + rng.choice(words)
+                started = time.perf_counter()
+                app.save_config()
+                capture.append(time.perf_counter() - started)
+                app.wait_for_writes()
+                written.append(time.perf_counter() - started)
+        results[f"{page_count}x{page_chars}"] = {
+            "first_save_ms": round(first_s * 1000, 2),
+            "one_page_changed_capture": timings_ms(capture),
+            "one_page_changed_written": timings_ms(written),
+        }
+    return results
+
+
+def bench_load_config(page_counts=(10, 1000, 10000), journal_edits=1000, loads=20):
+    """
+    load_config time for a saved notebook, plus replay of a journal holding
+    journal_edits single-character edits.
+    """
+    if not have_display():
+        return {"skipped": "no display (run under Xvfb)"}
+    results = {}
+    for page_count in page_counts:
+        pages, _ = make_pages(page_count, 2000)
+        with headless_app(pages) as app:
+            samples = []
+            for _ in range(loads):
+                started = time.perf_counter()
+                app.load_config()
+                samples.append(time.perf_counter() - started)
+            # As left behind by an instance that crashed.
+            journal = EditJournal("popout_notepad_journal-crashed.log")
+            for i in range(journal_edits):
+                journal.append({"op": "edit", "id": app.pages.page_id(i % page_count),
+                                "at": 0, "del": 0, "ins": "x"})
+            journal.close()
+            replay = []
+            for _ in range(loads):
+                started = time.perf_counter()
+                app.load_config()
+                replay.append(time.perf_counter() - started)
+        results[str(page_count)] = {
+            "load": timings_ms(samples),
+            f"load_with_{journal_edits}_journal_edits": timings_ms(replay),
+        }
+    return results
+
+
+def bench_page_switch(page_count=50, page_chars=(1000, 100000, 2000000), switches=40):
+    """
+    save_current_page + next_page until the page is fully loaded, for
+    pages still in the widget cache and for pages that are not.
+    """
+    if not have_display():
+        return {"skipped": "no display (run under Xvfb)"}
+    results = {}
+    for chars in page_chars:
+        pages, _ = make_pages(page_count, chars)
+        with headless_app(pages) as app:
+            def switch(forward):
+                started = time.perf_counter()
+                app.save_current_page()
+                if forward:
+                    app.next_page()
+                else:
+                    app.prev_page()
+                run_until(app.root, lambda: page_loaded(app))
+                return time.perf_counter() - started
+            # Walking forward always lands on pages that are not cached...
+            cold = [switch(True) for _ in range(min(switches, page_count - 1))]
+            # ...and stepping back and forth only on cached ones.
+            warm = [switch(i % 2 == 1) for i in range(switches)]
+        results[str(chars)] = {"uncached": timings_ms(cold), "cached": timings_ms(warm)}
+    return results
+
+
+def bench_hover(ticks=2000, idle_seconds=10, settle_seconds=5):
+    """
+    Cost of one check_hover tick with the pointer far away and on the bar,
+    and how often the fallback poll wakes up per minute while the pointer
+    is idle far from the panel (counted over idle_seconds, after
+    settle_seconds for the poll to back off).
+    """
+    if not have_display():
+        return {"skipped": "no display (run under Xvfb)"}
+    with headless_app() as app:
+        left, top, right, bottom = app.hover_rect()
+        positions = {"far": (-10000, -10000), "on_bar": ((left + right) // 2, (top + bottom) // 2)}
+        results = {}
+        for name, (x, y) in positions.items():
+            app.bench_pointer.x, app.bench_pointer.y = x, y
+            app.check_hover()  # slide in or out once before timing
+            app.animator.cancel()
+            samples = []
+            for _ in range(ticks):
+                started = time.perf_counter()
+                app.check_hover()
+                samples.append(time.perf_counter() - started)
+                app.animator.cancel()
+            results[f"tick_{name}"] = timings_ms(samples)
+        app.bench_pointer.x, app.bench_pointer.y = positions["far"]
+        app.is_expanded = True
+        app.check_hover()
+        run_until(app.root, lambda: not app.animator.is_running())
+
+        def idle(seconds):
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                app.root.update()
+                time.sleep(0.005)
+
+        idle(settle_seconds)
+        wakeups = app.hover_wakeups
+        idle(idle_seconds)
+        results["idle_wakeups_per_min"] = round((app.hover_wakeups - wakeups) * 60 / idle_seconds, 1)
+    return results
+
+
+def bench_restyle(repeats=10):
+    """
+    restyle_ui time per settings change, including the redraw.
+    """
+    if not have_display():
+        return {"skipped": "no display (run under Xvfb)"}
+    pages, _ = make_pages(10, 20000)
+    changes = {
+        "theme": ("update_theme", ["dark", "light"]),
+        "size": ("update_size", [64, 128, 48]),
+        "side": ("update_side", ["left", "top", "bottom", "right"]),
+        "font": ("update_font", ["Verdana", "Arial"]),
+        "text_font_size": ("update_text_font_size", [16, 12]),
+    }
+    results = {}
+    with headless_app(pages) as app:
+        for name, (method, values) in changes.items():
+            samples = []
+            for _ in range(repeats):
+                for value in values:
+                    started = time.perf_counter()
+                    getattr(app, method)(value)
+                    app.root.update_idletasks()
+                    samples.append(time.perf_counter() - started)
+            results[name] = timings_ms(samples)
+    return results
+
+
+def bench_highlight(page_chars=1000000, keystrokes=300):
+    """
+    Markdown highlighting on one large page: lexing the whole page, the
+    lexer work per keystroke, and (with a display) keystroke latency with
+    highlighting off and on, opening a code fence at the top, and how long
+    the idle sweep takes to cover the page.
+    """
+    text = make_markdown_page(page_chars)
+    lines = text.split("\n")
+    lexer = LEXERS["markdown"]
+    started = time.perf_counter()
+    state = lexer.initial_state
+    for line in lines:
+        _, state = lexer.lex_line(line, state)
+    full_lex = time.perf_counter() - started
+    # Typing in the middle of the page, without Tk.
+    states = LineStates(lexer)
+    while states.next_line() is not None:
+        line = states.next_line()
+        _, state = lexer.lex_line(lines[line - 1], states.state_before(line))
+        states.store(line, state, len(lines))
+    middle = len(lines) // 2
+    samples = []
+    for i in range(keystrokes):
+        lines[middle - 1] += "x"
+        started = time.perf_counter()
+        states.edit(middle, 0, 0)
+        while states.next_line() is not None:
+            line = states.next_line()
+            _, state = lexer.lex_line(lines[line - 1], states.state_before(line))
+            states.store(line, state, len(lines))
+        samples.append(time.perf_counter() - started)
+    results = {
+        "chars": len(text),
+        "lines": len(lines),
+        "full_lex_ms": round(full_lex * 1000, 1),
+        "relex_per_keystroke": timings_ms(samples),
+    }
+    if not have_display():
+        results["app"] = {"skipped": "no display (run under Xvfb)"}
+        return results
+    with headless_app([text]) as app:
+        widget = app.text_widget
+        widget.mark_set("insert", f"{middle}.end")
+        widget.see("insert")
+
+        def type_keys(count):
+            samples = []
+            for _ in range(count):
+                started = time.perf_counter()
+                widget.insert("insert", "x")
+                app.root.update_idletasks()
+                samples.append(time.perf_counter() - started)
+            return timings_ms(samples)
+
+        results["keystroke_plain"] = type_keys(keystrokes)
+        app.highlight_var.set(True)
+        started = time.perf_counter()
+        app.update_highlighting()
+        app.root.update_idletasks()
+        results["first_screen_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        run_until(app.root, lambda: widget.line_states.next_line() is None, timeout=120)
+        results["sweep_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        results["keystroke_highlighted"] = type_keys(keystrokes)
+        # An unclosed fence changes every line below it.
+        started = time.perf_counter()
+        widget.insert("1.0", "```\n")
+        app.root.update_idletasks()
+        results["open_fence_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        run_until(app.root, lambda: widget.line_states.next_line() is None, timeout=120)
+        results["open_fence_sweep_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return results
+
+
+def bench_spell(page_chars=1000000, vocabulary=300000, keystrokes=300):
+    """
+    Spell checking a large page: compiling a 300k-word dictionary, checking
+    the whole page on the checker (uncached, then with the word cache
+    warm), the bookkeeping per keystroke, and (with a display) keystroke
+    latency with spell checking off and on while the page is being swept,
+    and how long the sweep takes.
+    """
+    text = make_markdown_page(page_chars)
+    lines = text.split("\n")
+    results = {"chars": len(text), "lines": len(lines)}
+    with tempfile.TemporaryDirectory() as workdir:
+        # Every other word of the page is in the dictionary.
+        words = sorted(set(make_words(vocabulary, seed=1)) | set(make_words(2000)[::2]))
+        source = os.path.join(workdir, "words.txt")
+        with open(source, "w") as f:
+            f.write("\n".join(words))
+        dictionary = os.path.join(workdir, "dictionary.dat")
+        started = time.perf_counter()
+        WordList.compile([source], dictionary)
+        results["compile_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        checker = SpellChecker(dictionary)
+        checker._words = WordList(dictionary)
+        for name in ("check_page_cold_ms", "check_page_warm_ms"):
+            started = time.perf_counter()
+            flagged = sum(len(checker.misspelled(line)) for line in lines)
+            results[name] = round((time.perf_counter() - started) * 1000, 1)
+        results["flagged"] = flagged
+        checker._words.close()
+    states = SpellLines()
+    while states.take(1, 40, len(lines), 1000):
+        pass
+    middle = len(lines) // 2
+    samples = []
+    for _ in range(keystrokes):
+        started = time.perf_counter()
+        states.edit(middle, 0, 0)
+        samples.append(time.perf_counter() - started)
+    results["bookkeeping_per_keystroke"] = timings_ms(samples)
+    if not have_display():
+        results["app"] = {"skipped": "no display (run under Xvfb)"}
+        return results
+    with headless_app([text]) as app:
+        with open("popout_notepad_words.txt", "w") as f:
+            f.write("\n".join(make_words(2000)[::2]))
+        widget = app.text_widget
+        widget.mark_set("insert", f"{middle}.end")
+        widget.see("insert")
+
+        def type_keys(count):
+            samples = []
+            for _ in range(count):
+                started = time.perf_counter()
+                widget.insert("insert", "x")
+                app.root.update_idletasks()
+                samples.append(time.perf_counter() - started)
+                # Give the checker a turn now and then, as a typist would.
+                app.root.update()
+            return timings_ms(samples)
+
+        results["keystroke_plain"] = type_keys(keystrokes)
+        app.spell_var.set(True)
+        started = time.perf_counter()
+        app.update_spell_check()
+        results["keystroke_spell_checked"] = type_keys(keystrokes)
+        run_until(app.root, lambda: widget.spell_lines.done(len(lines)) and not app._spell_pending,
+                  timeout=300)
+        results["sweep_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        results["underlined"] = len(widget.tag_ranges("misspelled")) // 2
+    return results
+
+
+def bench_slide(slides=20):
+    """
+    Frame timing of slide_in / slide_out: the interval between frames and
+    the duration of a whole slide, per docking side.
+    """
+    if not have_display():
+        return {"skipped": "no display (run under Xvfb)"}
+    results = {}
+    with headless_app() as app:
+        frames = []
+        set_offset = app.set_offset
+
+        def timed_set_offset(offset):
+            frames.append(time.perf_counter())
+            set_offset(offset)
+
+        app.set_offset = timed_set_offset
+        for side in ("right", "left", "top", "bottom"):
+            app.update_side(side)
+            intervals = []
+            durations = []
+            frame_cost = []
+            for i in range(slides):
+                del frames[:]
+                started = time.perf_counter()
+                if i % 2 == 0:
+                    app.slide_in()
+                else:
+                    app.slide_out()
+                run_until(app.root, lambda: not app.animator.is_running())
+                durations.append(time.perf_counter() - started)
+                intervals.extend(b - a for a, b in zip(frames, frames[1:]))
+                # Time spent in set_offset itself, i.e. the geometry change.
+                for _ in range(5):
+                    t0 = time.perf_counter()
+                    set_offset(app.current_offset)
+                    frame_cost.append(time.perf_counter() - t0)
+            results[side] = {
+                "frame_interval": timings_ms(intervals),
+                "slide": timings_ms(durations),
+                "set_offset": timings_ms(frame_cost),
+            }
+    return results
+
+
+def bench_cold_start(runs=10, page_count=1000, page_chars=5000, exe=None):
+    """
+    Time from launching a fresh process to the collapsed bar being mapped
+    ("mapped") and to the current page being in the text widget ("ready"),
+    on a 1000-page notebook. Runs the script, or the PyInstaller build given
+    as exe. Needs a display; on Linux run it under Xvfb.
+    """
+    if sys.platform != "win32" and not os.environ.get("DISPLAY"):
+        return {"skipped": "no display (run under Xvfb)"}
+    command = [exe] if exe else [sys.executable, os.path.join(HERE, "Popout-Notepad.py")]
+    pages, _ = make_pages(page_count, page_chars)
+    mapped, ready = [], []
+    with tempfile.TemporaryDirectory() as workdir:
+        store = PageStore.from_texts(os.path.join(workdir, "popout_notepad_pages"), pages)
+        atomic_write_json(os.path.join(workdir, "popout_notepad_config.json"),
+                          {"page_index": store.write_dirty(), "current_page": page_count // 2})
+        probe = os.path.join(workdir, "startup_probe.txt")
+        env = dict(os.environ, POPOUT_NOTEPAD_STARTUP_PROBE=probe)
+        for _ in range(runs):
+            if os.path.exists(probe):
+                os.remove(probe)
+            started = time.time()
+            subprocess.run(command, cwd=workdir, env=env, timeout=60, check=True)
+            with open(probe) as f:
+                stages = dict(line.split() for line in f)
+            mapped.append(float(stages["mapped"]) - started)
+            ready.append(float(stages["ready"]) - started)
+    return {
+        "command": os.path.basename(command[-1]),
+        "runs": runs,
+        "mapped": timings_ms(mapped),
+        "ready": timings_ms(ready),
+    }
+
+
+def bench_cli(runs=10, page_count=1000, page_chars=5000, exe=None):
+    """
+    Wall time of command-line calls on a 1000-page notebook, from process
+    start to exit, and whether any of them imported tkinter. Needs no
+    display.
+    """
+    command = [exe] if exe else [sys.executable, "-X", "importtime",
+                                 os.path.join(HERE, "Popout-Notepad.py")]
+    pages, words = make_pages(page_count, page_chars)
+    calls = {
+        "cat": ["cat", str(page_count // 2)],
+        "add": ["add", "--page", "1", "appended line"],
+        "list": ["list"],
+        "search": ["search", words[0]],
+    }
+    results = {"command": os.path.basename(command[-1]), "runs": runs}
+    imported_tk = False
+    with tempfile.TemporaryDirectory() as workdir:
+        store = PageStore.from_texts(os.path.join(workdir, "popout_notepad_pages"), pages)
+        atomic_write_json(os.path.join(workdir, "popout_notepad_config.json"),
+                          {"page_index": store.write_dirty()})
+        for name, args in calls.items():
+            samples = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                done = subprocess.run(command + args, cwd=workdir, capture_output=True,
+                                      text=True, timeout=60)
+                samples.append(time.perf_counter() - started)
+                imported_tk = imported_tk or "tkinter" in done.stderr
+            results[name] = timings_ms(samples)
+    if not exe:
+        results["imported_tkinter"] = imported_tk
+    return results
+
+
+def bench_ipc(round_trips=200, burst=500):
+    """
+    Handing a command to a running panel: the socket round trip alone, and
+    (with a display) a burst of separate append calls, counting how many
+    UI passes and saves the panel needed for it.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            server = CommandServer()
+            samples = []
+            for _ in range(round_trips):
+                started = time.perf_counter()
+                send_commands([{"cmd": "show"}])
+                samples.append(time.perf_counter() - started)
+            server.close()
+        finally:
+            os.chdir(cwd)
+    results["round_trip"] = timings_ms(samples)
+    if not have_display():
+        results["burst"] = {"skipped": "no display (run under Xvfb)"}
+        return results
+    with headless_app([""]) as app:
+        counts = {"run_ipc_commands": 0, "save_config": 0}
+        for name in counts:
+            original = getattr(app, name)
+
+            def counted(*args, name=name, original=original):
+                counts[name] += 1
+                return original(*args)
+            setattr(app, name, counted)
+        sender = threading.Thread(target=lambda: [
+            send_commands([{"cmd": "append", "text": f"line {i}"}]) for i in range(burst)])
+        started = time.perf_counter()
+        sender.start()
+        run_until(app.root, lambda: not sender.is_alive() and app.text_widget.get(
+            "end-2l", "end-1c").strip() == f"line {burst - 1}")
+        applied = time.perf_counter() - started
+        app.wait_for_writes()
+        app.flush_config()
+        app.wait_for_writes()
+        results["burst"] = {
+            "appends": burst,
+            "applied_ms": round(applied * 1000, 1),
+            "ui_passes": counts["run_ipc_commands"],
+            "saves": counts["save_config"],
+        }
+    return results
+
+
+def bench_navigator(page_count=10000, queries=("a", "pro", "xqz", "4711"), repeats=5):
+    """
+    Jump-to-page list on a 10k-page notebook: fuzzy filtering all titles,
+    and (with a display) opening the list, typing a query, scrolling to
+    the end and jumping.
+    """
+    words = make_words(5000)
+    rng = random.Random(1)
+    titles = [" ".join(rng.choices(words, k=rng.randint(2, 8))) for _ in range(page_count)]
+    results = {}
+    for query in queries:
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            fuzzy_filter(query, titles)
+            samples.append(time.perf_counter() - started)
+        results[f"filter_{query}"] = timings_ms(samples)
+    if not have_display():
+        results["app"] = {"skipped": "no display (run under Xvfb)"}
+        return results
+    pages = [f"# {title}\n\nbody" for title in titles]
+    with headless_app(pages) as app:
+        def timed(action):
+            started = time.perf_counter()
+            action()
+            app.root.update_idletasks()
+            return time.perf_counter() - started
+
+        opens, typing, scrolls = [], [], []
+        for _ in range(repeats):
+            opens.append(timed(app.open_navigator))
+            typing.append(timed(lambda: app.navigator.query_var.set(queries[1])))
+            app.navigator.query_var.set("")
+            scrolls.append(timed(lambda: app.navigator.yview("moveto", 1.0)))
+            app.close_navigator()
+        app.open_navigator()
+        app.navigator.query_var.set(str(page_count // 2))
+        jump = timed(app.navigator.choose)
+        run_until(app.root, lambda: page_loaded(app))
+        results.update({
+            "open": timings_ms(opens),
+            "type_query": timings_ms(typing),
+            "scroll_to_end": timings_ms(scrolls),
+            "jump_ms": round(jump * 1000, 3),
+        })
+    return results
+
+
+def bench_transfer(page_counts=(1000, 10000), page_chars=5000):
+    """
+    Bulk export of a saved notebook to a folder and to a zip archive and
+    importing both back, with the peak Python memory of each pass: it
+    should stay about the same as the notebook grows. With a display, also
+    an import through the panel, with the longest gap between UI passes.
+    """
+    results = {}
+    for page_count in page_counts:
+        pages, _ = make_pages(page_count, page_chars)
+        with tempfile.TemporaryDirectory() as workdir:
+            store = PageStore(os.path.join(workdir, "pages"),
+                              PageStore.from_texts(os.path.join(workdir, "pages"), pages).write_dirty())
+            del pages
+            passes = {}
+            for name in ("folder", "notes.zip"):
+                destination = os.path.join(workdir, name)
+                tracemalloc.start()
+                started = time.perf_counter()
+                texts = (store.read_source(source) for source in store.sources())
+                for _ in export_pages(destination, texts, page_count):
+                    pass
+                exported = time.perf_counter() - started
+                peak_export = tracemalloc.get_traced_memory()[1]
+                tracemalloc.reset_peak()
+                started = time.perf_counter()
+                imported = sum(len(texts) for _, _, texts in import_batches([destination]))
+                passes[name] = {
+                    "export_ms": round(exported * 1000, 1),
+                    "export_peak_kb": peak_export // 1024,
+                    "import_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "import_peak_kb": tracemalloc.get_traced_memory()[1] // 1024,
+                    "pages": imported,
+                }
+                tracemalloc.stop()
+            results[f"{page_count}_pages"] = passes
+    if not have_display():
+        results["app"] = {"skipped": "no display (run under Xvfb)"}
+        return results
+    pages, _ = make_pages(page_counts[0], page_chars)
+    with tempfile.TemporaryDirectory() as workdir, headless_app([""]) as app:
+        for _ in export_pages(os.path.join(workdir, "notes.zip"), pages, len(pages)):
+            pass
+        gaps = []
+        last = [time.perf_counter()]
+
+        def tick():
+            now = time.perf_counter()
+            gaps.append(now - last[0])
+            last[0] = now
+            app.root.after(10, tick)
+        app.root.after(10, tick)
+        started = time.perf_counter()
+        app.start_import([os.path.join(workdir, "notes.zip")])
+        run_until(app.root, lambda: app._transfer is None, timeout=120)
+        results["app"] = {
+            "pages": len(app.pages) - 1,
+            "import_ms": round((time.perf_counter() - started) * 1000, 1),
+            "max_ui_gap_ms": round(max(gaps) * 1000, 1),
+        }
+    return results
+
+
+def bench_completion(page_count=10000, page_chars=5000, lookups=2000, edits=2000):
+    """
+    Word completion on a ~50 MB notebook: counting every page, lookups of
+    2-4 letter prefixes (first with the prefix cache cold, then warm), the
+    index update per saved edit, and the memory the index reports.
+    """
+    pages, words = make_pages(page_count, page_chars)
+    index = CompletionIndex()
+    started = time.perf_counter()
+    for text in pages:
+        index.add_text(text)
+    results = {"build_ms": round((time.perf_counter() - started) * 1000, 1)}
+    rng = random.Random(2)
+    prefixes = [word[:rng.randint(2, 4)] for word in rng.choices(words, k=lookups)]
+    for name in ("lookup_cold", "lookup_warm"):
+        samples = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            index.complete(prefix)
+            samples.append(time.perf_counter() - started)
+        results[name] = timings_ms(samples)
+    text = pages[0]
+    samples = []
+    for _ in range(edits):
+        at = rng.randrange(len(text))
+        inserted = rng.choice(words) + " "
+        started = time.perf_counter()
+        index.apply_edit(text, at, 0, inserted)
+        samples.append(time.perf_counter() - started)
+        text = text[:at] + inserted + text[at:]
+    results["edit"] = timings_ms(samples)
+    results["usage"] = index.usage()
+    return results
+
+
+def tk_widget_count(root):
+    # Counted on the Tcl side, so widgets Python lost track of count too.
+    count = 0
+    pending = [str(root)]
+    while pending:
+        count += 1
+        pending.extend(root.tk.splitlist(root.tk.call("winfo", "children", pending.pop())))
+    return count
+
+
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def bench_soak(rounds=2000, warmup=100, page_count=20, page_chars=20000,
+               max_python_growth=0.02, max_rss_growth_kb=4096, max_tcl_command_growth=10):
+    """
+    Leak check: rounds of right-clicking the panel (opening the Page
+    History and Import / Export cascades), sliding in and out, switching
+    pages (past the text widget cache, so widgets come and go) and
+    changing a setting. Tk widgets, Tcl commands, Python objects and RSS
+    are sampled after a warm-up and every quarter of the run; raises
+    AssertionError if they grew by more than the limits.
+
+    Needs X11 (Xvfb): on Windows the menu would wait for a real click.
+    """
+    if sys.platform == "win32" or not have_display():
+        return {"skipped": "needs X11 (run under Xvfb)"}
+    pages, _ = make_pages(page_count, page_chars)
+    settings = [
+        ("update_theme", ["dark", "light"]),
+        ("update_size", [64, 128, 48]),
+        ("update_side", ["left", "top", "bottom", "right"]),
+        ("update_font", ["Verdana", "Arial", "Tahoma"]),
+        ("update_text_font_size", [16, 12, 14]),
+    ]
+    with headless_app(pages) as app:
+        root = app.root
+        app.animator.duration_ms = 30  # a slide is then two frames
+        menu = app.settings_menu
+        cascades = [menu.index("Page History"), menu.index("Import / Export")]
+        step = [1]
+
+        def right_click():
+            root.event_generate("<Button-3>", x=10, y=10, rootx=10, rooty=10)
+            for cascade in cascades:
+                menu.postcascade(cascade)
+                root.update_idletasks()
+            menu.postcascade("none")
+            menu.unpost()
+
+        def slide():
+            app.slide_in()
+            run_until(root, lambda: not app.animator.is_running())
+            app.slide_out()
+            run_until(root, lambda: not app.animator.is_running())
+
+        def switch_page():
+            if not 0 <= app.current_page + step[0] < len(app.pages):
+                step[0] = -step[0]
+            app.save_current_page()
+            if step[0] > 0:
+                app.next_page()
+            else:
+                app.prev_page()
+            run_until(root, lambda: page_loaded(app))
+
+        def change_setting(round_number):
+            method, values = settings[round_number % len(settings)]
+            getattr(app, method)(values[round_number // len(settings) % len(values)])
+            if round_number % 50 == 0:
+                app.highlight_var.set(not app.highlight_var.get())
+                app.update_highlighting()
+                app.complete_var.set(not app.complete_var.get())
+                app.update_word_completion()
+
+        def sample(round_number):
+            # Let pending idle work and short timers run out first.
+            for _ in range(20):
+                root.update()
+                time.sleep(0.005)
+            gc.collect()
+            return {
+                "round": round_number,
+                "tk_widgets": tk_widget_count(root),
+                "tcl_commands": len(root.tk.splitlist(root.tk.call("info", "commands"))),
+                "python_objects": len(gc.get_objects()),
+                "rss_kb": rss_kb(),
+            }
+
+        started = time.perf_counter()
+        samples = []
+        for round_number in range(warmup + rounds):
+            if round_number >= warmup and (round_number - warmup) % max(rounds // 4, 1) == 0:
+                samples.append(sample(round_number - warmup))
+            right_click()
+            slide()
+            switch_page()
+            change_setting(round_number)
+        samples.append(sample(rounds))
+        elapsed = time.perf_counter() - started
+    first, last = samples[0], samples[-1]
+    grew = []
+    if last["tk_widgets"] > first["tk_widgets"]:
+        grew.append("tk_widgets")
+    if last["tcl_commands"] > first["tcl_commands"] + max_tcl_command_growth:
+        grew.append("tcl_commands")
+    if last["python_objects"] > first["python_objects"] * (1 + max_python_growth):
+        grew.append("python_objects")
+    if first["rss_kb"] is not None and last["rss_kb"] > first["rss_kb"] + max_rss_growth_kb:
+        grew.append("rss_kb")
+    results = {"rounds": rounds, "elapsed_s": round(elapsed, 1), "samples": samples, "grew": grew}
+    if grew:
+        raise AssertionError(f"grew over {rounds} rounds: {', '.join(grew)}\n"
+                             + json.dumps(samples, indent=2))
+    return results
+
+
+SCENARIOS = {
+    "search": bench_search,
+    "cold_start": bench_cold_start,
+    "cli": bench_cli,
+    "save_config": bench_save_config,
+    "load_config": bench_load_config,
+    "page_switch": bench_page_switch,
+    "hover": bench_hover,
+    "restyle": bench_restyle,
+    "slide": bench_slide,
+    "highlight": bench_highlight,
+    "spell": bench_spell,
+    "ipc": bench_ipc,
+    "navigator": bench_navigator,
+    "completion": bench_completion,
+    "transfer": bench_transfer,
+    "soak": bench_soak,
+}
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", help=", ".join(SCENARIOS))
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--exe", help="cold_start, cli: time this build instead of the script")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario: {name}")
+
+    results = {}
+    for name in args.scenarios or SCENARIOS:
+        kwargs = {"exe": args.exe} if name in ("cold_start", "cli") and args.exe else {}
+        results[name] = SCENARIOS[name](**kwargs)
+        print(name, json.dumps(results[name], indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"commit": current_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "python": sys.version.split()[0], "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Command-line access to the Popout Notepad store, without Tk.
+
+    popout-notepad list
+    popout-notepad cat PAGE
+    popout-notepad add [--page PAGE | --new] [TEXT ...]
+    popout-notepad import PATH ...
+    popout-notepad search PATTERN
+    popout-notepad export DESTINATION
+    popout-notepad show
+    popout-notepad open PAGE
+
+Pages are numbered from 1, as in the panel. Popout-Notepad.py hands any
+command line with arguments to main() before it imports tkinter or
+pyautogui, so a command runs in a few tens of milliseconds.
+
+It is safe to use while the panel is open. Reads include the edits that
+running instances have journaled but not saved yet. add and import are
+handed to the running panel (see notepad_ipc), which applies them like
+typing; without one they are saved the way another instance would save
+them, so panels started later, or running without a command channel,
+merge them page by page. show and open need a running panel.
+
+import takes files, folders of .md/.txt files and zip archives, and export
+writes a folder or (for a name ending in .zip) an archive; both stream
+the pages through notepad_transfer, so big notebooks need little memory.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import uuid
+
+from notepad_ipc import CommandError, send_commands
+from notepad_store import EditJournal, PageReadError, PageStore, atomic_write_json, store_lock
+from notepad_transfer import export_pages, import_batches
+
+CONFIG_FILE = "popout_notepad_config.json"
+PAGES_DIR = "popout_notepad_pages"
+JOURNAL_PATTERN = "popout_notepad_journal*.log"
+
+
+class Notebook:
+    """
+    The saved pages plus any journaled edits on top, loaded the same way
+    NotepadApp.load_config does.
+
+    With for_writing set, only journals left behind by instances that are
+    gone are folded in (and adopted, as on startup), since running ones
+    save their own edits; otherwise every journal is read.
+    """
+
+    def __init__(self, for_writing=False):
+        try:
+            with open(CONFIG_FILE, "r") as f:
+                self.config = json.load(f)
+        except FileNotFoundError:
+            self.config = {}
+        except (OSError, ValueError) as e:
+            sys.exit(f"popout-notepad: cannot read config: {e}")
+        page_index = self.config.get("page_index")
+        if page_index is not None:
+            self.pages = PageStore(PAGES_DIR, page_index)
+        else:
+            texts = self.config.get("pages")
+            if texts is None:
+                texts = [self.config.get("content", "")]
+            self.pages = PageStore.from_texts(PAGES_DIR, texts)
+        self.journal_seqs = dict(self.config.get("journal_seqs", {}))
+        if "journal_seq" in self.config:
+            self.journal_seqs.setdefault("", self.config["journal_seq"])
+        self.adopted = []
+        for path in sorted(glob.glob(JOURNAL_PATTERN)):
+            journal = EditJournal(path)
+            if for_writing and not journal.adopt():
+                continue
+            instance = path[len("popout_notepad_journal"):-len(".log")].lstrip("-")
+            try:
+                journal.replay(self.pages, self.journal_seqs.get(instance, 0))
+            except OSError as e:
+                print(f"popout-notepad: skipping {path}: {e}", file=sys.stderr)
+                journal.close()
+                continue
+            self.journal_seqs[instance] = journal.seq
+            if for_writing:
+                self.adopted.append(journal)
+
+    def page(self, number):
+        """
+        Returns the index of 1-based page number, or exits with an error.
+        """
+        if not 1 <= number <= len(self.pages):
+            sys.exit(f"popout-notepad: no page {number} (there are {len(self.pages)})")
+        return number - 1
+
+    def save(self):
+        """
+        Writes changed pages and a new header, keeping the panel's settings.
+        """
+        config = dict(self.config)
+        config.pop("pages", None)
+        config.pop("content", None)
+        config.pop("journal_seq", None)
+        config["journal_seqs"] = self.journal_seqs
+        config["generation"] = uuid.uuid4().hex
+        with store_lock(PAGES_DIR):
+            config["page_index"] = self.pages.write_dirty()
+            atomic_write_json(CONFIG_FILE, config)
+        self.pages.remove_obsolete()
+        for journal in self.adopted:
+            journal.reset()
+        self.adopted = []
+
+
+def write_text(text):
+    sys.stdout.write(text)
+    if text and not text.endswith("\n"):
+        sys.stdout.write("\n")
+
+
+def cmd_list(args):
+    notebook = Notebook()
+    for i in range(len(notebook.pages)):
+        print(f"{i + 1:>4}  {notebook.pages.title(i)}")
+
+
+def cmd_cat(args):
+    notebook = Notebook()
+    write_text(notebook.pages.peek(notebook.page(args.page)))
+
+
+def hand_off(commands):
+    """
+    Sends commands to the running panel. Returns False if there is none.
+    """
+    try:
+        return send_commands(commands)
+    except CommandError as e:
+        sys.exit(f"popout-notepad: {e}")
+
+
+def cmd_add(args):
+    text = " ".join(args.text) if args.text else sys.stdin.read()
+    text = text.rstrip("\n")
+    command = {"cmd": "append", "text": text}
+    if args.new:
+        command["new"] = True
+    elif args.page is not None:
+        command["page"] = args.page
+    if hand_off([command]):
+        return
+    notebook = Notebook(for_writing=True)
+    if args.new:
+        notebook.pages.append(text)
+    else:
+        if args.page is None:
+            current = notebook.config.get("current_page", 0)
+            index = min(max(current, 0), len(notebook.pages) - 1)
+        else:
+            index = notebook.page(args.page)
+        old = notebook.pages[index]
+        notebook.pages[index] = old + "\n" + text if old else text
+    notebook.save()
+
+
+def cmd_import(args):
+    # A batch at a time, to the panel if one is running; otherwise each
+    # batch is saved so its pages can leave memory.
+    notebook = None
+    done = 0
+    try:
+        for done, total, texts in import_batches(args.paths):
+            if notebook is None and hand_off([{"cmd": "import", "pages": texts}]):
+                continue
+            if notebook is None:
+                notebook = Notebook(for_writing=True)
+            for text in texts:
+                notebook.pages.append(text)
+            notebook.save()
+    except OSError as e:
+        partly = f" (after importing {done} page(s))" if done else ""
+        sys.exit(f"popout-notepad: {e}{partly}")
+    print(f"imported {done} page(s)")
+
+
+def cmd_show(args):
+    if not hand_off([{"cmd": "show"}]):
+        sys.exit("popout-notepad: the notepad is not running")
+
+
+def cmd_open(args):
+    if not hand_off([{"cmd": "open", "page": args.page}]):
+        sys.exit("popout-notepad: the notepad is not running")
+
+
+def cmd_search(args):
+    flags = 0 if args.case_sensitive else re.IGNORECASE
+    try:
+        pattern = re.compile(args.pattern, flags)
+    except re.error as e:
+        sys.exit(f"popout-notepad: bad pattern: {e}")
+    notebook = Notebook()
+    found = False
+    for i in range(len(notebook.pages)):
+        for number, line in enumerate(notebook.pages.peek(i).splitlines(), 1):
+            if pattern.search(line):
+                print(f"{i + 1}:{number}:{line}")
+                found = True
+    return 0 if found else 1
+
+
+def cmd_export(args):
+    notebook = Notebook()
+    count = len(notebook.pages)
+    texts = (notebook.pages.peek(i) for i in range(count))
+    try:
+        for _ in export_pages(args.destination, texts, count):
+            pass
+    except OSError as e:
+        sys.exit(f"popout-notepad: {e}")
+    print(f"exported {count} page(s) to {args.destination}")
+
+
+def attach_console():
+    """
+    The windowed build (popout-notepad.exe) starts without stdin and
+    stdout. Borrow the console of the shell it was started from, if any,
+    so output still shows up; popout-notepad-cli.exe is the one to use.
+    """
+    if sys.stdout is not None or os.name != "nt":
+        return
+    import ctypes
+    if ctypes.windll.kernel32.AttachConsole(-1):  # ATTACH_PARENT_PROCESS
+        sys.stdout = open("CONOUT$", "w")
+        sys.stderr = open("CONOUT$", "w")
+        sys.stdin = open("CONIN$", "r")
+    else:
+        sys.stdout = open(os.devnull, "w")
+        sys.stderr = open(os.devnull, "w")
+        sys.stdin = open(os.devnull, "r")
+
+
+def main(argv=None):
+    attach_console()
+    parser = argparse.ArgumentParser(prog="popout-notepad",
+                                     description="Read and add to Popout Notepad pages.")
+    parser.add_argument("--dir", help="folder holding the notes (default: current folder)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list pages with their titles (first lines)")
+    cat = commands.add_parser("cat", help="print a page")
+    cat.add_argument("page", type=int)
+    add = commands.add_parser("add", help="append a line to a page (from stdin without TEXT)")
+    target = add.add_mutually_exclusive_group()
+    target.add_argument("--page", type=int, help="page to add to (default: the open page)")
+    target.add_argument("--new", action="store_true", help="put the text on a new page")
+    add.add_argument("text", nargs="*")
+    import_ = commands.add_parser(
+        "import", help="add each file as a new page (folders and zip archives: their .md/.txt files)")
+    import_.add_argument("paths", nargs="+")
+    search = commands.add_parser("search", help="print matching lines as PAGE:LINE:TEXT")
+    search.add_argument("pattern", help="regular expression, case-insensitive")
+    search.add_argument("-s", "--case-sensitive", action="store_true")
+    export = commands.add_parser(
+        "export", help="write every page to DESTINATION/page-NNNN.md (an archive if it ends in .zip)")
+    export.add_argument("destination")
+    commands.add_parser("show", help="slide the running notepad out")
+    open_ = commands.add_parser("open", help="show a page in the running notepad")
+    open_.add_argument("page", type=int)
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        args.destination = os.path.abspath(args.destination)
+    if args.command == "import":
+        args.paths = [os.path.abspath(path) for path in args.paths]
+    if args.dir:
+        os.chdir(args.dir)
+    handlers = {"list": cmd_list, "cat": cmd_cat, "add": cmd_add, "import": cmd_import,
+                "search": cmd_search, "export": cmd_export, "show": cmd_show, "open": cmd_open}
+    try:
+        return handlers[args.command](args) or 0
+    except PageReadError as e:
+        sys.exit(f"popout-notepad: {e}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Line-based syntax highlighting for Popout Notepad.
+
+A lexer turns one line plus the state left by the previous line into
+(start, end, tag) tokens and the state for the next line. LineStates keeps
+those end-of-line states per page so edits only re-lex from the edited line
+until the states line up with what was there before.
+
+NotepadApp turns the tokens into Text tags.
+"""
+import keyword
+import re
+
+# Tags a lexer may emit; NotepadApp gives each one a style.
+TAGS = ("heading", "list", "checkbox", "quote", "fence", "code", "inline_code",
+        "strong", "emph", "link", "keyword", "string", "comment", "number", "variable")
+
+
+class Lexer:
+    """
+    Base class: plain text, no tokens. States must be hashable, comparable
+    with == and never None.
+    """
+
+    initial_state = ()
+
+    def lex_line(self, text, state):
+        return [], state
+
+
+class PythonLexer(Lexer):
+    _TOKEN_RE = re.compile(r"""
+        (?P<comment>\#.*)
+      | (?P<triple>[rRbBuUfF]{0,2}(?:'''|\"\"\"))
+      | (?P<string>[rRbBuUfF]{0,2}(?:'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*"))
+      | (?P<number>\b\d[\d_]*(?:\.\d*)?(?:[eE][+-]?\d+)?j?\b)
+      | (?P<word>\b[A-Za-z_]\w*\b)
+    """, re.VERBOSE)
+    _KEYWORDS = frozenset(keyword.kwlist)
+
+    def lex_line(self, text, state):
+        tokens = []
+        pos = 0
+        if state:
+            # Inside a triple-quoted string opened on an earlier line.
+            end = text.find(state[0])
+            if end < 0:
+                return [(0, len(text), "string")], state
+            pos = end + 3
+            tokens.append((0, pos, "string"))
+            state = ()
+        for match in self._TOKEN_RE.finditer(text, pos):
+            kind = match.lastgroup
+            if kind == "triple":
+                quote = match.group()[-3:]
+                end = text.find(quote, match.end())
+                if end < 0:
+                    tokens.append((match.start(), len(text), "string"))
+                    return tokens, (quote,)
+                # Closed on the same line: tag it and keep scanning after it.
+                tokens.append((match.start(), end + 3, "string"))
+                return self._continue(text, end + 3, tokens)
+            if kind == "word":
+                if match.group() in self._KEYWORDS:
+                    tokens.append((match.start(), match.end(), "keyword"))
+            else:
+                tokens.append((match.start(), match.end(), kind))
+        return tokens, ()
+
+    def _continue(self, text, pos, tokens):
+        rest, state = self.lex_line(text[pos:], ())
+        tokens.extend((start + pos, end + pos, tag) for start, end, tag in rest)
+        return tokens, state
+
+
+class ShellLexer(Lexer):
+    _TOKEN_RE = re.compile(r"""
+        (?P<comment>(?:^|(?<=\s))\#.*)
+      | (?P<string>'[^']*'|"(?:\\.|[^"\\])*")
+      | (?P<variable>\$(?:\{[^}]*\}|\w+|[@*#?$!-]))
+      | (?P<word>\b[A-Za-z_][\w-]*\b)
+    """, re.VERBOSE)
+    _KEYWORDS = frozenset("""if then else elif fi for while until do done case esac
+        in function return export local sudo""".split())
+
+    def lex_line(self, text, state):
+        tokens = []
+        for match in self._TOKEN_RE.finditer(text):
+            kind = match.lastgroup
+            if kind == "word":
+                if match.group() in self._KEYWORDS:
+                    tokens.append((match.start(), match.end(), "keyword"))
+            else:
+                tokens.append((match.start(), match.end(), kind))
+        return tokens, state
+
+
+class MarkdownLexer(Lexer):
+    """
+    Headings, lists and checkboxes, quotes, inline code, emphasis, links
+    and fenced code blocks. A fence's info string picks a lexer from
+    LEXERS for the block's contents.
+    """
+
+    _FENCE_RE = re.compile(r"^\s{0,3}(```+|~~~+)\s*([\w+#.-]*)")
+    _HEADING_RE = re.compile(r"^\s{0,3}#{1,6}(\s|$)")
+    _LIST_RE = re.compile(r"^\s*([-*+]|\d+[.)])\s+(\[[ xX]\]\s)?")
+    _QUOTE_RE = re.compile(r"^\s{0,3}>")
+    _INLINE_RE = re.compile(r"""
+        (?P<inline_code>`[^`]+`)
+      | (?P<strong>\*\*[^*\s](?:[^*]*[^*\s])?\*\*|__[^_\s](?:[^_]*[^_\s])?__)
+      | (?P<emph>\*[^*\s](?:[^*]*[^*\s])?\*|\b_[^_\s](?:[^_]*[^_\s])?_\b)
+      | (?P<link>\[[^\]]+\]\([^)\s]+\)|https?://\S+)
+    """, re.VERBOSE)
+
+    def lex_line(self, text, state):
+        if state:
+            marker, language, inner = state
+            if text.strip().startswith(marker) and not text.strip().strip(marker[0]):
+                return [(0, len(text), "fence")], ()
+            lexer = LEXERS.get(language)
+            if lexer is None or lexer is self:
+                return [(0, len(text), "code")], state
+            tokens, inner = lexer.lex_line(text, inner)
+            return [(0, len(text), "code")] + tokens, (marker, language, inner)
+        fence = self._FENCE_RE.match(text)
+        if fence:
+            language = fence.group(2).lower()
+            lexer = LEXERS.get(language)
+            inner = lexer.initial_state if lexer is not None else ()
+            return [(0, len(text), "fence")], (fence.group(1), language, inner)
+        if self._HEADING_RE.match(text):
+            return [(0, len(text), "heading")], ()
+        tokens = []
+        item = self._LIST_RE.match(text)
+        if item:
+            tokens.append((item.start(1), item.end(1), "list"))
+            if item.group(2):
+                tokens.append((item.start(2), item.start(2) + 3, "checkbox"))
+        elif self._QUOTE_RE.match(text):
+            tokens.append((0, len(text), "quote"))
+        for match in self._INLINE_RE.finditer(text):
+            tokens.append((match.start(), match.end(), match.lastgroup))
+        return tokens, ()
+
+
+# Lexers by name; fenced code blocks look up their info string here. Add
+# more with register_lexer.
+LEXERS = {}
+
+
+def register_lexer(lexer, *names):
+    for name in names:
+        LEXERS[name] = lexer
+
+
+register_lexer(MarkdownLexer(), "markdown", "md")
+register_lexer(PythonLexer(), "python", "py")
+register_lexer(ShellLexer(), "shell", "sh", "bash", "console")
+
+
+class LineStates:
+    """
+    End-of-line lexer states of one page, for incremental re-lexing.
+
+    Edits splice the list (lines are numbered from 1 as in Tk) and mark the
+    edited lines unknown. next_line() is the first line that needs lexing;
+    after lexing it, store() records its end state and reports whether the
+    following lines are still valid, i.e. the state came out the same as
+    before the edit.
+    """
+
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self._states = []
+        self._dirty_from = 1
+
+    def reset(self):
+        self._states = []
+        self._dirty_from = 1
+
+    def next_line(self):
+        """
+        First line to lex, or None if everything is up to date.
+        """
+        return self._dirty_from
+
+    def state_before(self, line):
+        return self._states[line - 2] if line > 1 else self.lexer.initial_state
+
+    def lexed_lines(self):
+        return len(self._states)
+
+    def edit(self, line, removed, added):
+        """
+        Records that starting at line, removed following lines were joined
+        into it and then added new lines were split off it.
+        """
+        if self._dirty_from is not None and self._dirty_from <= len(self._states):
+            # Re-lexing stopped partway; keep that spot marked so it is
+            # picked up again after the earlier lines converge.
+            self._states[self._dirty_from - 1] = None
+        if line <= len(self._states):
+            del self._states[line:line + removed]
+            self._states[line - 1:line] = [None] * (added + 1)
+        if self._dirty_from is None or line < self._dirty_from:
+            self._dirty_from = line
+
+    def store(self, line, state, last_line):
+        """
+        Records the end state of line, which must be next_line(). Returns
+        True once nothing more needs lexing.
+        """
+        previous = self._states[line - 1] if line <= len(self._states) else None
+        if line <= len(self._states):
+            self._states[line - 1] = state
+        else:
+            self._states.append(state)
+        if line >= last_line:
+            del self._states[line:]
+            self._dirty_from = None
+        elif previous is not None and previous == state and line < len(self._states):
+            # Unchanged state: the following lines are as they were, up to
+            # the next line that is still unknown or was never lexed.
+            try:
+                unknown = self._states.index(None, line) + 1
+            except ValueError:
+                unknown = len(self._states) + 1
+            self._dirty_from = unknown if unknown <= last_line else None
+        else:
+            self._dirty_from = line + 1
+        return self._dirty_from is None
@@ -0,0 +1,275 @@
+"""
+In-memory indexes over the notebook's pages for Popout Notepad: full-text
+search, page titles and fuzzy matching on them, and word completion.
+"""
+import bisect
+import heapq
+import re
+import sys
+from collections import Counter, OrderedDict
+
+_WORD_RE = re.compile(r"\w+")
+# Words for completion also take in dots, @ and dashes between letters, so
+# host names, addresses and ticket ids complete as one.
+_COMPLETION_RE = re.compile(r"\w[\w.@-]*\w")
+_COMPLETION_CHAR_RE = re.compile(r"[\w.@-]")
+_COMPLETION_RUN_RE = re.compile(r"[\w.@-]*")
+_COMPLETION_PREFIX_RE = re.compile(r"\w[\w.@-]*\Z")
+
+
+def tokenize(text):
+    """
+    Returns the lower-cased words of text.
+    """
+    return _WORD_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    Inverted index from word to the ids of the pages containing it.
+
+    Pages are added, replaced and removed one at a time so the index never
+    has to be rebuilt. Queries match whole words, case-insensitively; every
+    word of the query has to be on the page.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        # Words per page, so replacing a page only touches what changed.
+        self._page_words = {}
+
+    def __len__(self):
+        return len(self._page_words)
+
+    def __contains__(self, page_id):
+        return page_id in self._page_words
+
+    def update_page(self, page_id, text):
+        # Interned, so postings keys and per-page tuples share one string.
+        new_words = {sys.intern(word) for word in set(tokenize(text))}
+        old_words = set(self._page_words.get(page_id, ()))
+        for word in old_words - new_words:
+            pages = self._postings[word]
+            pages.discard(page_id)
+            if not pages:
+                del self._postings[word]
+        for word in new_words - old_words:
+            self._postings.setdefault(word, set()).add(page_id)
+        self._page_words[page_id] = tuple(new_words)
+
+    def remove_page(self, page_id):
+        for word in self._page_words.pop(page_id, ()):
+            pages = self._postings[word]
+            pages.discard(page_id)
+            if not pages:
+                del self._postings[word]
+
+    def search(self, query):
+        """
+        Returns the set of page ids containing every word of query.
+        """
+        words = set(tokenize(query))
+        if not words:
+            return set()
+        # Intersect starting from the rarest word.
+        postings = sorted((self._postings.get(word, set()) for word in words), key=len)
+        result = set(postings[0])
+        for pages in postings[1:]:
+            result &= pages
+            if not result:
+                break
+        return result
+
+
+def completion_prefix(line):
+    """
+    Returns the part of a word to complete at the end of line (the text
+    before the cursor), or "" if the cursor is not right after one.
+    """
+    match = _COMPLETION_PREFIX_RE.search(line)
+    return match.group() if match else ""
+
+
+class CompletionIndex:
+    """
+    How often each word is used across all pages, for completing words as
+    they are typed.
+
+    Words are kept case-folded in a sorted list, a flattened trie: the
+    words starting with a prefix are one slice of it, found by bisection,
+    and the most used ones in that slice are cached per prefix until a
+    word in it changes. Pages are counted in with add_text() and kept
+    current with apply_edit(), which only looks at the words around the
+    edit, so nothing is ever rebuilt and no per-page word lists are kept.
+
+    Memory is bounded by max_words: once that many words are known, new
+    ones are left out until others drop out. usage() reports the size.
+    """
+
+    min_chars = 4
+    max_chars = 64
+    min_prefix = 2
+
+    def __init__(self, max_words=100000, cache_prefixes=2048, cache_top=8):
+        self.max_words = max_words
+        self.cache_prefixes = cache_prefixes
+        self.cache_top = cache_top
+        self._counts = {}
+        self._sorted = []
+        # Spelling as last written, for words not all in lower case.
+        self._forms = {}
+        self._cache = OrderedDict()
+        self._string_bytes = 0
+
+    def __len__(self):
+        return len(self._counts)
+
+    def add_text(self, text):
+        self._count(_COMPLETION_RE.findall(text), 1)
+
+    def remove_text(self, text):
+        self._count(_COMPLETION_RE.findall(text), -1)
+
+    def apply_edit(self, old, at, deleted, inserted):
+        """
+        Updates the counts for an edit of a page whose text was old, given
+        as notepad_store.diff_edit returns it: deleted characters removed
+        at offset at and inserted put there. Only the words touching the
+        edited span are counted out and in again.
+        """
+        # Widen the span to whole words; the text outside it is the same
+        # before and after.
+        start = at
+        while start > 0 and _COMPLETION_CHAR_RE.match(old, start - 1):
+            start -= 1
+        end = at + deleted
+        tail = _COMPLETION_RUN_RE.match(old, end).end()
+        self._count(_COMPLETION_RE.findall(old, start, tail), -1)
+        self._count(_COMPLETION_RE.findall(old[start:at] + inserted + old[end:tail]), 1)
+
+    def complete(self, prefix, limit=1):
+        """
+        Returns up to limit words starting with prefix (case-insensitive),
+        most used first, not counting prefix itself.
+        """
+        key = prefix.lower()
+        if len(key) < self.min_prefix:
+            return []
+        top = self._cache.get(key)
+        if top is None:
+            low = bisect.bisect_left(self._sorted, key)
+            high = bisect.bisect_left(self._sorted, key[:-1] + chr(ord(key[-1]) + 1), low)
+            candidates = (self._sorted[i] for i in range(low, high) if self._sorted[i] != key)
+            top = heapq.nlargest(self.cache_top, candidates, key=self._counts.__getitem__)
+            self._cache[key] = top
+            if len(self._cache) > self.cache_prefixes:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return [self._forms.get(word, word) for word in top[:limit]]
+
+    def usage(self):
+        """
+        Returns the number of words and an estimate of the bytes used.
+        """
+        containers = (sys.getsizeof(self._counts) + sys.getsizeof(self._sorted)
+                      + sys.getsizeof(self._forms) + sys.getsizeof(self._cache)
+                      + len(self._cache) * (sys.getsizeof([]) + 8 * self.cache_top))
+        return {"words": len(self._counts), "bytes": containers + self._string_bytes}
+
+    def _count(self, words, sign):
+        for word, n in Counter(words).items():
+            if not self.min_chars <= len(word) <= self.max_chars:
+                continue
+            key = word.lower()
+            count = self._counts.get(key, 0) + sign * n
+            if count > 0:
+                if key not in self._counts:
+                    if len(self._counts) >= self.max_words:
+                        continue
+                    key = sys.intern(key)
+                    bisect.insort(self._sorted, key)
+                    self._string_bytes += sys.getsizeof(key)
+                self._counts[key] = count
+                if sign > 0:
+                    previous = self._forms.pop(key, None)
+                    if previous is not None:
+                        self._string_bytes -= sys.getsizeof(previous)
+                    if word != key:
+                        self._forms[key] = word
+                        self._string_bytes += sys.getsizeof(word)
+            elif key in self._counts:
+                del self._counts[key]
+                del self._sorted[bisect.bisect_left(self._sorted, key)]
+                self._string_bytes -= sys.getsizeof(key)
+                form = self._forms.pop(key, None)
+                if form is not None:
+                    self._string_bytes -= sys.getsizeof(form)
+            else:
+                continue  # never counted, e.g. left out while full
+            if self._cache:
+                for length in range(self.min_prefix, len(key) + 1):
+                    self._cache.pop(key[:length], None)
+
+
+def page_title(text, width=80):
+    """
+    Returns the first non-blank line of text, without Markdown heading
+    marks, cut to width characters. Only reads as far as that line.
+    """
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start)
+        if end < 0:
+            end = len(text)
+        line = text[start:min(end, start + 4 * width)].strip().lstrip("#").strip()
+        if line:
+            return line[:width]
+        start = end + 1
+    return ""
+
+
+def fuzzy_score(query, text):
+    """
+    Scores text against query, both lower-cased, if the characters of
+    query appear in text in order; returns None otherwise. Higher is
+    better: characters that follow each other or start a word count
+    extra, and so does matching early.
+    """
+    score = 0
+    position = 0
+    previous = -2
+    for char in query:
+        found = text.find(char, position)
+        if found < 0:
+            return None
+        if found == previous + 1:
+            score += 3
+        if found == 0 or not text[found - 1].isalnum():
+            score += 2
+        score += 1
+        previous = found
+        position = found + 1
+    return score - text.find(query[0]) * 0.01 if query else 0
+
+
+def fuzzy_filter(query, titles):
+    """
+    Returns the positions of titles matching query, best match first and
+    in page order among equals. A query that is a number also matches
+    that page (counting from 1), which comes first.
+    """
+    query = query.strip().lower()
+    if not query:
+        return list(range(len(titles)))
+    scored = []
+    for position, title in enumerate(titles):
+        score = fuzzy_score(query, title.lower())
+        if score is not None:
+            scored.append((-score, position))
+    scored.sort()
+    matches = [position for _, position in scored]
+    if query.isdigit() and 1 <= int(query) <= len(titles):
+        page = int(query) - 1
+        matches = [page] + [position for position in matches if position != page]
+    return matches
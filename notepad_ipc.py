@@ -0,0 +1,305 @@
+"""
+Command channel to a running Popout Notepad panel.
+
+The first panel on a notes folder listens on a local socket; relaunches
+and the command line (see notepad_cli) hand their request to it and exit
+instead of starting a second panel. Requests are JSON objects, one per
+line, each answered with one line once the panel has queued it:
+
+    {"cmd": "show"}
+    {"cmd": "open", "page": 3}                     (pages count from 1)
+    {"cmd": "append", "text": "...", "page": 3}    (no page: the open one)
+    {"cmd": "append", "text": "...", "new": true}
+    {"cmd": "import", "pages": ["...", "..."]}
+
+NotepadApp waits on CommandServer.fileno() and applies what commands()
+returns.
+"""
+import errno
+import json
+import os
+import queue
+import secrets
+import socket
+import sys
+import threading
+
+from notepad_store import atomic_write_json
+
+SOCKET_FILE = "popout_notepad.sock"
+PORT_FILE = "popout_notepad.port"
+
+
+class UnixSocketTransport:
+    """
+    A Unix domain socket file in the notes folder. Only the owner of the
+    folder can reach it, so no token is needed.
+    """
+
+    token = None
+
+    def __init__(self, path=SOCKET_FILE):
+        # Kept relative: socket paths are limited to about 100 bytes.
+        self.path = path
+        self._inode = None
+
+    def listen(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            try:
+                sock.bind(self.path)
+            except OSError as e:
+                if e.errno != errno.EADDRINUSE or self._answers():
+                    raise
+                # Left behind by a panel that crashed.
+                os.remove(self.path)
+                sock.bind(self.path)
+            sock.listen(16)
+        except OSError:
+            sock.close()
+            raise
+        self._inode = os.stat(self.path).st_ino
+        return sock
+
+    def connect(self, timeout):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def cleanup(self):
+        # Only remove the socket file if it is still ours.
+        try:
+            if os.stat(self.path).st_ino == self._inode:
+                os.remove(self.path)
+        except OSError:
+            pass
+
+    def _answers(self):
+        try:
+            self.connect(0.5).close()
+            return True
+        except OSError:
+            return False
+
+
+class LoopbackTransport:
+    """
+    TCP on 127.0.0.1, for systems without Unix sockets. The port and a
+    random token are written to PORT_FILE in the notes folder; requests
+    without the token are refused, since any local user can connect.
+    """
+
+    def __init__(self, path=PORT_FILE):
+        self.path = path
+        self.token = None
+
+    def listen(self):
+        if self._answers():
+            raise OSError(errno.EADDRINUSE, "another panel is listening")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.bind(("127.0.0.1", 0))
+            sock.listen(16)
+            self.token = secrets.token_hex(16)
+            atomic_write_json(self.path, {"port": sock.getsockname()[1], "token": self.token})
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def connect(self, timeout):
+        with open(self.path, "r") as f:
+            info = json.load(f)
+        self.token = info["token"]
+        return socket.create_connection(("127.0.0.1", info["port"]), timeout)
+
+    def cleanup(self):
+        try:
+            with open(self.path, "r") as f:
+                if json.load(f).get("token") == self.token:
+                    os.remove(self.path)
+        except (OSError, ValueError):
+            pass
+
+    def _answers(self):
+        try:
+            self.connect(0.5).close()
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+
+def default_transport():
+    if hasattr(socket, "AF_UNIX") and sys.platform != "win32":
+        return UnixSocketTransport()
+    return LoopbackTransport()
+
+
+def check_command(request, page_count=None):
+    """
+    Returns why request is not a valid command, or None if it is. With
+    page_count given, page numbers past it are refused too.
+    """
+    cmd = request.get("cmd") if isinstance(request, dict) else None
+    page = request.get("page") if isinstance(request, dict) else None
+    if cmd == "show":
+        return None
+    if cmd == "open":
+        if not isinstance(page, int):
+            return "open needs a page number"
+        return check_page(page, page_count)
+    if cmd == "append":
+        if not isinstance(request.get("text"), str):
+            return "append needs text"
+        if page is None or request.get("new"):
+            return None
+        return check_page(page, page_count) if isinstance(page, int) else "page must be a number"
+    if cmd == "import":
+        pages = request.get("pages")
+        if isinstance(pages, list) and all(isinstance(p, str) for p in pages):
+            return None
+        return "import needs a list of page texts"
+    return f"unknown command: {cmd!r}"
+
+
+def check_page(page, page_count):
+    if page_count is not None and not 1 <= page <= page_count:
+        return f"no page {page} (there are {page_count})"
+    return None
+
+
+class CommandServer:
+    """
+    Accepts connections on a background thread and queues the commands
+    they send. Whenever commands arrive, fileno() becomes readable (None
+    on Windows, where the event loop cannot wait on sockets: poll
+    commands() instead); commands() returns everything queued so far.
+
+    page_count, if given, is called (on the server thread) for the number
+    of pages, so commands naming a page that does not exist are refused
+    with an error instead of being queued.
+
+    Raises OSError if the transport cannot listen, e.g. because another
+    panel already does.
+    """
+
+    def __init__(self, transport=None, page_count=None):
+        self.transport = transport or default_transport()
+        self.page_count = page_count
+        self._listener = self.transport.listen()
+        self._queue = queue.Queue()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._closed = False
+        self._thread = threading.Thread(target=self._serve, name="command-server", daemon=True)
+        self._thread.start()
+
+    def fileno(self):
+        return None if sys.platform == "win32" else self._wake_r.fileno()
+
+    def commands(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except OSError:
+            pass  # drained
+        commands = []
+        while True:
+            try:
+                commands.append(self._queue.get_nowait())
+            except queue.Empty:
+                return commands
+
+    def close(self):
+        self._closed = True
+        try:
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._listener.close()
+        self.transport.cleanup()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def _serve(self):
+        while not self._closed:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                if self._closed:
+                    return
+                continue
+            threading.Thread(target=self._handle, args=(conn,), name="command-client",
+                             daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            conn.settimeout(10)
+            try:
+                stream = conn.makefile("rwb")
+                for line in stream:
+                    stream.write(json.dumps(self._accept(line)).encode() + b"\n")
+                    stream.flush()
+            except OSError:
+                pass  # client went away
+
+    def _accept(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"ok": False, "error": "not JSON"}
+        if self.transport.token is not None and (
+                not isinstance(request, dict) or request.get("token") != self.transport.token):
+            return {"ok": False, "error": "bad token"}
+        error = check_command(request, self.page_count() if self.page_count else None)
+        if error is not None:
+            return {"ok": False, "error": error}
+        request.pop("token", None)
+        self._queue.put(request)
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass  # already has a wake-up pending
+        return {"ok": True}
+
+
+class CommandError(Exception):
+    pass
+
+
+def send_commands(commands, transport=None, timeout=5.0):
+    """
+    Hands commands to the panel running on the notes in the current folder
+    and waits until it has queued them. Returns False, having sent
+    nothing, if no panel is listening; raises CommandError if the panel
+    refused a command.
+    """
+    transport = transport or default_transport()
+    try:
+        sock = transport.connect(timeout)
+    except (OSError, ValueError, KeyError):
+        return False
+    with sock:
+        stream = sock.makefile("rwb")
+        for command in commands:
+            if transport.token is not None:
+                command = dict(command, token=transport.token)
+            stream.write(json.dumps(command).encode() + b"\n")
+        stream.flush()
+        for _ in commands:
+            try:
+                line = stream.readline()
+            except OSError as e:
+                raise CommandError(f"no answer from the panel: {e}")
+            if not line:
+                raise CommandError("the panel closed the connection")
+            reply = json.loads(line)
+            if not reply.get("ok"):
+                raise CommandError(reply.get("error", "refused"))
+    return True
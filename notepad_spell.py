@@ -0,0 +1,306 @@
+"""
+Spell checking for Popout Notepad, off the Tk thread.
+
+Words are looked up in a dictionary compiled once from the system word
+lists (/usr/share/dict/words and the like) plus popout_notepad_words.txt
+in the notes folder, which is where your own words go, one per line. The
+compiled file is a sorted list of lower-case words that is memory-mapped
+rather than loaded, so a lookup is a binary search over the mapped bytes
+and costs neither startup time nor memory. Nothing is fetched from the
+network; without a word list spell checking is simply not available.
+
+SpellChecker does the lookups on a worker thread; SpellLines tracks which
+lines of a page still need checking while it is edited.
+"""
+import mmap
+import os
+import queue
+import re
+import tempfile
+import threading
+
+DICTIONARY_FILE = "popout_notepad_dictionary.dat"
+PERSONAL_WORDS_FILE = "popout_notepad_words.txt"
+SYSTEM_WORD_LISTS = ("/usr/share/dict/words", "/usr/share/dict/american-english",
+                     "/usr/share/dict/british-english")
+
+# Words of letters with inner apostrophes; anything glued to digits,
+# underscores, slashes, dots or @ (paths, URLs, identifiers) is left alone.
+_WORD_RE = re.compile(r"(?<![\w/@.-])[^\W\d_]+(?:['’][^\W\d_]+)*(?![\w/@-]|\.\w|:/)")
+
+
+def word_list_sources():
+    """
+    Returns the word lists the dictionary is compiled from that exist.
+    """
+    return [path for path in (PERSONAL_WORDS_FILE,) + SYSTEM_WORD_LISTS if os.path.isfile(path)]
+
+
+def spell_check_available():
+    return bool(word_list_sources()) or os.path.isfile(DICTIONARY_FILE)
+
+
+class WordList:
+    """
+    A compiled dictionary: unique lower-case UTF-8 words, one per line,
+    sorted by bytes, memory-mapped.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @staticmethod
+    def compile(sources, path):
+        """
+        Writes the dictionary for the word lists at sources to path.
+        """
+        words = set()
+        for source in sources:
+            with open(source, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    word = line.strip().lower().replace("’", "'")
+                    if word and not word.startswith("#"):
+                        words.add(word.encode("utf-8"))
+        directory = os.path.dirname(path) or "."
+        fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for word in sorted(words):
+                    f.write(word + b"\n")
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def __contains__(self, word):
+        key = word.encode("utf-8")
+        data = self._data
+        low, high = 0, len(data)
+        # low and high always sit at the start of a line.
+        while low < high:
+            middle = (low + high) // 2
+            start = data.rfind(b"\n", 0, middle) + 1
+            end = data.find(b"\n", start)
+            line = data[start:end]
+            if line == key:
+                return True
+            if line < key:
+                low = end + 1
+            else:
+                high = start
+        return False
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+def open_dictionary(path=DICTIONARY_FILE):
+    """
+    Returns the WordList at path, compiling it first if it is missing or
+    older than one of the word lists. Raises OSError if there is none.
+    """
+    sources = word_list_sources()
+    try:
+        built = os.path.getmtime(path)
+    except OSError:
+        built = None
+    if sources and (built is None or any(os.path.getmtime(s) > built for s in sources)):
+        WordList.compile(sources, path)
+    elif built is None:
+        raise FileNotFoundError("no word list found (see popout_notepad_words.txt)")
+    return WordList(path)
+
+
+def word_variants(word):
+    """
+    The spellings to look up for a word as written, most likely first.
+    """
+    word = word.replace("’", "'")
+    lower = word.lower()
+    yield lower
+    if lower.endswith("'s"):
+        yield lower[:-2]
+
+
+def skip_word(word):
+    # Single letters, acronyms and camelCase identifiers.
+    return len(word) < 2 or word.isupper() or any(c.isupper() for c in word[1:])
+
+
+class SpellChecker:
+    """
+    Checks lines on a worker thread, started with the first request.
+
+    submit(key, version, lines) queues [(line number, text), ...] of one
+    page; results() returns the finished ones as (key, version, checked)
+    with checked a list of (line number, [(start, end), ...]) holding the
+    columns of misspelled words, or None if no dictionary could be opened.
+    """
+
+    cache_words = 50000
+
+    def __init__(self, dictionary=DICTIONARY_FILE):
+        self.dictionary = dictionary
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._thread = None
+        self._words = None
+        self._known = {}
+
+    def submit(self, key, version, lines):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="spell-checker", daemon=True)
+            self._thread.start()
+        self._jobs.put((key, version, lines))
+
+    def results(self):
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def close(self):
+        if self._thread is not None:
+            self._jobs.put(None)
+
+    def misspelled(self, text):
+        """
+        Returns (start, end) columns of the words in text not in the
+        dictionary.
+        """
+        found = []
+        for match in _WORD_RE.finditer(text):
+            word = match.group()
+            if not skip_word(word) and not self.known(word):
+                found.append((match.start(), match.end()))
+        return found
+
+    def known(self, word):
+        known = self._known.get(word)
+        if known is None:
+            known = any(variant in self._words for variant in word_variants(word))
+            if len(self._known) >= self.cache_words:
+                self._known.clear()
+            self._known[word] = known
+        return known
+
+    def _run(self):
+        try:
+            self._words = open_dictionary(self.dictionary)
+        except OSError:
+            self._words = None
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            key, version, lines = job
+            if self._words is None:
+                self._results.put((key, version, None))
+                continue
+            self._results.put((key, version, [(number, self.misspelled(text))
+                                              for number, text in lines]))
+        if self._words is not None:
+            self._words.close()
+
+
+class SpellLines:
+    """
+    Which lines of one page still need checking. Lines are numbered from 1
+    as in Tk.
+
+    Edited lines are queued (dirty) as the edits happen and the rest of the
+    page is swept once in order. Every edit bumps version; current_line()
+    maps a line number from an older version to where that line is now,
+    so results that arrive after further typing still land in the right
+    place.
+    """
+
+    max_edits = 256
+    # Edits adding more lines than this send the sweep back instead.
+    max_dirty_lines = 500
+
+    def __init__(self):
+        self.version = 0
+        self.reset()
+
+    def reset(self):
+        self.version += 1
+        self.dirty = set()
+        self.sweep = 1
+        self._edits = []
+        self._edits_from = self._reset_at = self.version
+        self._view = None
+
+    def edit(self, line, removed, added):
+        """
+        Records that starting at line, removed following lines were joined
+        into it and then added new lines were split off it.
+        """
+        self.version += 1
+        self._edits.append((line, removed, added))
+        if len(self._edits) > self.max_edits:
+            del self._edits[:len(self._edits) - self.max_edits]
+            self._edits_from = self.version - self.max_edits
+        delta = added - removed
+        self.dirty = {n if n < line else n + delta for n in self.dirty
+                      if not line <= n <= line + removed}
+        if self.sweep > line + removed:
+            self.sweep += delta
+        elif self.sweep > line:
+            self.sweep = line + added + 1
+        if added < self.max_dirty_lines:
+            self.dirty.update(range(line, line + added + 1))
+        else:
+            self.sweep = min(self.sweep, line)
+
+    def current_line(self, line, version):
+        """
+        Where line of the given version is now, or None if it has been
+        edited since (it is dirty again then).
+        """
+        if version < self._edits_from:
+            if version >= self._reset_at:
+                # Too many edits ago to say where the line went; look at
+                # the whole page again.
+                self.sweep = 1
+            return None
+        for edit_line, removed, added in self._edits[len(self._edits) - (self.version - version):]:
+            if line < edit_line:
+                continue
+            if line <= edit_line + removed:
+                return None
+            line += added - removed
+        return line
+
+    def take(self, first, last, last_line, limit):
+        """
+        Returns up to limit lines to check next, and counts them as done:
+        edited lines on screen (first to last), other edited lines, lines
+        on screen the sweep has not reached yet, then the sweep.
+        """
+        if self._view != (first, last):
+            # Checked again when the sweep gets there; that is cheap.
+            self._view = (first, last)
+            self.dirty.update(range(max(first, self.sweep), min(last, last_line) + 1))
+        lines = sorted(self.dirty, key=lambda n: (not first <= n <= last, n))
+        lines = [n for n in lines if n <= last_line][:limit]
+        self.dirty.difference_update(lines)
+        self.dirty = {n for n in self.dirty if n <= last_line}
+        taken = set(lines)
+        while len(lines) < limit and self.sweep <= last_line:
+            if self.sweep not in taken:
+                lines.append(self.sweep)
+            self.sweep += 1
+        return lines
+
+    def done(self, last_line):
+        return not self.dirty and self.sweep > last_line
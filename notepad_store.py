@@ -0,0 +1,1003 @@
+"""
+Persistence helpers for Popout Notepad.
+
+Kept free of any tkinter / pyautogui imports so the storage code can be
+used on its own. The same goes for every notepad_* module: Tk code lives
+in Popout-Notepad.py only, so the command line (notepad_cli) and the
+benchmarks can use the rest without a display.
+"""
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from notepad_index import page_title
+
+
+def atomic_write_json(path, data):
+    """
+    Writes data as JSON to path through a temporary file in the same
+    directory followed by an atomic rename, so a crash mid-write can never
+    leave a truncated file behind.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _common_prefix_len(a, b):
+    """
+    Length of the common prefix of two strings. Compares in blocks so the
+    work stays in C even for multi-megabyte pages.
+    """
+    limit = min(len(a), len(b))
+    block = 4096
+    i = 0
+    while i < limit and a[i:i + block] == b[i:i + block]:
+        i += block
+    i = min(i, limit)
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _common_suffix_len(a, b, limit):
+    """
+    Length of the common suffix of two strings, capped at limit.
+    """
+    block = 4096
+    n = 0
+    while n < limit:
+        step = min(block, limit - n)
+        if a[len(a) - n - step:len(a) - n] != b[len(b) - n - step:len(b) - n]:
+            break
+        n += step
+    while n < limit and a[len(a) - n - 1] == b[len(b) - n - 1]:
+        n += 1
+    return n
+
+
+def diff_edit(old, new):
+    """
+    Returns (offset, deleted_length, inserted_text) describing the single
+    contiguous change that turns old into new, or None if they are equal.
+    """
+    if old == new:
+        return None
+    start = _common_prefix_len(old, new)
+    # The suffix may not overlap the prefix.
+    suffix = _common_suffix_len(old, new, min(len(old), len(new)) - start)
+    return start, len(old) - start - suffix, new[start:len(new) - suffix]
+
+
+_LOCK_OFFSET = 2 ** 40
+
+
+def _lock_file(f):
+    """
+    Takes a non-blocking exclusive lock on an open file. Returns False if
+    another process holds it.
+    """
+    try:
+        if os.name == "nt":
+            import msvcrt
+            # Windows locks are mandatory, so lock a byte far past the end
+            # rather than any content, leaving the file readable to others.
+            position = f.tell()
+            f.seek(_LOCK_OFFSET)
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            finally:
+                f.seek(position)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+@contextmanager
+def store_lock(directory):
+    """
+    Holds the lock of a page store directory, shared by every process
+    using it, waiting for it if need be. Writing blobs together with the
+    header and manifest that refer to them happens under it, and so does
+    garbage collection, which could otherwise delete blobs another
+    instance has written but not referred to yet.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "a+") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    # Gives up after 10 s of retrying; keep waiting.
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class PageReadError(OSError):
+    """
+    A page body could not be read (e.g. its blob is missing). Raised
+    rather than returning an empty page, which would then be saved over
+    the note.
+    """
+
+
+class EditJournal:
+    """
+    Append-only log of page edits kept next to the config snapshot.
+
+    Every record carries a monotonically increasing "seq". The snapshot
+    stores the last seq it already contains, so replaying the journal after
+    a crash between "snapshot written" and "journal truncated" never applies
+    an edit twice.
+
+    Each running instance appends to its own journal and holds a lock on
+    it, so a journal that can be locked (see adopt()) was left behind by an
+    instance that is gone.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0
+        self._file = None
+
+    def read(self):
+        """
+        Returns all readable records. Torn lines left by a crash mid-append
+        are skipped.
+        """
+        if self._file is not None and self._file.readable():
+            # Adopted journal: read through the locked handle.
+            self._file.seek(0)
+            lines = self._file.read().splitlines()
+        elif os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                lines = f.read().splitlines()
+        else:
+            lines = []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    def adopt(self):
+        """
+        Opens and locks a journal of another instance. Returns False if that
+        instance is still running (or the journal is gone).
+        """
+        try:
+            self._file = open(self.path, "r+")
+        except OSError:
+            return False
+        if not _lock_file(self._file):
+            self.close()
+            return False
+        return True
+
+    def replay(self, pages, after_seq):
+        """
+        Applies every record newer than after_seq to the PageStore in place
+        and advances self.seq past the last record seen. Returns the number
+        of records applied.
+        """
+        self.seq = max(self.seq, after_seq)
+        applied = 0
+        for record in self.read():
+            seq = record.get("seq", 0)
+            if seq <= after_seq:
+                continue
+            self.seq = max(self.seq, seq)
+            op = record.get("op")
+            page_id = record.get("id")
+            if page_id is not None:
+                # Pages may have moved since (e.g. merged from another
+                # instance), so records name them by id.
+                positions = pages.positions()
+                page = positions.get(page_id, -1)
+            else:
+                page = record.get("page", 0)
+            if op == "edit" and 0 <= page < len(pages):
+                try:
+                    text = pages[page]
+                except PageReadError:
+                    continue
+                at = record["at"]
+                pages[page] = text[:at] + record["ins"] + text[at + record["del"]:]
+            elif op == "add" and (page_id is None or page < 0):
+                pages.append("", page_id)
+            elif op == "delete" and 0 <= page < len(pages) and len(pages) > 1:
+                del pages[page]
+            else:
+                continue
+            applied += 1
+        return applied
+
+    def append(self, record):
+        """
+        Appends one record and flushes it to the OS straight away.
+        """
+        if self._file is None:
+            self._file = open(self.path, "a")
+            _lock_file(self._file)
+            # Never glue a record onto a torn line from an earlier crash.
+            if self._file.tell() > 0:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._file.write("\n")
+        self.seq += 1
+        record["seq"] = self.seq
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def reset(self):
+        """
+        Drops all records; called once a snapshot containing them is on disk.
+        The sequence counter keeps counting up.
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BlobStore:
+    """
+    Page bodies as zlib-compressed files named after a hash of their text,
+    under directory/blobs. Identical text is stored only once and a blob is
+    never changed after it has been written.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.join(directory, "blobs")
+
+    @staticmethod
+    def key(text):
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".z")
+
+    def get(self, key):
+        with open(self.path(key), "rb") as f:
+            return zlib.decompress(f.read()).decode("utf-8")
+
+    def put(self, key, text):
+        """
+        Stores text under key unless that blob already exists. Returns
+        whether anything was written.
+        """
+        path = self.path(key)
+        if os.path.exists(path):
+            return False
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(text.encode("utf-8"), 6))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return True
+
+    def size(self, key):
+        try:
+            return os.path.getsize(self.path(key))
+        except OSError:
+            return 0
+
+    def keys(self):
+        if not os.path.isdir(self.directory):
+            return
+        for prefix in os.listdir(self.directory):
+            subdir = os.path.join(self.directory, prefix)
+            if os.path.isdir(subdir):
+                for name in os.listdir(subdir):
+                    if name.endswith(".z"):
+                        yield name[:-2]
+
+    def remove(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+
+class PageHistory:
+    """
+    Version manifests: directory/versions.log gets one JSON line per save
+    with the save time and the blob of every page that save changed (None
+    for a deleted page). Earlier versions of a page are the blobs its id
+    points to in older lines.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "versions.log")
+
+    def record(self, changes, when=None):
+        if not changes:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        line = json.dumps({"time": when or time.time(), "pages": changes})
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+
+    def read(self):
+        """
+        Returns every readable manifest, oldest first.
+        """
+        manifests = []
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        manifests.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return manifests
+
+    def versions(self, page_id):
+        """
+        Returns (time, blob key) for each saved version of a page, newest
+        first.
+        """
+        versions = []
+        for manifest in reversed(self.read()):
+            key = manifest["pages"].get(page_id)
+            if key and (not versions or versions[-1][1] != key):
+                versions.append((manifest["time"], key))
+        return versions
+
+    def collect_garbage(self, blobs, live_keys, max_bytes, max_manifests=10000):
+        """
+        Keeps the newest manifests whose blobs, together with the blobs of
+        the current pages, fit in max_bytes, then deletes every blob nothing
+        refers to any more. Returns the number of blobs removed.
+
+        Call it holding store_lock(), with live_keys taken from the header
+        on disk, so blobs of other instances' saves are kept.
+        """
+        keep = set(live_keys)
+        used = sum(blobs.size(key) for key in keep)
+        kept = []
+        for manifest in reversed(self.read()):
+            new = {key for key in manifest["pages"].values() if key and key not in keep}
+            size = sum(blobs.size(key) for key in new)
+            if used + size > max_bytes or len(kept) >= max_manifests:
+                break
+            used += size
+            keep |= new
+            kept.append(manifest)
+        kept.reverse()
+        if os.path.exists(self.path):
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+            with os.fdopen(fd, "w") as f:
+                for manifest in kept:
+                    f.write(json.dumps(manifest) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        removed = 0
+        for key in list(blobs.keys()):
+            if key not in keep:
+                blobs.remove(key)
+                removed += 1
+        return removed
+
+
+def _entry_version(entry):
+    return entry.get("blob") or entry.get("file")
+
+
+def entry_versions(entries):
+    """
+    Returns page id -> the blob key (or legacy file name) of each header
+    entry, for telling which pages another header changed.
+    """
+    return {entry["id"]: _entry_version(entry) for entry in entries}
+
+
+class PageStore:
+    """
+    Page bodies stored as content-addressed blobs (see BlobStore) inside a
+    directory, with the page order kept in the config header as a list of
+    {"id", "blob", "title"} entries. The title is refreshed whenever a page
+    is written, so listing pages never has to read them.
+
+    Behaves like the list of strings NotepadApp used to keep in memory, but
+    bodies are only read on first access and cold ones are dropped from an
+    LRU once max_cached_chars is exceeded. Pages changed since the last
+    write stay pinned in memory until they are on disk.
+
+    Saving a page only writes a blob if no page, current or in the history,
+    ever had that exact text. Every save is also recorded in PageHistory so
+    earlier versions can be restored.
+
+    Entries from before blobs ({"id", "file"}, one plain text file per page)
+    are still read. Snapshot.write converts them, a batch per save.
+
+    Writes can also be split in two for a background writer: begin_write()
+    hands out the unsaved pages and keeps them pinned until end_write().
+    """
+
+    def __init__(self, directory, entries=None, max_cached_chars=8 * 1024 * 1024):
+        self.directory = directory
+        self.blobs = BlobStore(directory)
+        self.history = PageHistory(directory)
+        self.max_cached_chars = max_cached_chars
+        self._entries = [dict(e) for e in entries or []]
+        self._cache = OrderedDict()
+        self._cached_chars = 0
+        self._dirty = set()
+        self._deleted = []
+        self._obsolete = []
+        # Page id -> number of begin_write() calls not yet ended.
+        self._writing = Counter()
+
+    @classmethod
+    def from_texts(cls, directory, texts, **kwargs):
+        """
+        Builds a store from plain page strings, e.g. when migrating the old
+        single-JSON "pages"/"content" format. All pages start out unsaved.
+        """
+        store = cls(directory, **kwargs)
+        for text in texts:
+            store.append(text)
+        return store
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        for i in range(len(self._entries)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        entry = self._entries[index]
+        page_id = entry["id"]
+        if page_id in self._cache:
+            self._cache.move_to_end(page_id)
+            return self._cache[page_id]
+        text = self._read(entry)
+        self._remember(page_id, text)
+        return text
+
+    def __setitem__(self, index, text):
+        page_id = self._entries[index]["id"]
+        self._dirty.add(page_id)
+        self._remember(page_id, text)
+
+    def __delitem__(self, index):
+        entry = self._entries.pop(index)
+        self._forget(entry["id"])
+        self._dirty.discard(entry["id"])
+        self._deleted.append(entry["id"])
+        if entry.get("file"):
+            self._obsolete.append(entry["file"])
+
+    def append(self, text, page_id=None):
+        if page_id is None:
+            page_id = uuid.uuid4().hex[:12]
+        self._entries.append({"id": page_id, "blob": None})
+        self._dirty.add(page_id)
+        self._remember(page_id, text)
+
+    def page_id(self, index):
+        return self._entries[index]["id"]
+
+    def index_of(self, page_id):
+        for i, entry in enumerate(self._entries):
+            if entry["id"] == page_id:
+                return i
+        raise ValueError(page_id)
+
+    def title(self, index):
+        """
+        Returns a page's title (see notepad_index.page_title), from the
+        header where possible. Unsaved pages and entries written before
+        titles were kept are worked out from the text, the latter once.
+        """
+        entry = self._entries[index]
+        if entry["id"] in self._dirty:
+            return page_title(self._cache[entry["id"]])
+        if "title" not in entry:
+            try:
+                entry["title"] = page_title(self.peek(index))
+            except PageReadError:
+                return ""
+        return entry["title"]
+
+    def page_ids(self):
+        return [entry["id"] for entry in self._entries]
+
+    def positions(self):
+        """
+        Returns page id -> current index.
+        """
+        return {entry["id"]: i for i, entry in enumerate(self._entries)}
+
+    def peek(self, index):
+        """
+        Returns a page body without pulling it into the cache, for bulk
+        passes over the whole notebook.
+        """
+        entry = self._entries[index]
+        if entry["id"] in self._cache:
+            return self._cache[entry["id"]]
+        return self._read(entry)
+
+    def sources(self):
+        """
+        Returns, per page, its text if it is in memory or else a copy of its
+        entry. read_source() turns these into texts later, from any thread,
+        without touching the store, e.g. for an export running while the
+        pages are being edited.
+        """
+        return [self._cache[entry["id"]] if entry["id"] in self._cache else dict(entry)
+                for entry in self._entries]
+
+    def read_source(self, source):
+        return source if isinstance(source, str) else self._read(source)
+
+    def has_unsaved(self):
+        return bool(self._dirty or self._deleted)
+
+    def cached_chars(self):
+        return self._cached_chars
+
+    def versions(self, page_id):
+        return self.history.versions(page_id)
+
+    def read_version(self, key):
+        """
+        Returns the text of a version listed by versions(), or None if it
+        has been garbage collected since.
+        """
+        try:
+            return self.blobs.get(key)
+        except (OSError, zlib.error):
+            return None
+
+    def saved_versions(self):
+        """
+        Returns page id -> what the entry points at on disk, as in
+        entry_versions().
+        """
+        return entry_versions(self._entries)
+
+    def merge(self, entries, base, texts):
+        """
+        Folds in a header written by another instance sharing the directory.
+
+        base is entry_versions() of the last header this instance wrote or
+        loaded, and texts holds the text of every page whose version in
+        entries differs from base. A page changed on one side only takes
+        that side's version; a page changed on both sides keeps this side's
+        and is reported as a conflict (the other version stays in the
+        history). Page order follows entries, with pages only known here
+        kept after them.
+
+        Returns (updated, removed, conflicts) as sets of page ids.
+        """
+        ours = {entry["id"]: entry for entry in self._entries}
+        theirs = {entry["id"]: entry for entry in entries}
+        updated, removed, conflicts = set(), set(), set()
+
+        def changed_here(page_id):
+            return (page_id in self._dirty or page_id in self._writing
+                    or _entry_version(ours[page_id]) != base.get(page_id))
+
+        for page_id, entry in theirs.items():
+            version = _entry_version(entry)
+            if version == base.get(page_id) or page_id not in texts:
+                continue
+            if page_id in ours and changed_here(page_id):
+                if _entry_version(ours[page_id]) != version:
+                    conflicts.add(page_id)
+                continue
+            # Changed there only, new there, or deleted here but edited
+            # there; in each case their version wins.
+            if page_id in self._deleted:
+                self._deleted.remove(page_id)
+            ours[page_id] = dict(entry)
+            self._remember(page_id, texts[page_id])
+            updated.add(page_id)
+        for page_id in base:
+            if page_id in theirs or page_id not in ours:
+                continue
+            if changed_here(page_id):
+                conflicts.add(page_id)
+                continue
+            del ours[page_id]
+            self._forget(page_id)
+            removed.add(page_id)
+
+        order = [page_id for page_id in theirs if page_id in ours]
+        order += [entry["id"] for entry in self._entries
+                  if entry["id"] not in theirs and entry["id"] in ours]
+        self._entries = [ours[page_id] for page_id in order]
+        return updated, removed, conflicts
+
+    def write_dirty(self):
+        """
+        Writes every unsaved page right away and returns the header entries
+        to store in the config. Call it holding store_lock() until that
+        header is written, then call remove_obsolete().
+        """
+        entries, writes, obsolete, changes = self._take_dirty()
+        for _, key, text in writes:
+            self.blobs.put(key, text)
+        self.history.record(changes)
+        self._obsolete.extend(obsolete)
+        self._evict()
+        return entries
+
+    def begin_write(self):
+        """
+        Like write_dirty(), but leaves the writing to the caller. Returns
+        (entries, writes, obsolete, changes): the header entries, a list of
+        (page_id, blob key, text) to store, legacy page files to delete once
+        that header is on disk, and page id -> blob key (None if deleted)
+        for the version manifest. The pages stay in memory until end_write()
+        is called with the outcome.
+        """
+        entries, writes, obsolete, changes = self._take_dirty()
+        for page_id, _, _ in writes:
+            self._writing[page_id] += 1
+        return entries, writes, obsolete, changes
+
+    def end_write(self, snapshot, ok):
+        """
+        Unpins the pages of a Snapshot built from begin_write(). If it was
+        not written, those pages and deletions count as unsaved again and
+        the obsolete files are kept for the next attempt. Legacy entries the
+        snapshot converted to blobs are updated either way.
+        """
+        existing = set(self.page_ids())
+        for page_id in snapshot.page_ids:
+            self._writing[page_id] -= 1
+            if self._writing[page_id] <= 0:
+                del self._writing[page_id]
+            if not ok and page_id in existing:
+                self._dirty.add(page_id)
+        if not ok:
+            self._obsolete.extend(snapshot.obsolete)
+            self._deleted.extend(page_id for page_id, key in snapshot.changes.items()
+                                 if key is None)
+        else:
+            for entry in self._entries:
+                converted = snapshot.migrated.get(entry["id"])
+                if converted and entry.get("file") == converted[0]:
+                    entry.pop("file")
+                    entry["blob"] = converted[1]
+                    self._obsolete.append(converted[0])
+        self._evict()
+
+    def _take_dirty(self):
+        writes = []
+        changes = {}
+        obsolete = []
+        for entry in self._entries:
+            page_id = entry["id"]
+            if page_id not in self._dirty:
+                continue
+            text = self._cache[page_id]
+            key = BlobStore.key(text)
+            if entry.get("file"):
+                obsolete.append(entry.pop("file"))
+            elif entry.get("blob") == key:
+                continue  # edited back to what was saved
+            entry["blob"] = key
+            entry["title"] = page_title(text)
+            writes.append((page_id, key, text))
+            changes[page_id] = key
+        for page_id in self._deleted:
+            changes[page_id] = None
+        self._dirty.clear()
+        self._deleted = []
+        obsolete, self._obsolete = self._obsolete + obsolete, []
+        return [dict(e) for e in self._entries], writes, obsolete, changes
+
+    def remove_obsolete(self):
+        """
+        Deletes page files of the pre-blob format that are no longer used.
+        """
+        for filename in self._obsolete:
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+        self._obsolete = []
+
+    def _read(self, entry):
+        """
+        Raises PageReadError if the page's blob or file cannot be read.
+        """
+        try:
+            if entry.get("blob"):
+                return self.blobs.get(entry["blob"])
+            if entry.get("file"):
+                with open(os.path.join(self.directory, entry["file"]), "r",
+                          encoding="utf-8", newline="") as f:
+                    return f.read()
+        except (OSError, zlib.error, UnicodeDecodeError) as e:
+            raise PageReadError(f"page {entry['id']} could not be read: {e}")
+        return ""  # added but never saved
+
+    def _remember(self, page_id, text):
+        self._forget(page_id)
+        self._cache[page_id] = text
+        self._cached_chars += len(text)
+        self._evict()
+
+    def _forget(self, page_id):
+        text = self._cache.pop(page_id, None)
+        if text is not None:
+            self._cached_chars -= len(text)
+
+    def _evict(self):
+        # Oldest first; unsaved pages, pages being written and the most
+        # recent one always stay.
+        if self._cached_chars <= self.max_cached_chars:
+            return
+        for page_id in list(self._cache)[:-1]:
+            if self._cached_chars <= self.max_cached_chars:
+                break
+            if page_id not in self._dirty and page_id not in self._writing:
+                self._forget(page_id)
+
+
+class Snapshot:
+    """
+    Everything one save writes: new page blobs, the config header, the
+    version manifest, the undo history (None removes the undo file) and
+    legacy page files the new header no longer refers to. Built on the Tk
+    thread, written by SnapshotWriter.
+
+    With gc_max_bytes set, the write ends with a garbage-collection pass
+    that trims the version history to that much blob data.
+    """
+
+    # Legacy page files converted to blobs per snapshot.
+    MIGRATE_BATCH = 200
+
+    def __init__(self, config_path, config, pages_dir, page_writes, obsolete, changes,
+                 undo_path, undo, gc_max_bytes=None):
+        self.config_path = config_path
+        self.config = config
+        self.pages_dir = pages_dir
+        self.page_writes = page_writes
+        self.obsolete = obsolete
+        self.changes = changes
+        self.undo_path = undo_path
+        self.undo = undo
+        self.gc_max_bytes = gc_max_bytes
+        self.time = time.time()
+        # Every page handed out for this snapshot, even if a newer snapshot
+        # replaced its blob; see merged_with().
+        self.page_ids = [page_id for page_id, _, _ in page_writes]
+        # Page id -> (legacy file, blob key), filled in by write().
+        self.migrated = {}
+
+    def merged_with(self, newer):
+        """
+        Returns one snapshot doing the work of self followed by newer, as a
+        single save. The newer header wins, and so does the newer text of a
+        page both of them changed.
+        """
+        replaced = {page_id for page_id, _, _ in newer.page_writes}
+        changes = dict(self.changes)
+        changes.update(newer.changes)
+        gc = [n for n in (self.gc_max_bytes, newer.gc_max_bytes) if n is not None]
+        merged = Snapshot(newer.config_path, newer.config, newer.pages_dir,
+                          [w for w in self.page_writes if w[0] not in replaced] + newer.page_writes,
+                          self.obsolete + newer.obsolete, changes,
+                          newer.undo_path, newer.undo, min(gc) if gc else None)
+        merged.time = newer.time
+        merged.page_ids = self.page_ids + newer.page_ids
+        return merged
+
+    def write(self):
+        blobs = BlobStore(self.pages_dir)
+        history = PageHistory(self.pages_dir)
+        changes = dict(self.changes)
+        with store_lock(self.pages_dir):
+            for page_id, key, text in self.page_writes:
+                blobs.put(key, text)
+            self.migrate_legacy(blobs, changes)
+            atomic_write_json(self.config_path, self.config)
+            history.record(changes, self.time)
+        if self.undo is not None:
+            atomic_write_json(self.undo_path, {"generation": self.config.get("generation"),
+                                               "pages": self.undo})
+        elif os.path.exists(self.undo_path):
+            os.remove(self.undo_path)
+        for filename in self.obsolete:
+            try:
+                os.remove(os.path.join(self.pages_dir, filename))
+            except OSError:
+                pass
+        if self.gc_max_bytes is not None:
+            with store_lock(self.pages_dir):
+                # Another instance may have saved since; its header counts.
+                try:
+                    with open(self.config_path, "r") as f:
+                        entries = json.load(f).get("page_index") or []
+                except (OSError, ValueError):
+                    entries = self.config["page_index"]
+                live = {entry["blob"] for entry in entries + self.config["page_index"]
+                        if entry.get("blob")}
+                history.collect_garbage(blobs, live, self.gc_max_bytes)
+
+    def migrate_legacy(self, blobs, changes):
+        """
+        Converts up to MIGRATE_BATCH legacy page files in the header to
+        blobs. The files themselves are left alone; a header captured before
+        end_write() may still point at them, and the next save's obsolete
+        list removes them.
+        """
+        for entry in self.config["page_index"]:
+            if len(self.migrated) >= self.MIGRATE_BATCH:
+                break
+            if not entry.get("file"):
+                continue
+            try:
+                with open(os.path.join(self.pages_dir, entry["file"]), "r",
+                          encoding="utf-8", newline="") as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError):
+                continue  # left as it is; PageStore reports it unreadable
+            key = BlobStore.key(text)
+            blobs.put(key, text)
+            self.migrated[entry["id"]] = (entry.pop("file"), key)
+            entry["blob"] = key
+            entry["title"] = page_title(text)
+            changes[entry["id"]] = key
+
+
+class SnapshotWriter:
+    """
+    Writes snapshots on a single background thread, one at a time.
+
+    Only one snapshot waits in line: submitting while another is still
+    queued merges the two, so a burst of saves costs at most one write in
+    progress plus one more. Outcomes are collected with results() on the
+    submitting thread.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = None
+        self._writing = False
+        self._closed = False
+        self._results = queue.Queue()
+        self._thread = None
+
+    def submit(self, snapshot):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("writer is closed")
+            if self._pending is not None:
+                snapshot = self._pending.merged_with(snapshot)
+            self._pending = snapshot
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="snapshot-writer",
+                                                daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def busy(self):
+        with self._cond:
+            return self._pending is not None or self._writing
+
+    def results(self):
+        """
+        Returns (snapshot, error) for every write finished since the last
+        call; error is None on success.
+        """
+        done = []
+        while True:
+            try:
+                done.append(self._results.get_nowait())
+            except queue.Empty:
+                return done
+
+    def wait(self):
+        """
+        Blocks until everything submitted so far is written.
+        """
+        with self._cond:
+            while self._pending is not None or self._writing:
+                self._cond.wait()
+
+    def close(self):
+        """
+        Writes whatever is still queued, then stops the thread.
+        """
+        self.wait()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                snapshot, self._pending = self._pending, None
+                self._writing = True
+            try:
+                snapshot.write()
+                error = None
+            except Exception as e:
+                error = e
+            self._results.put((snapshot, error))
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
@@ -0,0 +1,131 @@
+"""
+Change detection for several Popout Notepad instances sharing one store.
+
+NotepadApp hooks FileWatcher into its event loop and merges what
+read_changed_pages returns through PageStore.merge.
+"""
+import json
+import os
+import struct
+import sys
+import zlib
+
+from notepad_store import BlobStore, entry_versions
+
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_EVENT = struct.Struct("iIII")
+
+
+class FileWatcher:
+    """
+    Tells whether a file has been replaced or rewritten since the last
+    check.
+
+    On Linux this uses inotify on the file's directory, so fileno() can be
+    handed to the event loop and changed() is only called when something
+    happened. Elsewhere (or if inotify is unavailable) fileno() is None and
+    changed() compares the file's mtime and size, to be polled.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.name = os.fsencode(os.path.basename(self.path))
+        self._fd = None
+        self._signature = self._stat()
+        if sys.platform.startswith("linux"):
+            try:
+                self._fd = self._start_inotify()
+            except (OSError, AttributeError):
+                self._fd = None
+
+    def fileno(self):
+        return self._fd
+
+    def changed(self):
+        if self._fd is not None:
+            return self._drain_events()
+        signature = self._stat()
+        if signature != self._signature:
+            self._signature = signature
+            return True
+        return False
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _start_inotify(self):
+        # Imported here: ctypes.util pulls in subprocess and shutil, which
+        # startup does not need before the watcher starts.
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        # Watch the directory: atomic saves replace the file itself.
+        directory = os.fsencode(os.path.dirname(self.path))
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if libc.inotify_add_watch(fd, directory, mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, "inotify_add_watch")
+        return fd
+
+    def _drain_events(self):
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                _, _, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if name == self.name:
+                    changed = True
+
+
+def read_changed_pages(config_path, pages_dir, base):
+    """
+    Reads the config header another instance wrote and the text of every
+    page whose version differs from base (see PageStore.merge). Meant to
+    run off the Tk thread. Returns (config, texts); pages that cannot be
+    read are left out of texts and so stay as they are.
+    """
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    blobs = BlobStore(pages_dir)
+    entries = config.get("page_index", [])
+    versions = entry_versions(entries)
+    texts = {}
+    for entry in entries:
+        page_id = entry["id"]
+        if versions[page_id] == base.get(page_id):
+            continue
+        try:
+            if entry.get("blob"):
+                texts[page_id] = blobs.get(entry["blob"])
+            elif entry.get("file"):
+                with open(os.path.join(pages_dir, entry["file"]), "r",
+                          encoding="utf-8", newline="") as f:
+                    texts[page_id] = f.read()
+            else:
+                texts[page_id] = ""
+        except (OSError, ValueError, zlib.error):
+            continue
+    return config, texts
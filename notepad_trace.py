@@ -0,0 +1,101 @@
+"""
+Opt-in timing instrumentation for Popout Notepad.
+
+NotepadApp wraps its own methods with Tracer.wrap and feeds it event-loop
+lag samples.
+"""
+import functools
+import os
+import time
+from collections import Counter, deque
+
+from notepad_store import atomic_write_json
+
+
+def _percentile(samples, fraction):
+    return samples[max(int(len(samples) * fraction) - 1, 0)]
+
+
+class Tracer:
+    """
+    Records how long wrapped calls take and how late timer callbacks run.
+
+    Every call is kept as a Chrome trace event (up to max_events, oldest
+    dropped first) and the most recent stats_window durations per name are
+    kept for the p50/p99 summary; call counts cover every call.
+    """
+
+    def __init__(self, max_events=100000, stats_window=1000):
+        self.stats_window = stats_window
+        self._events = deque(maxlen=max_events)
+        self._durations = {}
+        self._counts = Counter()
+        self._t0 = time.perf_counter()
+
+    def wrap(self, name, func):
+        """
+        Returns func wrapped so that each call is recorded under name.
+        """
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, start, time.perf_counter() - start)
+        return traced
+
+    def record(self, name, start, duration):
+        self._events.append(("X", name, start, duration))
+        self._add_sample(name, duration)
+
+    def record_lag(self, expected, lag):
+        """
+        Records that a timer due at expected ran lag seconds late.
+        """
+        self._events.append(("C", "event loop lag", expected, lag))
+        self._add_sample("event loop lag", lag)
+
+    def _add_sample(self, name, value):
+        samples = self._durations.get(name)
+        if samples is None:
+            samples = self._durations[name] = deque(maxlen=self.stats_window)
+        samples.append(value)
+        self._counts[name] += 1
+
+    def stats(self):
+        """
+        Returns name -> {"count", "p50_ms", "p99_ms", "max_ms"}: the number
+        of calls so far, and timings over the recent durations of each name.
+        """
+        stats = {}
+        for name, samples in self._durations.items():
+            ordered = sorted(samples)
+            stats[name] = {
+                "count": self._counts[name],
+                "p50_ms": round(_percentile(ordered, 0.5) * 1000, 3),
+                "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return stats
+
+    def chrome_trace(self):
+        """
+        Returns the recorded events in the Chrome trace event format, for
+        chrome://tracing or Perfetto.
+        """
+        pid = os.getpid()
+        events = []
+        for kind, name, start, value in self._events:
+            ts = round((start - self._t0) * 1e6, 1)
+            if kind == "X":
+                events.append({"name": name, "ph": "X", "ts": ts, "dur": round(value * 1e6, 1),
+                               "pid": pid, "tid": 1})
+            else:
+                events.append({"name": name, "ph": "C", "ts": ts, "pid": pid,
+                               "args": {"ms": round(value * 1000, 3)}})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"stats": self.stats()}}
+
+    def export(self, path):
+        atomic_write_json(path, self.chrome_trace())
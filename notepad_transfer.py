@@ -0,0 +1,202 @@
+"""
+Bulk import and export of pages as Markdown or text files, in a folder or
+a zip archive.
+
+Both directions stream: importing reads one file at a time and hands the
+pages over in batches, exporting writes each page as soon as it has been
+read, so memory use does not grow with the size of the notebook. Exported
+pages are named page-NNNN.md, padded so they sort in page order, and
+importing the folder or archive again brings them back in that order.
+
+NotepadApp runs these on a worker thread (see NotepadApp.start_transfer)
+and the command line calls them directly.
+"""
+import os
+import re
+import zipfile
+import zlib
+
+PAGE_SUFFIXES = (".md", ".markdown", ".txt")
+# Names export_pages gives page files.
+_PAGE_FILE_RE = re.compile(r"page-\d+\.md")
+# Lists the page files an export wrote to a folder; hidden, so importing
+# the folder skips it.
+EXPORT_MANIFEST = ".popout-notepad-export"
+
+
+def natural_key(name):
+    """
+    Sort key that orders the numbers in names by value: page-2 before
+    page-10.
+    """
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def is_page_name(name):
+    parts = name.replace("\\", "/").split("/")
+    # Skips dot folders (.git, .obsidian) and macOS zip metadata.
+    if any(part.startswith(".") or part == "__MACOSX" for part in parts):
+        return False
+    return parts[-1].lower().endswith(PAGE_SUFFIXES)
+
+
+def page_file_name(position, count):
+    width = max(4, len(str(count)))
+    return f"page-{position + 1:0{width}d}.md"
+
+
+def decode_page(data):
+    text = data.decode("utf-8-sig", errors="replace")
+    return text.replace("\r\n", "\n")
+
+
+class PageSource:
+    """
+    The pages to import from one path: every Markdown or text file in a
+    zip archive or below a folder, or a single file of any name. The
+    number of pages is known up front; iterating reads them one at a time
+    in natural name order.
+
+    Raises OSError if the path cannot be read, including broken archives.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.is_zip = False
+        if os.path.isdir(path):
+            names = []
+            for folder, subfolders, files in os.walk(path):
+                subfolders[:] = [name for name in subfolders if not name.startswith(".")]
+                relative = os.path.relpath(folder, path)
+                names.extend(os.path.normpath(os.path.join(relative, name))
+                             for name in files if is_page_name(name))
+            self.names = sorted(names, key=natural_key)
+        elif zipfile.is_zipfile(path):
+            self.is_zip = True
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    self.names = sorted((info.filename for info in archive.infolist()
+                                         if not info.is_dir() and is_page_name(info.filename)),
+                                        key=natural_key)
+            except zipfile.BadZipFile as e:
+                raise OSError(f"{path}: {e}")
+        elif not os.path.isfile(path):
+            raise FileNotFoundError(f"{path}: no such file or folder")
+        elif path.lower().endswith(".zip"):
+            raise OSError(f"{path}: not a zip archive")
+        else:
+            self.names = [""]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        if not self.is_zip:
+            for name in self.names:
+                with open(os.path.join(self.path, name) if name else self.path, "rb") as f:
+                    yield decode_page(f.read())
+            return
+        with zipfile.ZipFile(self.path) as archive:
+            for name in self.names:
+                try:
+                    data = archive.read(name)
+                except (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError) as e:
+                    # RuntimeError: encrypted entry; NotImplementedError:
+                    # unsupported compression method.
+                    raise OSError(f"{self.path}: {name}: {e}")
+                yield decode_page(data)
+
+
+def import_batches(paths, batch_pages=50, batch_chars=1024 * 1024):
+    """
+    Reads the pages found at paths (see PageSource) and yields
+    (pages read, total pages, texts), with at most batch_pages pages or
+    about batch_chars characters in each batch.
+    """
+    sources = [PageSource(path) for path in paths]
+    total = sum(len(source) for source in sources)
+    done = 0
+    batch = []
+    size = 0
+    for source in sources:
+        for text in source:
+            batch.append(text)
+            size += len(text)
+            done += 1
+            if len(batch) >= batch_pages or size >= batch_chars:
+                yield done, total, batch
+                batch = []
+                size = 0
+    if batch:
+        yield done, total, batch
+
+
+def read_export_manifest(folder):
+    """
+    Returns the names of the page files an earlier export listed in
+    folder, or an empty set if none did.
+    """
+    try:
+        with open(os.path.join(folder, EXPORT_MANIFEST), "r", encoding="utf-8") as f:
+            names = f.read().splitlines()
+    except FileNotFoundError:
+        return set()
+    # Never trust it with anything but our own page file names.
+    return {name for name in names if _PAGE_FILE_RE.fullmatch(name)}
+
+
+def write_export_manifest(folder, names):
+    path = os.path.join(folder, EXPORT_MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write("".join(name + "\n" for name in sorted(names, key=natural_key)))
+    os.replace(path + ".tmp", path)
+
+
+def export_pages(destination, texts, count):
+    """
+    Writes count pages, taken one at a time from the iterable texts, to
+    destination: a zip archive if it ends in .zip, otherwise a folder
+    (created if needed). Yields the number of pages written after each
+    one.
+
+    page-NNNN.md files already in the folder are overwritten. A folder
+    export also records the files it wrote in EXPORT_MANIFEST, and once
+    all pages are written removes those an earlier, longer export listed
+    there, so importing the folder gives back just these pages. Files the
+    manifest does not list are never removed.
+
+    An archive is written next to destination and only renamed into place
+    once complete; closing the generator early removes it again.
+    """
+    texts = iter(texts)
+    if not destination.lower().endswith(".zip"):
+        os.makedirs(destination, exist_ok=True)
+        names = [page_file_name(position, count) for position in range(count)]
+        previous = read_export_manifest(destination)
+        # Listed up front, so files from a run stopped part way are still
+        # ours to clean up next time.
+        write_export_manifest(destination, previous.union(names))
+        for position, name in enumerate(names):
+            with open(os.path.join(destination, name), "w", encoding="utf-8", newline="") as f:
+                f.write(next(texts))
+            yield position + 1
+        for name in previous.difference(names):
+            try:
+                os.remove(os.path.join(destination, name))
+            except FileNotFoundError:
+                pass
+        write_export_manifest(destination, names)
+        return
+    tmp_path = destination + ".tmp"
+    try:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for position in range(count):
+                archive.writestr(page_file_name(position, count), next(texts))
+                yield position + 1
+        os.replace(tmp_path, destination)
+    finally:
+        # Only still there if writing failed or was stopped.
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
@@ -10,7 +10,11 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Optional pyautogui extras and stdlib modules the app never uses.
+    excludes=[
+        'PIL', 'numpy', 'PyQt5', 'pyscreeze', 'pygetwindow', 'mouseinfo',
+        'unittest', 'doctest', 'pdb', 'pydoc', 'xmlrpc',
+    ],
     noarchive=False,
     optimize=0,
 )
@@ -37,3 +41,28 @@ exe = EXE(
     entitlements_file=None,
     icon=['icon.ico'],
 )
+
+# The same program as a console application, for the command line
+# (popout-notepad-cli list, cat, add ...). The windowed build above has no
+# stdin or stdout, so a shell would not see its output nor wait for it.
+cli_exe = EXE(
+    pyz,
+    a.scripts,
+    a.binaries,
+    a.datas,
+    [],
+    name='popout-notepad-cli',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    runtime_tmpdir=None,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+    icon=['icon.ico'],
+)